@@ -0,0 +1,3 @@
+"""
+Code shared by the YUNO API services (copied into each image at build time)
+"""
@@ -0,0 +1,245 @@
+"""
+Opt-in request profiling for the YUNO FastAPI services
+A sampling profiler captures collapsed stacks for selected requests into a bounded on-disk ring buffer
+
+Shared by the recommendation and user_auth services; both images copy api/common at build time.
+"""
+
+import asyncio
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+PROFILE_SUFFIX = ".folded"
+
+_UNSAFE_CHARS_RE = re.compile(r"[^A-Za-z0-9]+")
+
+# Innermost frames that mean a thread is parked (event loop select, idle pool workers, lock waits)
+_IDLE_MODULES = ("threading.py", "selectors.py", "queue.py")
+_IDLE_FUNCTIONS = {("thread.py", "_worker")}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    filename = os.path.basename(frame.f_code.co_filename)
+    return filename in _IDLE_MODULES or (filename, frame.f_code.co_name) in _IDLE_FUNCTIONS
+
+
+# =============================================================================
+# SAMPLER
+# =============================================================================
+
+class StackSampler:
+    """
+    Statistical profiler: a background thread snapshots every other thread's stack
+    each interval and counts the busy ones as collapsed stacks ("a;b;c count").
+
+    Sampling is process-wide, not scoped to one request: a request's blocking work
+    runs on shared thread pools, so every busy thread is sampled, including whatever
+    other requests are doing at the same time. Profile on a quiet instance (or read
+    the stacks by route) when the numbers must belong to one request.
+    """
+
+    def __init__(self, interval_seconds: float = 0.005):
+        self.interval_seconds = interval_seconds
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="yuno-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval_seconds):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or _is_idle(frame):
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def collapsed(self) -> str:
+        """Stacks in the collapsed format read by flamegraph.pl and speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# =============================================================================
+# RING BUFFER
+# =============================================================================
+
+class ProfileStore:
+    """Keeps the newest max_files profiles in a directory, deleting the oldest beyond that."""
+
+    def __init__(self, directory: str, max_files: int = 50):
+        self.directory = directory
+        self.max_files = max(1, max_files)
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def new_id(self, method: str, path: str) -> str:
+        with self._lock:
+            self._counter += 1
+            counter = self._counter
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        slug = _UNSAFE_CHARS_RE.sub("-", path).strip("-")[:60] or "root"
+        return f"{stamp}-{os.getpid()}-{counter:05d}-{method}-{slug}"
+
+    def write(self, profile_id: str, content: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, profile_id + PROFILE_SUFFIX), "w", encoding="utf-8") as f:
+            f.write(content)
+        with self._lock:
+            for name in self._names()[self.max_files:]:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _names(self) -> List[str]:
+        """Profile file names, newest first."""
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith(PROFILE_SUFFIX)]
+        except FileNotFoundError:
+            return []
+        return sorted(names, reverse=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        profiles = []
+        for name in self._names():
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            profiles.append({
+                "id": name[:-len(PROFILE_SUFFIX)],
+                "size_bytes": stat.st_size,
+                "created_at": stat.st_mtime,
+            })
+        return profiles
+
+    def path(self, profile_id: str) -> Optional[str]:
+        """File path of a listed profile, or None (ids are never joined onto the path unchecked)."""
+        name = profile_id + PROFILE_SUFFIX
+        if name not in self._names():
+            return None
+        return os.path.join(self.directory, name)
+
+
+# =============================================================================
+# MIDDLEWARE AND ENDPOINTS
+# =============================================================================
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware that profiles a request when it carries `X-Profile: <token>`
+    or is picked by sample_rate.
+    One request is profiled at a time; the profile id is returned in X-Profile-Id.
+    Stacks come from every thread of the process while it runs (see StackSampler).
+    A token is required: profiles expose stack contents and must not be open to any client.
+    """
+
+    def __init__(
+        self,
+        app,
+        store: ProfileStore,
+        sample_rate: float = 0.0,
+        token: Optional[str] = None,
+        interval_seconds: float = 0.005
+    ):
+        if not token:
+            raise ValueError("ProfilingMiddleware requires a token (set PROFILE_TOKEN)")
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.token = token
+        self.interval_seconds = interval_seconds
+        self._busy = threading.Lock()
+
+    def wants_profile(self, scope) -> bool:
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER:
+                return secrets.compare_digest(value, self.token.encode())
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.wants_profile(scope) or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = self.store.new_id(scope["method"], scope["path"])
+        sampler = StackSampler(self.interval_seconds)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (PROFILE_ID_HEADER, profile_id.encode())]}
+            await send(message)
+
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            self._busy.release()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            try:
+                # File I/O (and pruning the ring buffer) must not block the event loop
+                await asyncio.to_thread(self.store.write, profile_id, sampler.collapsed())
+                print(f"[PROFILE] {scope['method']} {scope['path']} took {elapsed_ms:.1f}ms "
+                      f"({sampler.samples} samples) -> {profile_id}")
+            except OSError as e:
+                print(f"[WARNING] Could not write profile {profile_id}: {e}")
+
+
+def create_profiles_router(store: ProfileStore, token: Optional[str] = None) -> APIRouter:
+    """Routes to list and download recent profiles (require X-Profile-Token)."""
+    if not token:
+        raise ValueError("The profiles router requires a token (set PROFILE_TOKEN)")
+    router = APIRouter(prefix="/debug/profiles")
+
+    def check_token(given: Optional[str]):
+        if given is None or not secrets.compare_digest(given.encode(), token.encode()):
+            raise HTTPException(status_code=403, detail="Invalid or missing X-Profile-Token")
+
+    @router.get("")
+    def list_profiles(x_profile_token: Optional[str] = Header(None)):
+        """Most recent request profiles, newest first."""
+        check_token(x_profile_token)
+        return {"max_files": store.max_files, "profiles": store.list()}
+
+    @router.get("/{profile_id}")
+    def download_profile(profile_id: str, x_profile_token: Optional[str] = Header(None)):
+        """Download one profile as collapsed stacks."""
+        check_token(x_profile_token)
+        path = store.path(profile_id)
+        if path is None:
+            raise HTTPException(status_code=404, detail=f"Profile '{profile_id}' not found")
+        return FileResponse(path, media_type="text/plain", filename=profile_id + PROFILE_SUFFIX)
+
+    return router
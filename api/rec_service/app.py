@@ -5,22 +5,190 @@ Uses ChromaDB for vector search with RIASEC/OCEAN personality matching
 Run with: uvicorn app:app --reload --host 0.0.0.0 --port 8000
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
-from contextlib import asynccontextmanager
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Dict, Any, Optional, Tuple, Union
+from datetime import datetime
+from contextlib import asynccontextmanager, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import functools
+import numpy as np
+import json
 import chromadb
 import google.generativeai as genai
 import os
+import secrets
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# Code shared with user_auth lives in api/common (copied to /common in the image)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+
+import export
+import ingest
+import init_vector_db
+import metrics
+import shared_index
+import snapshot
+from batching import EmbeddingBatcher
+from catalog_stats import CatalogStats
+from cache import EmbeddingCache, LRUCache, SingleFlight, normalize_query_text
+from embedding_providers import EmbeddingProvider, GeminiEmbeddingProvider, ensure_collection_model
+from event_dates import DateWindow, backfill_event_timestamps, combine_filters, date_window_filter
+from compact_index import CompactSearchIndex, recall_report, sample_queries
+from exact_search import ExactSearchIndex
+from metrics import ServerTimingMiddleware, Stage, render_metrics
+from partitions import USER_STAGES, apply_partition_changes, build_chroma_partitions, build_exact_partitions
+from reranking import RerankProfile, mmr_select
+from yuno_common.profiling import ProfileStore, ProfilingMiddleware, create_profiles_router
+from profiles import (
+    ProfileRecommendationTable,
+    UserProfileVectors,
+    normalize_riasec_code,
+    profile_query_text,
+    riasec_code_for_query
+)
 
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
 
 CHROMA_DB_PATH = "./local_vector_db"
-# Embedding Model Name (Gemini)
-EMBEDDING_MODEL = "models/text-embedding-004"
+# Held (flock) while a worker populates the empty catalog or applies an ingest, so with
+# several uvicorn/gunicorn workers only one of them writes ChromaDB and the embedding store at a time
+CATALOG_LOCK_PATH = os.getenv("CATALOG_LOCK_PATH", CHROMA_DB_PATH + ".lock")
+# Token rewritten on every catalog write; workers poll it every CATALOG_VERSION_POLL_SECONDS so their
+# caches, catalog stats and in-memory indexes follow writes made by other workers (0 disables)
+CATALOG_VERSION_PATH = os.getenv("CATALOG_VERSION_PATH", CHROMA_DB_PATH + ".version")
+CATALOG_VERSION_POLL_SECONDS = float(os.getenv("CATALOG_VERSION_POLL_SECONDS", "2"))
+# Embedding model comes from EMBEDDING_PROVIDER (see embedding_providers.py)
+QUERY_TASK_TYPE = "retrieval_query"
+
+# Query embedding cache (set EMBEDDING_CACHE_PATH to persist across restarts)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "86400"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH") or None
+# Rows kept in that file; expired and least recently used rows beyond this are evicted
+EMBEDDING_CACHE_DISK_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DISK_MAX_ENTRIES", "100000"))
+
+# Blocking work (Gemini, ChromaDB) runs on a bounded thread pool off the event loop
+RECOMMEND_EXECUTOR_WORKERS = int(os.getenv("RECOMMEND_EXECUTOR_WORKERS", "16"))
+RECOMMEND_TIMEOUT_SECONDS = float(os.getenv("RECOMMEND_TIMEOUT_SECONDS", "10"))
+
+# Concurrent cache misses are coalesced into one batched call to a remote provider (0 disables)
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+
+# Vector search backend: "chroma" (HNSW), "numpy" (exact in-memory search) or "mmap"
+# (numpy search over read-only files shared by every worker process, see below)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "chroma").lower()
+
+# Compact vectors for the numpy backend: SEARCH_PRECISION float32 (off), float16 or int8,
+# optional PCA to SEARCH_PCA_DIM dimensions, and exact float32 re-scoring of the best
+# SEARCH_RESCORE candidates (read from a memory-mapped copy under SEARCH_RESCORE_DIR)
+SEARCH_PRECISION = os.getenv("SEARCH_PRECISION", "float32").lower()
+SEARCH_PCA_DIM = int(os.getenv("SEARCH_PCA_DIM", "0"))
+SEARCH_RESCORE = int(os.getenv("SEARCH_RESCORE", "0"))
+SEARCH_RESCORE_DIR = os.getenv("SEARCH_RESCORE_DIR", "./compact_index")
+# Queries used for the recall@10 / latency report logged when a compact index is built (0 disables)
+SEARCH_REPORT_QUERIES = int(os.getenv("SEARCH_REPORT_QUERIES", "50"))
+
+# mmap backend: vectors, metadata columns and (from SEARCH_GRAPH_MIN_ITEMS items) a kNN graph
+# with SEARCH_INDEX_NEIGHBORS links per item are written once under SEARCH_INDEX_DIR and mapped
+# read-only by every uvicorn/gunicorn worker, so N workers share one copy in the page cache.
+# Workers map files rebuilt by another worker within SEARCH_INDEX_RELOAD_SECONDS (0 disables)
+SEARCH_INDEX_DIR = os.getenv("SEARCH_INDEX_DIR", "./shared_index")
+SEARCH_INDEX_NEIGHBORS = int(os.getenv("SEARCH_INDEX_NEIGHBORS", str(shared_index.GRAPH_NEIGHBORS)))
+SEARCH_GRAPH_MIN_ITEMS = int(os.getenv("SEARCH_GRAPH_MIN_ITEMS", str(shared_index.GRAPH_MIN_ITEMS)))
+SEARCH_GRAPH_EF = int(os.getenv("SEARCH_GRAPH_EF", str(shared_index.GRAPH_EF)))
+SEARCH_INDEX_RELOAD_SECONDS = float(os.getenv("SEARCH_INDEX_RELOAD_SECONDS", "30"))
+
+# Keep one index per user stage instead of filtering on target_audience at query time
+AUDIENCE_PARTITIONING = os.getenv("AUDIENCE_PARTITIONING", "true").lower() in ("1", "true", "yes")
+
+# Whole-response cache for /recommend, invalidated when the catalog changes
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "4096"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+
+# Optional hybrid re-ranking: over-fetch candidates, then blend similarity with profile matches
+RERANK_CANDIDATE_FACTOR = int(os.getenv("RERANK_CANDIDATE_FACTOR", "10"))
+RERANK_MAX_CANDIDATES = int(os.getenv("RERANK_MAX_CANDIDATES", "500"))
+RERANK_WEIGHT_SIMILARITY = float(os.getenv("RERANK_WEIGHT_SIMILARITY", "0.7"))
+RERANK_WEIGHT_RIASEC = float(os.getenv("RERANK_WEIGHT_RIASEC", "0.2"))
+RERANK_WEIGHT_OCEAN = float(os.getenv("RERANK_WEIGHT_OCEAN", "0.1"))
+
+# Optional MMR diversity stage: over-fetch candidates with their embeddings, then pick a
+# relevant but non-redundant top-k (MMR_LAMBDA 1 = relevance only, 0 = diversity only)
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+MMR_CANDIDATE_FACTOR = int(os.getenv("MMR_CANDIDATE_FACTOR", "10"))
+MMR_MAX_CANDIDATES = int(os.getenv("MMR_MAX_CANDIDATES", "200"))
+
+# Ranked list length stored per (RIASEC code, user stage) in the profile table
+PROFILE_TABLE_DEPTH = int(os.getenv("PROFILE_TABLE_DEPTH", "20"))
+
+# User profiles (riasec_code, ocean_scores) live in the user_auth service
+AUTH_API_URL = os.getenv("AUTH_API_URL", "http://localhost:8001").rstrip("/")
+USER_PROFILE_CACHE_SIZE = int(os.getenv("USER_PROFILE_CACHE_SIZE", "10000"))
+USER_PROFILE_POLL_SECONDS = float(os.getenv("USER_PROFILE_POLL_SECONDS", "300"))
+# Shared secret user_auth sends as X-Notify-Token on profile-change notifications;
+# when unset those notifications are rejected and profiles refresh by polling only
+PROFILE_NOTIFY_TOKEN = os.getenv("PROFILE_NOTIFY_TOKEN") or None
+
+# Cursor pagination: ranked candidates kept per paginated query, and how long cursors live
+PAGINATION_DEPTH = int(os.getenv("PAGINATION_DEPTH", "200"))
+CURSOR_CACHE_SIZE = int(os.getenv("CURSOR_CACHE_SIZE", "10000"))
+CURSOR_TTL_SECONDS = float(os.getenv("CURSOR_TTL_SECONDS", "900"))
+
+# Bulk ingestion (POST /collections/{name}/items); requests must carry INGEST_TOKEN as
+# X-Ingest-Token, and when it is unset the endpoint rejects every request
+INGEST_MAX_ITEMS = int(os.getenv("INGEST_MAX_ITEMS", "20000"))
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "100"))
+INGEST_WRITE_BATCH_SIZE = int(os.getenv("INGEST_WRITE_BATCH_SIZE", "5000"))
+INGEST_TOKEN = os.getenv("INGEST_TOKEN") or None
+
+# Opt-in: hide items of EVENT_EXPIRY_COLLECTIONS whose event_ts is more than EVENT_EXPIRY_GRACE_SECONDS
+# in the past. Applied as an event_ts filter at query time on every backend (nothing is deleted, and
+# items without an event_date are hidden there as with a `from` date). The cutoff advances every
+# EVENT_EXPIRY_INTERVAL_SECONDS, so filter masks and cached results are reused in between.
+EVENT_EXPIRY = os.getenv("EVENT_EXPIRY", "false").lower() in ("1", "true", "yes")
+EVENT_EXPIRY_COLLECTIONS = [
+    name.strip() for name in os.getenv("EVENT_EXPIRY_COLLECTIONS", "holistic").split(",") if name.strip()
+]
+EVENT_EXPIRY_INTERVAL_SECONDS = max(1.0, float(os.getenv("EVENT_EXPIRY_INTERVAL_SECONDS", "300")))
+EVENT_EXPIRY_GRACE_SECONDS = int(os.getenv("EVENT_EXPIRY_GRACE_SECONDS", "0"))
+
+# Maximum number of queries accepted by POST /recommend/batch
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "5000"))
+
+# Catalog auto-population (runs in the background when the database is empty)
+POPULATE_SAMPLES_PER_COLLECTION = int(os.getenv("POPULATE_SAMPLES_PER_COLLECTION", "100"))
+POPULATE_BATCH_SIZE = int(os.getenv("POPULATE_BATCH_SIZE", "50"))
+
+# Snapshot restored (instead of generating data) when the database is empty
+CATALOG_SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT_PATH") or None
+
+# Per-stage latency histograms (/metrics) and Server-Timing response headers
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+metrics.set_enabled(METRICS_ENABLED)
+
+# Opt-in request profiling (admin flag): profiles requests sent with an X-Profile header
+# or a PROFILE_SAMPLE_RATE share of all requests; see /debug/profiles (requires PROFILE_TOKEN)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN") or None
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
 
 
 # =============================================================================
@@ -30,6 +198,59 @@ EMBEDDING_MODEL = "models/text-embedding-004"
 chroma_client: chromadb.PersistentClient = None
 upskilling_collection = None
 holistic_collection = None
+embedding_provider: EmbeddingProvider = None
+embedding_cache: EmbeddingCache = None
+executor: ThreadPoolExecutor = None
+embedding_batcher: EmbeddingBatcher = None
+search_indexes: Dict[str, ExactSearchIndex] = {}
+audience_partitions: Dict[str, Dict[str, Any]] = {}
+# Recall/latency of each compact index against full precision, measured when it was built
+compact_reports: Dict[str, Dict[str, Any]] = {}
+# Files each shared (mmap backend) index is mapped from
+shared_index_info: Dict[str, Dict[str, Any]] = {}
+# Background full rebuilds of shared index files, per collection
+index_compactions: Dict[str, threading.Thread] = {}
+
+# Bumped on every catalog add/upsert/delete; part of every response cache key
+collection_version = 0
+# Persisted catalog version (CATALOG_VERSION_PATH) this worker's state reflects; also part of cache keys
+catalog_token: Optional[str] = None
+response_cache = LRUCache(
+    max_entries=RESPONSE_CACHE_SIZE,
+    ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+    max_bytes=RESPONSE_CACHE_MAX_BYTES
+)
+recommendation_flights = SingleFlight()
+# Ranked (ids, scores) candidate lists behind pagination cursors
+ranked_cursors = LRUCache(max_entries=CURSOR_CACHE_SIZE, ttl_seconds=CURSOR_TTL_SECONDS)
+# Item and facet counts, loaded once and then updated on every add/upsert/delete
+catalog_stats = CatalogStats()
+# Bulk ingests run one at a time so overlapping requests cannot interleave writes
+# (CATALOG_LOCK_PATH does the same across worker processes)
+ingest_lock = threading.Lock()
+# Index rebuilds replace search_indexes/audience_partitions entries
+search_index_lock = threading.RLock()
+# Expiry cutoff the profile table was last rebuilt for, and how many items it newly hid
+event_expiry: Dict[str, Any] = {"cutoff": None, "expired": 0, "last_run": None}
+profile_table = ProfileRecommendationTable(depth=PROFILE_TABLE_DEPTH)
+user_profiles = UserProfileVectors(
+    max_users=USER_PROFILE_CACHE_SIZE,
+    poll_seconds=USER_PROFILE_POLL_SECONDS
+)
+
+# Background catalog preparation: starting -> restoring/populating -> indexing -> ready (or failed)
+catalog_ready = threading.Event()
+catalog_status: Dict[str, Any] = {
+    "state": "starting",
+    "items_total": 0,
+    "items_embedded": 0,
+    "items_reused": 0,
+    "items_remaining": 0,
+    "errors": 0,
+    "last_error": None,
+    "started_at": None,
+    "ready_seconds": None,
+}
 
 # =============================================================================
 # LIFESPAN MANAGEMENT
@@ -39,73 +260,81 @@ holistic_collection = None
 async def lifespan(app: FastAPI):
     """
     Manages application lifecycle.
-    Configures Gemini API and loads ChromaDB client.
-    Checks and auto-populates data if database is empty.
+    Configures the embedding provider (Gemini API by default) and loads ChromaDB client.
+    Population of an empty database and index building run in the background.
     """
-    global chroma_client, upskilling_collection, holistic_collection
+    global chroma_client, upskilling_collection, holistic_collection, embedding_provider, embedding_cache, executor, embedding_batcher
     
-    print("[STARTUP] Initializing YUNO Recommendation System (Gemini Powered)...")
+    print("[STARTUP] Initializing YUNO Recommendation System...")
+    
+    embedding_provider = init_vector_db.get_embedding_provider()
+    print(f"[STARTUP] Embedding model: {embedding_provider.name}")
     
     # Configure Gemini
     api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
+    if isinstance(embedding_provider, GeminiEmbeddingProvider) and not api_key:
         print("[WARNING] GEMINI_API_KEY environment variable not set. Recommendations will fail!")
-    else:
+    elif api_key:
         genai.configure(api_key=api_key)
         print("[STARTUP] Gemini API Configured.")
 
+    executor = ThreadPoolExecutor(
+        max_workers=RECOMMEND_EXECUTOR_WORKERS,
+        thread_name_prefix="yuno-worker"
+    )
+
+    embedding_cache = EmbeddingCache(
+        max_entries=EMBEDDING_CACHE_SIZE,
+        ttl_seconds=EMBEDDING_CACHE_TTL_SECONDS,
+        disk_path=EMBEDDING_CACHE_PATH,
+        disk_max_entries=EMBEDDING_CACHE_DISK_MAX_ENTRIES
+    )
+    print(f"[STARTUP] Embedding cache ready (size={EMBEDDING_CACHE_SIZE}, disk={EMBEDDING_CACHE_PATH or 'off'}).")
+
+    # Local providers embed in microseconds; only remote calls are worth batching
+    if EMBEDDING_BATCH_WINDOW_MS > 0 and embedding_provider.remote:
+        embedding_batcher = EmbeddingBatcher(
+            embed_query_batch,
+            executor=executor,
+            window_ms=EMBEDDING_BATCH_WINDOW_MS,
+            max_batch_size=EMBEDDING_BATCH_MAX_SIZE
+        )
+        print(f"[STARTUP] Embedding batcher ready (window={EMBEDDING_BATCH_WINDOW_MS}ms, max={EMBEDDING_BATCH_MAX_SIZE}).")
     
     # Connect to ChromaDB
     print("[STARTUP] Connecting to ChromaDB...")
     chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
     
     # Get or Create Collections
-    upskilling_collection = chroma_client.get_or_create_collection("upskilling")
-    holistic_collection = chroma_client.get_or_create_collection("holistic")
+    upskilling_collection = chroma_client.get_or_create_collection(
+        "upskilling", metadata={"embedding_model": embedding_provider.name}
+    )
+    holistic_collection = chroma_client.get_or_create_collection(
+        "holistic", metadata={"embedding_model": embedding_provider.name}
+    )
     
-    # Auto-Populate if empty
-    if upskilling_collection.count() == 0:
-        print("[STARTUP] Database is empty. Generating synthetic data using Gemini...")
-        try:
-            import init_vector_db
-            
-            # Upskilling
-            print("[STARTUP] Generating Upskilling Courses...")
-            upskilling_df = init_vector_db.generate_upskilling_data(n_samples=100)
-            
-            upskilling_collection.add(
-                ids=upskilling_df["id"].tolist(),
-                documents=upskilling_df["embedding_text"].tolist(),
-                embeddings=[init_vector_db.get_embedding(text) for text in upskilling_df["embedding_text"].tolist()],
-                metadatas=upskilling_df.drop(columns=["id", "embedding_text"]).to_dict("records")
-            )
-            print(f"[STARTUP] Added {len(upskilling_df)} courses.")
-
-            # Holistic
-            print("[STARTUP] Generating Holistic Events...")
-            holistic_df = init_vector_db.generate_holistic_data(n_samples=100)
-            
-            holistic_collection.add(
-                ids=holistic_df["id"].tolist(),
-                documents=holistic_df["embedding_text"].tolist(),
-                embeddings=[init_vector_db.get_embedding(text) for text in holistic_df["embedding_text"].tolist()],
-                metadatas=holistic_df.drop(columns=["id", "embedding_text"]).to_dict("records")
-            )
-            print(f"[STARTUP] Added {len(holistic_df)} events.")
-            
-        except Exception as e:
-            print(f"[ERROR] Failed to auto-populate database: {e}")
-
-    print(f"[STARTUP] Upskilling collection: {upskilling_collection.count()} items")
-    print(f"[STARTUP] Holistic collection: {holistic_collection.count()} items")
+    # Populating and indexing can take minutes; do it off the event loop so
+    # the process answers liveness probes immediately
+    catalog_status["started_at"] = time.time()
+    executor.submit(prepare_catalog)
+    expiry_task = asyncio.create_task(expire_events_periodically()) if EVENT_EXPIRY else None
+    reload_task = None
+    if SEARCH_BACKEND == "mmap" and SEARCH_INDEX_RELOAD_SECONDS > 0:
+        reload_task = asyncio.create_task(reload_shared_indexes_periodically())
+    version_task = asyncio.create_task(sync_catalog_version_periodically()) if CATALOG_VERSION_POLL_SECONDS > 0 else None
     
-    print("[STARTUP] YUNO is ready to serve recommendations!")
+    print("[STARTUP] Server is up; catalog is loading in the background (see /health/ready).")
     print("=" * 50)
     
     yield  # Application runs here
     
     # Cleanup on shutdown
     print("[SHUTDOWN] YUNO Recommendation System shutting down...")
+    for task in (expiry_task, reload_task, version_task):
+        if task is not None:
+            task.cancel()
+    executor.shutdown(wait=False, cancel_futures=True)
+    embedding_cache.close()
 
 # =============================================================================
 # FASTAPI APP
@@ -125,8 +354,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all methods
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["Server-Timing", "X-Profile-Id"],
 )
 
+# Reports the stages timed below in a Server-Timing header on every response
+app.add_middleware(ServerTimingMiddleware)
+
+if PROFILING_ENABLED and not PROFILE_TOKEN:
+    # Profiles expose stack contents, so the X-Profile trigger and /debug/profiles are never left open
+    print("[WARNING] PROFILING_ENABLED is set without PROFILE_TOKEN; request profiling stays disabled.")
+elif PROFILING_ENABLED:
+    profile_store = ProfileStore(PROFILE_DIR, max_files=PROFILE_MAX_FILES)
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=profile_store,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        token=PROFILE_TOKEN,
+        interval_seconds=PROFILE_INTERVAL_MS / 1000
+    )
+    app.include_router(create_profiles_router(profile_store, token=PROFILE_TOKEN))
+    print(f"[STARTUP] Request profiling enabled (sample rate={PROFILE_SAMPLE_RATE}, dir={PROFILE_DIR}).")
+
+if PROFILE_NOTIFY_TOKEN is None:
+    print("[WARNING] PROFILE_NOTIFY_TOKEN is not set; profile-change notifications are rejected and cached profiles refresh by polling only.")
+
+if INGEST_TOKEN is None:
+    print("[WARNING] INGEST_TOKEN is not set; bulk ingestion requests are rejected.")
+
 # =============================================================================
 # PYDANTIC MODELS
 # =============================================================================
@@ -149,6 +403,48 @@ class UserQuery(BaseModel):
         le=20,
         description="Number of results to return (1-20)"
     )
+    rerank: bool = Field(
+        default=False,
+        description="Re-rank over-fetched candidates by RIASEC/OCEAN match with the user's profile"
+    )
+    riasec_code: Optional[str] = Field(
+        default=None,
+        description="User's 3-letter RIASEC code (used when rerank is true)",
+        example="IAS"
+    )
+    ocean_scores: Optional[Dict[str, int]] = Field(
+        default=None,
+        description="User's OCEAN scores from 0-100 (used when rerank is true)",
+        example={"Openness": 80, "Conscientiousness": 55}
+    )
+    diversify: bool = Field(
+        default=False,
+        description="Re-rank over-fetched candidates with Maximal Marginal Relevance so near-duplicates do not crowd the list"
+    )
+    mmr_lambda: Optional[float] = Field(
+        default=None,
+        ge=0,
+        le=1,
+        description=f"MMR trade-off when diversify is true: 1 = relevance only, 0 = diversity only (default {MMR_LAMBDA})"
+    )
+    paginate: bool = Field(
+        default=False,
+        description=f"Return a next_cursor for fetching further pages (up to {PAGINATION_DEPTH} results per collection)"
+    )
+    date_from: Optional[datetime] = Field(
+        default=None,
+        alias="from",
+        description="Only items whose event_date is at or after this time (ISO 8601 or epoch seconds)",
+        example="2026-11-01T00:00:00"
+    )
+    date_to: Optional[datetime] = Field(
+        default=None,
+        alias="to",
+        description="Only items whose event_date is at or before this time (ISO 8601 or epoch seconds)",
+        example="2026-11-30T23:59:59"
+    )
+
+    model_config = ConfigDict(populate_by_name=True)
 
 
 class RecommendationItem(BaseModel):
@@ -163,6 +459,43 @@ class RecommendationResponse(BaseModel):
     upskilling_recommendations: List[RecommendationItem]
     holistic_recommendations: List[RecommendationItem]
     query_info: Dict[str, Any]
+    next_cursor: Optional[str] = None
+
+
+class BatchRecommendationRequest(BaseModel):
+    """Input model for batch recommendation requests."""
+    queries: List[UserQuery] = Field(
+        ...,
+        description=f"Recommendation queries to answer (at most {BATCH_MAX_QUERIES})"
+    )
+
+
+class BatchRecommendationResult(BaseModel):
+    """Outcome for one query of a batch: either a response or an error."""
+    index: int
+    recommendations: Optional[RecommendationResponse] = None
+    error: Optional[str] = None
+
+
+class BatchRecommendationResponse(BaseModel):
+    """Response model for batch recommendations (results are in input order)."""
+    results: List[BatchRecommendationResult]
+    batch_info: Dict[str, Any]
+
+
+class CatalogItem(BaseModel):
+    """One course or event to add or replace (metadata holds the generator's fields)."""
+    id: str
+    metadata: Dict[str, Union[str, int, float, bool, None]]
+
+
+class IngestRequest(BaseModel):
+    """Bulk catalog change: items to upsert and ids to delete."""
+    items: List[CatalogItem] = Field(
+        default_factory=list,
+        description=f"Items to add or replace (at most {INGEST_MAX_ITEMS} together with deletes)"
+    )
+    delete: List[str] = Field(default_factory=list, description="Ids of items to remove")
 
 # =============================================================================
 # HELPER FUNCTIONS
@@ -190,43 +523,914 @@ def build_audience_filter(user_stage: str) -> Dict:
         }
 
 
-def query_collection(
-    collection,
-    query_embedding: List[float],
-    audience_filter: Dict,
+def query_date_window(query: UserQuery) -> Optional[DateWindow]:
+    """The query's from/to bounds as epoch seconds, or None when it has neither."""
+    if query.date_from is None and query.date_to is None:
+        return None
+    return (
+        int(query.date_from.timestamp()) if query.date_from is not None else None,
+        int(query.date_to.timestamp()) if query.date_to is not None else None,
+    )
+
+
+def prepare_catalog():
+    """
+    Populate the database if it is empty, then build the search indexes.
+    Runs once on the executor at startup; the service reports ready only after it finishes.
+    """
+    global catalog_token
+    started = time.perf_counter()
+    try:
+        # Read first, so a write by another worker while this one loads is picked up by the poll
+        catalog_token = read_catalog_token()
+        check_embedding_models()
+        generated = False
+        # Workers starting together: the first populates, the others wait and then find it filled
+        with shared_index.file_lock(CATALOG_LOCK_PATH):
+            if upskilling_collection.count() == 0:
+                if snapshot.has_snapshot(CATALOG_SNAPSHOT_PATH):
+                    print(f"[STARTUP] Database is empty. Restoring snapshot from {CATALOG_SNAPSHOT_PATH}...")
+                    restore_catalog_snapshot()
+                else:
+                    print(f"[STARTUP] Database is empty. Generating synthetic data using {embedding_provider.name}...")
+                    populate_catalog()
+                    generated = True
+                check_embedding_models()
+
+            # Items stored before event_ts existed get it once (generated items already have it)
+            backfilled = 0
+            if not generated:
+                for collection in (upskilling_collection, holistic_collection):
+                    backfilled += backfill_event_timestamps(collection)
+                if backfilled:
+                    print(f"[STARTUP] Added numeric event_ts to {backfilled} items.")
+
+        # populate_catalog counts items as it adds them; anything else needs one scan
+        if not catalog_stats.loaded:
+            catalog_stats.load((upskilling_collection, holistic_collection))
+
+        if SEARCH_BACKEND not in ("chroma", "numpy", "mmap"):
+            print(f"[WARNING] Unknown SEARCH_BACKEND '{SEARCH_BACKEND}'. Falling back to ChromaDB search.")
+        catalog_status["state"] = "indexing"
+        print(f"[STARTUP] Preparing search indexes (backend={SEARCH_BACKEND}, partitioned={AUDIENCE_PARTITIONING})...")
+        # Partitions copied before the backfill lack event_ts
+        refresh_search_indexes(force=backfilled > 0)
+
+        upskilling_count = catalog_stats.count(upskilling_collection.name)
+        holistic_count = catalog_stats.count(holistic_collection.name)
+        print(f"[STARTUP] Upskilling collection: {upskilling_count} items")
+        print(f"[STARTUP] Holistic collection: {holistic_count} items")
+        if upskilling_count + holistic_count == 0:
+            raise RuntimeError("Catalog is empty after population")
+    except Exception as e:
+        catalog_status["state"] = "failed"
+        catalog_status["last_error"] = str(e)
+        print(f"[ERROR] Failed to prepare catalog: {e}")
+        return
+
+    catalog_status["state"] = "ready"
+    catalog_status["ready_seconds"] = round(time.perf_counter() - started, 3)
+    catalog_ready.set()
+    print(f"[STARTUP] YUNO is ready to serve recommendations! ({catalog_status['ready_seconds']}s)")
+
+    # RIASEC profile lists need ~120 embeddings; /recommend works without them
+    rebuild_profile_table()
+
+
+def check_embedding_models():
+    """Refuse to serve collections embedded with a different model than the configured provider."""
+    for collection in (upskilling_collection, holistic_collection):
+        ensure_collection_model(collection, embedding_provider.name)
+
+
+def restore_catalog_snapshot():
+    """Load a catalog snapshot into the (empty) collections; needs no embedding calls."""
+    global upskilling_collection, holistic_collection
+    catalog_status["state"] = "restoring"
+    restored = snapshot.import_snapshot(
+        chroma_client,
+        CATALOG_SNAPSHOT_PATH,
+        embedding_model=embedding_provider.name,
+        replace=True,
+        store=init_vector_db.get_embedding_store()
+    )
+    catalog_status["items_total"] = sum(restored.values())
+    catalog_status["items_reused"] = catalog_status["items_total"]
+    # import_snapshot recreates the collections, so refresh the handles
+    upskilling_collection = chroma_client.get_collection("upskilling")
+    holistic_collection = chroma_client.get_collection("holistic")
+
+
+def populate_catalog():
+    """
+    Generate synthetic courses and events and embed them in batches, updating catalog_status.
+    Texts already in the embedding store are reused instead of re-embedded.
+    """
+    store = init_vector_db.get_embedding_store()
+    # The collections start empty, so counting each batch as it is added is a complete load
+    catalog_stats.loaded = True
+    
+    catalog_status["state"] = "populating"
+    print("[STARTUP] Generating Upskilling Courses and Holistic Events...")
+    sources = [
+        (upskilling_collection, init_vector_db.generate_upskilling_data(n_samples=POPULATE_SAMPLES_PER_COLLECTION)),
+        (holistic_collection, init_vector_db.generate_holistic_data(n_samples=POPULATE_SAMPLES_PER_COLLECTION)),
+    ]
+    catalog_status["items_total"] = sum(len(df) for _, df in sources)
+    catalog_status["items_remaining"] = catalog_status["items_total"]
+
+    for collection, df in sources:
+        ids = df["id"].tolist()
+        texts = df["embedding_text"].tolist()
+        metadatas = df.drop(columns=["id", "embedding_text"]).to_dict("records")
+        # Lets later ingests of the same items skip unchanged ones
+        for metadata, text in zip(metadatas, texts):
+            metadata[ingest.CONTENT_HASH_FIELD] = ingest.content_hash(text)
+        added = 0
+        for start in range(0, len(ids), POPULATE_BATCH_SIZE):
+            stop = start + POPULATE_BATCH_SIZE
+            embeddings = init_vector_db.get_embeddings(texts[start:stop])
+            # Items whose embedding failed are skipped and counted, not fatal
+            rows = [i for i, embedding in enumerate(embeddings, start) if len(embedding)]
+            failed = len(embeddings) - len(rows)
+            if rows:
+                collection.add(
+                    ids=[ids[i] for i in rows],
+                    documents=[texts[i] for i in rows],
+                    embeddings=[embeddings[i - start] for i in rows],
+                    metadatas=[metadatas[i] for i in rows]
+                )
+                catalog_stats.upsert(collection.name, [ids[i] for i in rows], [metadatas[i] for i in rows])
+            added += len(rows)
+            catalog_status["items_embedded"] += len(rows)
+            if store is not None:
+                catalog_status["items_reused"] = store.hits
+            catalog_status["errors"] += failed
+            catalog_status["items_remaining"] -= len(embeddings)
+            if failed:
+                catalog_status["last_error"] = f"{failed} embeddings failed in '{collection.name}'"
+        print(f"[STARTUP] Added {added} items to '{collection.name}'.")
+
+
+def require_catalog_ready():
+    """Raise 503 until the background catalog preparation has finished."""
+    if upskilling_collection is None or holistic_collection is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Database not initialized. Please run upload.py first."
+        )
+    if not catalog_ready.is_set():
+        raise HTTPException(
+            status_code=503,
+            detail=f"Catalog is not ready yet (state: {catalog_status['state']})",
+            headers={"Retry-After": "5"}
+        )
+
+
+def refresh_search_indexes(force: bool = False):
+    """
+    (Re)build the derived search structures for both collections:
+    the in-memory NumPy indexes when SEARCH_BACKEND is 'numpy', the mapped
+    shared indexes when it is 'mmap' (force rewrites their files), and the
+    per-stage partitions when AUDIENCE_PARTITIONING is on.
+    Expired events are dropped from the rebuilt structures straight away.
+    """
+    with search_index_lock:
+        for collection in (upskilling_collection, holistic_collection):
+            if SEARCH_BACKEND == "mmap":
+                index = load_shared_index(collection, force=force)
+                install_search_index(collection, index)
+                if shared_index.needs_compaction(index, SEARCH_INDEX_NEIGHBORS, SEARCH_GRAPH_MIN_ITEMS):
+                    start_index_compaction(collection)
+            elif SEARCH_BACKEND == "numpy":
+                index = ExactSearchIndex.from_collection(collection)
+                print(f"[INDEX] Loaded {index.count()} vectors from '{collection.name}' (dim={index.dim}, space={index.space}).")
+                if SEARCH_PRECISION != "float32" or SEARCH_PCA_DIM:
+                    index = build_compact_index(index)
+                install_search_index(collection, index)
+            elif AUDIENCE_PARTITIONING:
+                audience_partitions[collection.name] = build_chroma_partitions(
+                    chroma_client,
+                    collection,
+                    audience_partitions.get(collection.name),
+                    force=force
+                )
+                counts = {stage: partition.count() for stage, partition in audience_partitions[collection.name].items()}
+                print(f"[INDEX] Audience partitions for '{collection.name}': {counts}")
+
+
+def install_search_index(collection, index: ExactSearchIndex):
+    """Serve a collection from an in-memory or mapped index, and from its audience partitions (search_index_lock held)."""
+    search_indexes[collection.name] = index
+    if AUDIENCE_PARTITIONING:
+        audience_partitions[collection.name] = build_exact_partitions(index)
+        counts = {stage: partition.count() for stage, partition in audience_partitions[collection.name].items()}
+        print(f"[INDEX] Audience partitions for '{collection.name}': {counts}")
+
+
+def expiry_cutoff() -> Optional[int]:
+    """Oldest event_ts still shown (None when expiry is off); a multiple of EVENT_EXPIRY_INTERVAL_SECONDS."""
+    if not EVENT_EXPIRY:
+        return None
+    step = int(EVENT_EXPIRY_INTERVAL_SECONDS)
+    now = int(time.time()) - EVENT_EXPIRY_GRACE_SECONDS
+    return now - now % step
+
+
+def expiry_window(collection_name: str, date_window: Optional[DateWindow]) -> Optional[DateWindow]:
+    """A date window narrowed to events that have not expired (unchanged where expiry does not apply)."""
+    cutoff = expiry_cutoff() if collection_name in EVENT_EXPIRY_COLLECTIONS else None
+    if cutoff is None:
+        return date_window
+    start, end = date_window or (None, None)
+    return (cutoff if start is None else max(start, cutoff), end)
+
+
+async def expire_events_periodically():
+    """Each time the expiry cutoff advances past some events, invalidate cached results and profile lists."""
+    while True:
+        await asyncio.sleep(EVENT_EXPIRY_INTERVAL_SECONDS)
+        if not catalog_ready.is_set():
+            continue
+        cutoff = expiry_cutoff()
+        previous = event_expiry["cutoff"]
+        event_expiry["cutoff"] = cutoff
+        event_expiry["last_run"] = time.time()
+        if previous is None or cutoff == previous:
+            continue
+        expired = sum(
+            len(catalog_stats.events_between(name, previous, cutoff))
+            for name in EVENT_EXPIRY_COLLECTIONS
+        )
+        event_expiry["expired"] = expired
+        if expired:
+            print(f"[CATALOG] {expired} events expired (cutoff={cutoff}).")
+            mark_catalog_changed(refresh_indexes=False)
+
+
+def build_compact_index(index: ExactSearchIndex) -> ExactSearchIndex:
+    """Compact copy of a freshly loaded index, with its recall/latency report (falls back to float32)."""
+    try:
+        compact = CompactSearchIndex.from_index(
+            index,
+            precision=SEARCH_PRECISION,
+            pca_dim=SEARCH_PCA_DIM,
+            rescore=SEARCH_RESCORE,
+            rescore_path=os.path.join(SEARCH_RESCORE_DIR, f"{index.name}.npy") if SEARCH_RESCORE_DIR else None
+        )
+    except (ValueError, OSError) as e:
+        print(f"[WARNING] Could not build compact index for '{index.name}': {e}. Using float32 vectors.")
+        return index
+
+    if SEARCH_REPORT_QUERIES > 0 and index.count():
+        report = recall_report(index, compact, sample_queries(index, SEARCH_REPORT_QUERIES), k=10)
+    else:
+        report = compact.describe()
+    compact_reports[index.name] = report
+    print(f"[INDEX] Compact index for '{index.name}': {report}")
+    return compact
+
+
+def load_shared_index(collection, force: bool = False) -> ExactSearchIndex:
+    """
+    Map a collection's shared index files. The first worker to need them (or any worker
+    after a catalog change, with force) builds them while the others wait on the lock.
+    """
+    started = time.perf_counter()
+    index = shared_index.load_or_build(
+        collection,
+        SEARCH_INDEX_DIR,
+        force=force,
+        ef=SEARCH_GRAPH_EF,
+        neighbors=SEARCH_INDEX_NEIGHBORS,
+        graph_min_items=SEARCH_GRAPH_MIN_ITEMS
+    )
+    return note_shared_index(collection, index, started)
+
+
+def note_shared_index(collection, index: ExactSearchIndex, started: float) -> ExactSearchIndex:
+    shared_index_info[collection.name] = index.describe()
+    print(f"[INDEX] Mapped {index.count()} vectors of '{collection.name}' from {index.path} ({time.perf_counter() - started:.2f}s).")
+    return index
+
+
+def update_shared_index(collection, touched_ids: List[str]):
+    """
+    Apply one ingest to a collection's shared index files and serve the result (runs with the
+    catalog write lock held). Only the touched items are rewritten and linked into the graph;
+    a full rebuild is left to a background compaction once tombstones pile up.
+    """
+    started = time.perf_counter()
+    index = shared_index.apply_changes(
+        collection,
+        SEARCH_INDEX_DIR,
+        touched_ids,
+        ef=SEARCH_GRAPH_EF,
+        neighbors=SEARCH_INDEX_NEIGHBORS,
+        graph_min_items=SEARCH_GRAPH_MIN_ITEMS
+    )
+    with search_index_lock:
+        install_search_index(collection, note_shared_index(collection, index, started))
+    if shared_index.needs_compaction(index, SEARCH_INDEX_NEIGHBORS, SEARCH_GRAPH_MIN_ITEMS):
+        start_index_compaction(collection)
+
+
+def start_index_compaction(collection):
+    """Rebuild a collection's shared index files on a background thread (one at a time)."""
+    running = index_compactions.get(collection.name)
+    if running is not None and running.is_alive():
+        return
+    thread = threading.Thread(
+        target=compact_shared_index,
+        args=(collection,),
+        name=f"yuno-compact-{collection.name}",
+        daemon=True
+    )
+    index_compactions[collection.name] = thread
+    thread.start()
+
+
+def compact_shared_index(collection):
+    """Full rebuild of one collection's shared index files, then serve them unless something newer was published."""
+    started = time.perf_counter()
+    try:
+        index = shared_index.compact(
+            collection,
+            SEARCH_INDEX_DIR,
+            catalog_write_lock,
+            ef=SEARCH_GRAPH_EF,
+            neighbors=SEARCH_INDEX_NEIGHBORS,
+            graph_min_items=SEARCH_GRAPH_MIN_ITEMS
+        )
+    except Exception as e:
+        print(f"[ERROR] Compacting the shared index of '{collection.name}' failed: {e}")
+        return
+    if index is None:
+        return
+    with search_index_lock:
+        if shared_index.current_index_path(SEARCH_INDEX_DIR, collection.name) != index.path:
+            return
+        install_search_index(collection, note_shared_index(collection, index, started))
+    # Re-applied changes may come from other workers' ingests this worker has not mapped yet
+    mark_catalog_changed(refresh_indexes=False)
+
+
+def reload_shared_indexes():
+    """Switch to index files another worker published after a catalog change (runs on the executor)."""
+    # That worker's ingest also changed the counts this worker keeps
+    catalog_stats.load((upskilling_collection, holistic_collection))
+    with search_index_lock:
+        for collection in (upskilling_collection, holistic_collection):
+            path = shared_index.current_index_path(SEARCH_INDEX_DIR, collection.name)
+            if path is None or path == shared_index_info.get(collection.name, {}).get("path"):
+                continue
+            # Published under the catalog write lock, so it matches the collection: no fingerprint check
+            started = time.perf_counter()
+            index = shared_index.SharedSearchIndex.open(path, ef=SEARCH_GRAPH_EF)
+            install_search_index(collection, note_shared_index(collection, index, started))
+
+
+async def reload_shared_indexes_periodically():
+    """Every SEARCH_INDEX_RELOAD_SECONDS, map shared index files published since this worker mapped its own."""
+    while True:
+        await asyncio.sleep(SEARCH_INDEX_RELOAD_SECONDS)
+        if not catalog_ready.is_set():
+            continue
+        published = [
+            shared_index.current_index_path(SEARCH_INDEX_DIR, collection.name)
+            for collection in (upskilling_collection, holistic_collection)
+        ]
+        mapped = {info["path"] for info in shared_index_info.values()}
+        if all(path is None or path in mapped for path in published):
+            continue
+        try:
+            await run_blocking(reload_shared_indexes)
+        except Exception as e:
+            print(f"[ERROR] Reloading shared indexes failed: {e}")
+            continue
+        mark_catalog_changed(refresh_indexes=False)
+
+
+def get_searcher(collection, user_stage: str, date_window: Optional[DateWindow] = None):
+    """
+    Return (searcher, where) for querying a collection on behalf of a user stage.
+    The searcher is a ChromaDB collection or an ExactSearchIndex (same query() API).
+    Partitioned indexes already contain only that stage's items, so need no audience filter.
+    A date window becomes an event_ts range in the same filter, narrowed to unexpired events.
+    """
+    date_filter = date_window_filter(expiry_window(collection.name, date_window))
+    partitions = audience_partitions.get(collection.name)
+    if partitions is not None:
+        return partitions[user_stage], date_filter
+    return search_indexes.get(collection.name, collection), combine_filters(build_audience_filter(user_stage), date_filter)
+
+
+def read_catalog_token() -> Optional[str]:
+    try:
+        with open(CATALOG_VERSION_PATH, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_catalog_token():
+    """Persist a new catalog version after a write (catalog_write_lock held)."""
+    global catalog_token
+    token = secrets.token_hex(8)
+    directory = os.path.dirname(os.path.abspath(CATALOG_VERSION_PATH))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    os.replace(temp_path, CATALOG_VERSION_PATH)
+    catalog_token = token
+
+
+def reopen_chroma_client():
+    """
+    Swap in a new ChromaDB client and collection handles. A PersistentClient keeps the segments
+    it has loaded and does not see writes made by other processes since; requests still running
+    finish on the old client, which is dropped with its last handle.
+    """
+    global chroma_client, upskilling_collection, holistic_collection
+    chromadb.api.client.SharedSystemClient.clear_system_cache()
+    client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    upskilling = client.get_collection("upskilling")
+    holistic = client.get_collection("holistic")
+    with search_index_lock:
+        chroma_client, upskilling_collection, holistic_collection = client, upskilling, holistic
+        for partitions in audience_partitions.values():
+            for user_stage, partition in partitions.items():
+                if not isinstance(partition, ExactSearchIndex):
+                    partitions[user_stage] = client.get_collection(partition.name)
+
+
+def sync_catalog_version() -> bool:
+    """
+    Catch up with catalog writes another worker persisted (runs on the executor); returns whether
+    there were any. ChromaDB is reopened to see them, then stats and in-memory or mapped indexes
+    are reloaded; Chroma partitions are shared between workers and already include the writes.
+    """
+    global catalog_token
+    token = read_catalog_token()
+    if token == catalog_token:
+        return False
+    # Adopted before reloading, so a write landing meanwhile is seen by the next poll
+    catalog_token = token
+    reopen_chroma_client()
+    if SEARCH_BACKEND == "mmap":
+        reload_shared_indexes()
+    else:
+        catalog_stats.load((upskilling_collection, holistic_collection))
+        if not partitions_update_in_place():
+            refresh_search_indexes(True)
+    return True
+
+
+async def sync_catalog_version_periodically():
+    """Every CATALOG_VERSION_POLL_SECONDS, adopt catalog writes made by other workers and invalidate caches."""
+    while True:
+        await asyncio.sleep(CATALOG_VERSION_POLL_SECONDS)
+        if not catalog_ready.is_set():
+            continue
+        try:
+            changed = await run_blocking(sync_catalog_version)
+        except Exception as e:
+            print(f"[ERROR] Catalog version sync failed: {e}")
+            continue
+        if changed:
+            print(f"[CATALOG] Adopted catalog version {catalog_token} written by another worker.")
+            mark_catalog_changed(refresh_indexes=False)
+
+
+def mark_catalog_changed(refresh_indexes: bool = True):
+    """
+    Record that a collection was added to, upserted or deleted from.
+    The search indexes are rebuilt in the background first; pass refresh_indexes=False
+    when they were already updated in place.
+    """
+    if refresh_indexes:
+        executor.submit(refresh_catalog_views)
+        return
+    bump_collection_version()
+    executor.submit(rebuild_profile_table)
+
+
+def bump_collection_version():
+    """
+    Bump the collection version and drop cached responses and cursors.
+    Call only once the changed indexes are installed: a request racing a rebuild would
+    otherwise cache a result from the old indexes under the new version.
+    """
+    global collection_version
+    collection_version += 1
+    response_cache.clear()
+    ranked_cursors.clear()
+    print(f"[CATALOG] Collection version is now {collection_version}.")
+
+
+def refresh_catalog_views():
+    """Rebuild everything derived from collection contents, then invalidate cached results (runs on the executor)."""
+    try:
+        refresh_search_indexes(force=True)
+    finally:
+        # Still invalidate after a failed rebuild: Chroma-backed reads already see the change
+        bump_collection_version()
+    rebuild_profile_table()
+
+
+def rebuild_profile_table():
+    """Precompute ranked lists for every RIASEC code x user stage."""
+    profile_table.rebuild(
+        collection_version,
+        USER_STAGES,
+        embed_queries_blocking,
+        search_all_collections
+    )
+
+
+def search_all_collections(
+    query_embeddings: List[List[float]],
+    user_stage: str,
     n_results: int
-) -> List[RecommendationItem]:
+) -> Dict[str, List[List[RecommendationItem]]]:
+    """Run one batched query per collection; results are keyed by collection name."""
+    return {
+        collection.name: query_collection_batch(collection, query_embeddings, user_stage, n_results)
+        for collection in (upskilling_collection, holistic_collection)
+    }
+
+
+def response_cache_key(query: UserQuery) -> str:
+    """Cache key covering every input a RecommendationResponse depends on."""
+    fields = jsonable_encoder(query)
+    fields["user_query"] = normalize_query_text(query.user_query)
+    return f"{catalog_token}|{collection_version}|{expiry_cutoff()}|{json.dumps(fields, sort_keys=True)}"
+
+
+def fetch_user_profile(user_id: int) -> Optional[Dict[str, Any]]:
+    """Read a user's profile from the user_auth service (blocking). Returns None if not found."""
+    try:
+        with urllib.request.urlopen(f"{AUTH_API_URL}/user/{user_id}", timeout=5) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+
+
+async def get_profile_vector(user_id: int) -> Dict[str, Any]:
     """
-    Query a ChromaDB collection with embedding and filter.
-    Returns list of RecommendationItems.
+    Return the cached profile entry (query text + embedding) for a user.
+    The profile is re-read at most every USER_PROFILE_POLL_SECONDS and
+    re-embedded only when its profile_version has changed.
     """
+    entry = user_profiles.get(user_id)
+    if entry is not None and user_profiles.is_fresh(entry):
+        return entry
+    
     try:
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            where=audience_filter,
+        profile = await run_blocking(fetch_user_profile, user_id)
+    except Exception as e:
+        if entry is not None:
+            print(f"[WARNING] User service unavailable, using cached profile for user {user_id}: {e}")
+            return entry
+        print(f"[ERROR] Failed to fetch profile for user {user_id}: {e}")
+        raise HTTPException(status_code=502, detail="User service unavailable")
+    
+    if profile is None:
+        user_profiles.invalidate(user_id)
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    if entry is not None and entry["profile_version"] == profile.get("profile_version", 0):
+        user_profiles.revalidate(entry)
+        return entry
+    
+    query_text = profile_query_text(profile.get("riasec_code", ""), profile.get("ocean_scores"))
+    try:
+        embedding = await embed_query(query_text)
+    except Exception as e:
+        print(f"[ERROR] Query Embedding Failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to generate embedding for profile")
+    return user_profiles.put(user_id, profile, query_text, embedding)
+
+
+def partition_counts() -> Optional[Dict[str, Dict[str, int]]]:
+    """Per-stage item counts of the audience partitions (None when partitioning is off)."""
+    if not audience_partitions:
+        return None
+    return {
+        collection_name: {stage: partition.count() for stage, partition in partitions.items()}
+        for collection_name, partitions in audience_partitions.items()
+    }
+
+
+async def run_blocking(func, *args):
+    """Run a blocking call on the shared executor and await its result."""
+    loop = asyncio.get_running_loop()
+    # Carry the request context over so stages timed in the worker reach Server-Timing
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, func, *args))
+
+
+def embed_query_batch(texts: List[str]) -> List[List[float]]:
+    """Embed several user queries with one provider call (blocking for remote providers)."""
+    return embedding_provider.embed(texts, QUERY_TASK_TYPE)
+
+
+def embed_queries_blocking(texts: List[str]) -> List[List[float]]:
+    """Embed many user queries from a worker thread, using the cache and chunked provider calls."""
+    embeddings = [embedding_cache.get(text, embedding_provider.name, QUERY_TASK_TYPE) for text in texts]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    for start in range(0, len(missing), EMBEDDING_BATCH_MAX_SIZE):
+        chunk = missing[start:start + EMBEDDING_BATCH_MAX_SIZE]
+        for i, embedding in zip(chunk, embed_query_batch([texts[i] for i in chunk])):
+            embeddings[i] = embedding
+            embedding_cache.set(texts[i], embedding_provider.name, QUERY_TASK_TYPE, embedding)
+    return embeddings
+
+
+async def embed_query(text: str) -> List[float]:
+    """
+    Embed a user query, served from the embedding cache when possible.
+    Misses go through the batcher (or straight to the provider when batching is off;
+    local providers run inline). Raises on failure so the caller can map it to an HTTP error.
+    """
+    cached = embedding_cache.get(text, embedding_provider.name, QUERY_TASK_TYPE)
+    if cached is not None:
+        return cached
+
+    if embedding_batcher is not None:
+        embedding = await embedding_batcher.embed(text)
+    elif not embedding_provider.remote:
+        embedding = embed_query_batch([text])[0]
+    else:
+        embedding = (await run_blocking(embed_query_batch, [text]))[0]
+    embedding_cache.set(text, embedding_provider.name, QUERY_TASK_TYPE, embedding)
+    return embedding
+
+
+def query_collection_batch(
+    collection,
+    query_embeddings: List[List[float]],
+    user_stage: str,
+    n_results: int,
+    rerank_profiles: Optional[List[Optional[RerankProfile]]] = None,
+    limits: Optional[List[int]] = None,
+    date_window: Optional[DateWindow] = None,
+    mmr_lambdas: Optional[List[Optional[float]]] = None
+) -> List[List[RecommendationItem]]:
+    """
+    Query a collection with several embeddings in one call.
+    Only items whose target audience matches user_stage (and whose event_ts
+    falls inside date_window, when given) are returned.
+    Returns one list of RecommendationItems per embedding, in input order.
+    
+    When a row has a rerank profile, its n_results candidates are re-scored with
+    the blended profile score and only the best limits[row] are returned.
+    When a row has an MMR lambda, the limits[row] results are picked from the
+    candidates by Maximal Marginal Relevance (embeddings are fetched for that).
+    Raises on failure; see query_collection for the single-query wrapper.
+    """
+    searcher, where = get_searcher(collection, user_stage, date_window)
+    include = ["distances"]
+    if mmr_lambdas and any(mmr_lambda is not None for mmr_lambda in mmr_lambdas):
+        include.append("embeddings")
+    # The ANN/exact search alone; metadata is fetched separately so each shows up as its own stage
+    with Stage("vector_query", collection.name):
+        results = searcher.query(
+            query_embeddings=query_embeddings,
+            where=where,
             n_results=n_results,
-            include=["metadatas", "distances"]
+            include=include
         )
-        
+    
+    with Stage("metadata_fetch", collection.name):
+        attach_result_metadatas(searcher, results)
+    
+    with Stage("rank", collection.name):
+        return build_ranked_items(results, len(query_embeddings), n_results, rerank_profiles, limits, mmr_lambdas)
+
+
+def attach_result_metadatas(searcher, results: Dict[str, Any]) -> None:
+    """
+    Fill results["metadatas"] with one get() for the unique ids of a metadata-less query result.
+    Chroma does not return ids in request order; items deleted since the query are dropped from their row.
+    """
+    id_rows = results["ids"] or []
+    unique_ids = list(dict.fromkeys(item_id for row in id_rows for item_id in row))
+    fetched = searcher.get(ids=unique_ids, include=["metadatas"]) if unique_ids else {"ids": [], "metadatas": []}
+    metadata_by_id = dict(zip(fetched["ids"], fetched["metadatas"] or [{}] * len(fetched["ids"])))
+    
+    for row, ids in enumerate(id_rows):
+        keep = [i for i, item_id in enumerate(ids) if item_id in metadata_by_id]
+        if len(keep) < len(ids):
+            for field in ("ids", "distances", "embeddings"):
+                if results.get(field) is not None:
+                    values = results[field][row]
+                    results[field][row] = values[keep] if isinstance(values, np.ndarray) else [values[i] for i in keep]
+    results["metadatas"] = [[metadata_by_id[item_id] or {} for item_id in ids] for ids in id_rows]
+
+
+def build_ranked_items(
+    results: Dict[str, Any],
+    rows: int,
+    n_results: int,
+    rerank_profiles: Optional[List[Optional[RerankProfile]]],
+    limits: Optional[List[int]],
+    mmr_lambdas: Optional[List[Optional[float]]] = None
+) -> List[List[RecommendationItem]]:
+    """
+    Turn raw query results into scored RecommendationItems, re-ranking rows that have a
+    profile and diversifying rows that have an MMR lambda (relevance is then the blended score).
+    """
+    batch_recommendations = []
+    for row in range(rows):
         recommendations = []
-        if results and results["ids"] and len(results["ids"][0]) > 0:
-            for i, doc_id in enumerate(results["ids"][0]):
-                # Convert distance to similarity score (lower distance = higher similarity)
-                distance = results["distances"][0][i] if results["distances"] else 0
-                score = max(0, 1 - distance)  # Normalize to 0-1
-                
+        if results and results["ids"] and len(results["ids"][row]) > 0:
+            ids = results["ids"][row]
+            metadatas = results["metadatas"][row] if results["metadatas"] else [{}] * len(ids)
+            # Convert distance to similarity score (lower distance = higher similarity)
+            distances = np.asarray(results["distances"][row] if results["distances"] else np.zeros(len(ids)))
+            scores = np.maximum(0, 1 - distances)  # Normalize to 0-1
+            
+            profile = rerank_profiles[row] if rerank_profiles else None
+            limit = limits[row] if limits else n_results
+            mmr_lambda = mmr_lambdas[row] if mmr_lambdas else None
+            if mmr_lambda is not None and results.get("embeddings") is not None:
+                with Stage("diversify"):
+                    order, scores = diversify_candidates(
+                        distances, scores, metadatas, results["embeddings"][row], limit, mmr_lambda, profile
+                    )
+            elif profile is not None:
+                order, scores = profile.rerank(scores, metadatas, limit)
+            else:
+                order = range(min(limit, len(ids)))
+                scores = scores[:len(order)]
+            
+            for i, score in zip(order, scores):
                 recommendations.append(RecommendationItem(
-                    id=doc_id,
-                    score=round(score, 4),
-                    metadata=results["metadatas"][0][i] if results["metadatas"] else {}
+                    id=ids[i],
+                    score=round(float(score), 4),
+                    metadata=ingest.public_metadata(metadatas[i])
                 ))
-        
-        return recommendations
+        batch_recommendations.append(recommendations)
+    
+    return batch_recommendations
+
+
+def query_collection(
+    collection,
+    query_embedding: List[float],
+    user_stage: str,
+    n_results: int,
+    rerank_profile: Optional[RerankProfile] = None,
+    limit: Optional[int] = None,
+    date_window: Optional[DateWindow] = None,
+    mmr_lambda: Optional[float] = None
+) -> List[RecommendationItem]:
+    """
+    Query a collection with embedding for a user stage.
+    Returns list of RecommendationItems.
+    """
+    try:
+        return query_collection_batch(
+            collection,
+            [query_embedding],
+            user_stage,
+            n_results,
+            rerank_profiles=[rerank_profile],
+            limits=[limit or n_results],
+            date_window=date_window,
+            mmr_lambdas=[mmr_lambda]
+        )[0]
     
     except Exception as e:
         print(f"[ERROR] Query failed: {e}")
         return []
 
+
+def rerank_profile_for(query: UserQuery) -> Optional[RerankProfile]:
+    """Build the re-ranking profile for a query, or None when re-ranking is off."""
+    if not query.rerank:
+        return None
+    return RerankProfile(
+        riasec_code=query.riasec_code,
+        ocean_scores=query.ocean_scores,
+        weight_similarity=RERANK_WEIGHT_SIMILARITY,
+        weight_riasec=RERANK_WEIGHT_RIASEC,
+        weight_ocean=RERANK_WEIGHT_OCEAN
+    )
+
+
+def mmr_lambda_for(query: UserQuery) -> Optional[float]:
+    """The query's MMR lambda, or None when diversity re-ranking is off."""
+    if not query.diversify:
+        return None
+    return query.mmr_lambda if query.mmr_lambda is not None else MMR_LAMBDA
+
+
+def diversify_candidates(
+    distances: np.ndarray,
+    scores: np.ndarray,
+    metadatas: List[Dict[str, Any]],
+    embeddings,
+    limit: int,
+    mmr_lambda: float,
+    profile: Optional[RerankProfile] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    MMR-ordered candidate positions and their scores.
+    Relevance is the blended profile score when re-ranking, else 1 - distance left
+    unclipped, so candidates beyond distance 1 still differ in relevance.
+    """
+    relevance = profile.score(scores, metadatas) if profile is not None else 1 - distances
+    order = mmr_select(relevance, embeddings, limit, mmr_lambda)
+    return order, np.maximum(0, relevance[order])
+
+
+def candidate_count(query: UserQuery) -> int:
+    """Number of candidates to fetch: the limit, or an over-fetch when re-ranking or diversifying."""
+    n_results = query.limit
+    if query.rerank:
+        n_results = max(n_results, min(query.limit * RERANK_CANDIDATE_FACTOR, RERANK_MAX_CANDIDATES))
+    if query.diversify:
+        n_results = max(n_results, min(query.limit * MMR_CANDIDATE_FACTOR, MMR_MAX_CANDIDATES))
+    return n_results
+
+def build_recommendation_response(
+    query: UserQuery,
+    upskilling_results: List[RecommendationItem],
+    holistic_results: List[RecommendationItem]
+) -> RecommendationResponse:
+    """Assemble the response returned for a single recommendation query."""
+    return RecommendationResponse(
+        upskilling_recommendations=upskilling_results,
+        holistic_recommendations=holistic_results,
+        query_info={
+            "original_query": query.user_query,
+            "user_stage": query.user_stage,
+            "limit": query.limit,
+            "upskilling_found": len(upskilling_results),
+            "holistic_found": len(holistic_results),
+            **request_query_info(query)
+        }
+    )
+
+
+def request_query_info(query: UserQuery) -> Dict[str, Any]:
+    """query_info fields echoing the request itself (everything but the result counts)."""
+    return {
+        "original_query": query.user_query,
+        "user_stage": query.user_stage,
+        "limit": query.limit,
+        **({"reranked": True} if query.rerank else {}),
+        **({"mmr_lambda": mmr_lambda_for(query)} if query.diversify else {}),
+        **({"from": query.date_from} if query.date_from is not None else {}),
+        **({"to": query.date_to} if query.date_to is not None else {})
+    }
+
+
+def response_for_request(response: RecommendationResponse, query: UserQuery) -> RecommendationResponse:
+    """
+    A shared response (cached, or computed once for identical concurrent requests) as seen
+    by this request: cache keys normalize the query text, so its query_info is rebuilt
+    from the current request instead of echoing whoever computed it.
+    """
+    return response.model_copy(update={"query_info": {**response.query_info, **request_query_info(query)}})
+
+
+async def embed_queries(texts: List[str]) -> Dict[str, Any]:
+    """
+    Embed many user queries at once for batch requests.
+    Cache misses are sent to the embedding provider in chunks of EMBEDDING_BATCH_MAX_SIZE.
+    Returns a mapping of text to embedding, or to the exception if its chunk failed.
+    """
+    embeddings: Dict[str, Any] = {}
+    missing = []
+    for text in dict.fromkeys(texts):
+        cached = embedding_cache.get(text, embedding_provider.name, QUERY_TASK_TYPE)
+        if cached is not None:
+            embeddings[text] = cached
+        else:
+            missing.append(text)
+    
+    chunks = [missing[i:i + EMBEDDING_BATCH_MAX_SIZE] for i in range(0, len(missing), EMBEDDING_BATCH_MAX_SIZE)]
+    chunk_results = await asyncio.gather(
+        *[run_blocking(embed_query_batch, chunk) for chunk in chunks],
+        return_exceptions=True
+    )
+    for chunk, result in zip(chunks, chunk_results):
+        if isinstance(result, Exception):
+            print(f"[ERROR] Batch Embedding Failed: {result}")
+            for text in chunk:
+                embeddings[text] = result
+            continue
+        for text, embedding in zip(chunk, result):
+            embeddings[text] = embedding
+            embedding_cache.set(text, embedding_provider.name, QUERY_TASK_TYPE, embedding)
+    
+    return embeddings
+
 # =============================================================================
 # API ENDPOINTS
 # =============================================================================
@@ -240,53 +1444,172 @@ async def root():
         "status": "running",
         "endpoints": {
             "/recommend": "POST - Get personalized recommendations",
-            "/health": "GET - Health check",
-            "/stats": "GET - Database statistics"
+            "/recommend/batch": "POST - Get recommendations for many queries at once",
+            "/recommend/stream": "POST - Stream recommendations per collection (NDJSON or SSE)",
+            "/recommend/next": "GET - Next page of a paginated /recommend query (by cursor)",
+            "/recommend/profile/{riasec}/{stage}": "GET - Precomputed recommendations for a RIASEC code",
+            "/recommend/user/{user_id}": "GET - Recommendations from a user's stored profile",
+            "/health": "GET - Health check and catalog loading progress",
+            "/health/live": "GET - Liveness probe",
+            "/health/ready": "GET - Readiness probe (503 until the catalog is usable)",
+            "/stats": "GET - Database statistics",
+            "/collections/{name}/items": "POST - Bulk upsert/delete catalog items (re-embeds only changed text)",
+            "/collections/{name}/export": "GET - Stream a whole collection (NDJSON or Arrow)",
+            "/facets": "GET - Item counts by category, type, RIASEC, audience and event date",
+            "/metrics": "GET - Per-stage latency histograms (Prometheus format)"
         }
     }
 
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
+    """Health check endpoint, including catalog population progress."""
     collections_ready = upskilling_collection is not None and holistic_collection is not None
+    if catalog_ready.is_set():
+        status = "healthy"
+    elif catalog_status["state"] == "failed":
+        status = "degraded"
+    else:
+        status = "starting"
     return {
-        "status": "healthy" if collections_ready else "degraded",
-        "embedding_model": EMBEDDING_MODEL,
+        "status": status,
+        "live": True,
+        "ready": catalog_ready.is_set(),
+        "catalog": dict(catalog_status),
+        "embedding_model": embedding_provider.name if embedding_provider else None,
+        "embedding_provider": embedding_provider.describe() if embedding_provider else None,
         "database_path": CHROMA_DB_PATH,
+        "search_backend": SEARCH_BACKEND,
+        "compact_index": compact_reports or None,
+        "shared_index": shared_index_info or None,
         "collections_loaded": collections_ready
     }
 
 
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe: the process is up and serving HTTP."""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the catalog is populated and indexed, 503 before."""
+    if not catalog_ready.is_set():
+        return JSONResponse(
+            status_code=503,
+            content={"status": catalog_status["state"], "ready": False}
+        )
+    return {"status": "ready", "ready": True}
+
+
 @app.get("/stats")
 async def get_stats():
     """Get database statistics."""
     if upskilling_collection is None or holistic_collection is None:
         raise HTTPException(status_code=503, detail="Database not initialized. Run upload.py first.")
     
+    store = init_vector_db.get_embedding_store()
+    if catalog_stats.loaded:
+        upskilling_count = catalog_stats.count(upskilling_collection.name)
+        holistic_count = catalog_stats.count(holistic_collection.name)
+    else:
+        # Only until the startup scan has finished
+        upskilling_count = upskilling_collection.count()
+        holistic_count = holistic_collection.count()
     return {
-        "upskilling_count": upskilling_collection.count(),
-        "holistic_count": holistic_collection.count(),
-        "total_items": upskilling_collection.count() + holistic_collection.count()
+        "upskilling_count": upskilling_count,
+        "holistic_count": holistic_count,
+        "total_items": upskilling_count + holistic_count,
+        "audience_partitions": partition_counts(),
+        "compact_index": compact_reports or None,
+        "shared_index": shared_index_info or None,
+        "event_expiry": {
+            "enabled": EVENT_EXPIRY,
+            "collections": EVENT_EXPIRY_COLLECTIONS,
+            "interval_seconds": EVENT_EXPIRY_INTERVAL_SECONDS,
+            "cutoff": expiry_cutoff(),
+            "last_expired": event_expiry["expired"],
+            "last_run": event_expiry["last_run"],
+        },
+        "collection_version": collection_version,
+        "catalog_version": catalog_token,
+        "response_cache": {**response_cache.stats(), **recommendation_flights.stats()},
+        "pagination_cursors": ranked_cursors.stats(),
+        "profile_table": profile_table.stats(),
+        "user_profiles": user_profiles.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "embedding_batcher": embedding_batcher.stats() if embedding_batcher else None,
+        "embedding_store": store.stats() if store else None
     }
 
 
+@app.get("/facets")
+async def get_facets(collection: Optional[str] = None):
+    """
+    Item counts per facet value (category, type, primary_riasec, target_audience)
+    and per upcoming event_date window, served from memory.
+    """
+    require_catalog_ready()
+    facets = catalog_stats.facets(collection)
+    if collection is not None and not facets:
+        raise HTTPException(status_code=404, detail=f"Collection '{collection}' not found")
+    return {"collection_version": collection_version, "collections": facets}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Per-stage latency histograms in the Prometheus text exposition format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.post("/recommend", response_model=RecommendationResponse)
 async def get_recommendations(query: UserQuery):
     """
     Get personalized recommendations based on user query and stage.
     
     - Filters by target audience (Secondary/Post-Secondary)
+    - Optional `from`/`to` keep only items whose event_date falls in that window
+      (applied inside the index query; undated items are excluded when a window is given)
+    - Optional `diversify` picks results by Maximal Marginal Relevance (`mmr_lambda`)
+      from over-fetched candidates, so near-duplicates do not fill the list
     - Searches BOTH upskilling and holistic collections
     - Returns ranked results from each collection
     """
     
-    # Validate collections
-    if upskilling_collection is None or holistic_collection is None:
-        raise HTTPException(
-            status_code=503,
-            detail="Database not initialized. Please run upload.py first."
+    validate_recommendation_query(query)
+    
+    if query.paginate:
+        # Every paginated response carries a fresh cursor, so it is never cached
+        try:
+            return await asyncio.wait_for(start_pagination(query), timeout=RECOMMEND_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            print(f"[ERROR] Recommendation timed out after {RECOMMEND_TIMEOUT_SECONDS}s")
+            raise HTTPException(status_code=504, detail="Recommendation request timed out")
+    
+    with Stage("cache_lookup"):
+        cache_key = response_cache_key(query)
+        ready = lookup_ready_response(query, cache_key)
+    if ready is not None:
+        return ready
+    
+    try:
+        # Identical concurrent requests share a single computation
+        response = await asyncio.wait_for(
+            recommendation_flights.do(cache_key, lambda: _compute_and_cache(query, cache_key)),
+            timeout=RECOMMEND_TIMEOUT_SECONDS
         )
+        return response_for_request(response, query)
+    except asyncio.TimeoutError:
+        print(f"[ERROR] Recommendation timed out after {RECOMMEND_TIMEOUT_SECONDS}s")
+        raise HTTPException(status_code=504, detail="Recommendation request timed out")
+
+
+def validate_recommendation_query(query: UserQuery):
+    """Reject recommendation requests that cannot be served (raises HTTPException)."""
+    
+    # Validate collections
+    require_catalog_ready()
     
     # Validate user_stage
     if query.user_stage not in ["Secondary", "Post-Secondary"]:
@@ -295,57 +1618,572 @@ async def get_recommendations(query: UserQuery):
             detail="user_stage must be 'Secondary' or 'Post-Secondary'"
         )
     
+    if invalid_date_window(query):
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+
+
+def invalid_date_window(query: UserQuery) -> bool:
+    window = query_date_window(query)
+    return window is not None and None not in window and window[0] > window[1]
+
+
+def lookup_ready_response(query: UserQuery, cache_key: str) -> Optional[RecommendationResponse]:
+    """Return a response that needs no search: from the RIASEC profile table or the response cache."""
+    
+    # Templated RIASEC profile queries are answered from the precomputed table
+    # (unless it is still being rebuilt after a catalog change)
+    riasec_code = riasec_code_for_query(query.user_query)
+    if (
+        riasec_code is not None
+        and not query.rerank
+        and not query.diversify
+        and query_date_window(query) is None
+        and query.limit <= profile_table.depth
+        and profile_table.version == collection_version
+    ):
+        lists = profile_table.lookup(riasec_code, query.user_stage)
+        if lists is not None:
+            return build_recommendation_response(
+                query,
+                lists[upskilling_collection.name][:query.limit],
+                lists[holistic_collection.name][:query.limit]
+            )
+    
+    cached = response_cache.get(cache_key)
+    return response_for_request(cached, query) if cached is not None else None
+
+
+async def _compute_and_cache(query: UserQuery, cache_key: str) -> RecommendationResponse:
+    """Compute a response and store it in the response cache."""
+    response = await _compute_recommendations(query)
+    with Stage("serialize"):
+        size_bytes = len(json.dumps(jsonable_encoder(response)))
+    response_cache.set(cache_key, response, size_bytes=size_bytes)
+    return response
+
+
+async def _compute_recommendations(query: UserQuery) -> RecommendationResponse:
+    """Embed the query and search both collections without blocking the event loop."""
+    
     # Generate embedding for user query
     try:
-        embedding_result = genai.embed_content(
-            model=EMBEDDING_MODEL,
-            content=query.user_query,
-            task_type="retrieval_query"
+        with Stage("embed"):
+            query_embedding = await embed_query(query.user_query)
+    except Exception as e:
+        print(f"[ERROR] Query Embedding Failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to generate embedding for query")
+    
+    with Stage("search"):
+        return await search_recommendations(query, query_embedding)
+
+
+async def search_recommendations(query: UserQuery, query_embedding: List[float]) -> RecommendationResponse:
+    """Search both collections concurrently with an already computed query embedding."""
+    rerank_profile = rerank_profile_for(query)
+    n_results = candidate_count(query)
+    date_window = query_date_window(query)
+    mmr_lambda = mmr_lambda_for(query)
+    upskilling_results, holistic_results = await asyncio.gather(
+        run_blocking(
+            query_collection,
+            upskilling_collection,
+            query_embedding,
+            query.user_stage,
+            n_results,
+            rerank_profile,
+            query.limit,
+            date_window,
+            mmr_lambda
+        ),
+        run_blocking(
+            query_collection,
+            holistic_collection,
+            query_embedding,
+            query.user_stage,
+            n_results,
+            rerank_profile,
+            query.limit,
+            date_window,
+            mmr_lambda
         )
-        query_embedding = embedding_result['embedding']
+    )
+    
+    return build_recommendation_response(query, upskilling_results, holistic_results)
+
+
+# =============================================================================
+# PAGINATION
+# =============================================================================
+
+def rank_candidates(
+    collection,
+    query_embedding: List[float],
+    user_stage: str,
+    depth: int,
+    rerank_profile: Optional[RerankProfile] = None,
+    date_window: Optional[DateWindow] = None,
+    mmr_lambda: Optional[float] = None
+) -> Tuple[List[str], List[float]]:
+    """
+    Ranked ids and scores of up to `depth` candidates from one collection.
+    Metadata is only fetched here when re-ranking needs it; pages look it up later.
+    With an MMR lambda the whole list is ordered by MMR, so every page stays diverse.
+    """
+    searcher, where = get_searcher(collection, user_stage, date_window)
+    include = ["metadatas", "distances"] if rerank_profile is not None else ["distances"]
+    if mmr_lambda is not None:
+        include.append("embeddings")
+    with Stage("vector_query", collection.name):
+        results = searcher.query(
+            query_embeddings=[query_embedding],
+            where=where,
+            n_results=depth,
+            include=include
+        )
+    if not results or not results["ids"] or not results["ids"][0]:
+        return [], []
+    
+    ids = list(results["ids"][0])
+    scores = np.maximum(0, 1 - np.asarray(results["distances"][0]))
+    if mmr_lambda is not None:
+        with Stage("diversify", collection.name):
+            order, scores = diversify_candidates(
+                np.asarray(results["distances"][0]),
+                scores,
+                results["metadatas"][0] if rerank_profile is not None else [],
+                results["embeddings"][0],
+                depth,
+                mmr_lambda,
+                rerank_profile
+            )
+        ids = [ids[i] for i in order]
+    elif rerank_profile is not None:
+        order, scores = rerank_profile.rerank(scores, results["metadatas"][0], depth)
+        ids = [ids[i] for i in order]
+    return ids, [round(float(score), 4) for score in scores]
+
+
+def fetch_page_items(collection, ids: List[str], scores: List[float]) -> List[RecommendationItem]:
+    """Look up metadata for one page of ranked ids (from memory with the NumPy backend)."""
+    if not ids:
+        return []
+    source = search_indexes.get(collection.name, collection)
+    with Stage("metadata_fetch", collection.name):
+        page = source.get(ids=ids, include=["metadatas"])
+    # Chroma does not return ids in request order; items deleted since ranking are skipped
+    metadata_by_id = dict(zip(page["ids"], page["metadatas"] or [{}] * len(page["ids"])))
+    return [
+        RecommendationItem(id=item_id, score=score, metadata=ingest.public_metadata(metadata_by_id[item_id]))
+        for item_id, score in zip(ids, scores)
+        if item_id in metadata_by_id
+    ]
+
+
+def parse_cursor(cursor: str) -> Tuple[str, int]:
+    """Split a cursor into its candidate-list token and page offset (raises 400 if malformed)."""
+    token, _, offset = cursor.rpartition(".")
+    if not token or not offset.isdigit():
+        raise HTTPException(status_code=400, detail="Malformed cursor")
+    return token, int(offset)
+
+
+async def start_pagination(query: UserQuery) -> RecommendationResponse:
+    """Rank PAGINATION_DEPTH candidates per collection once, cache them under a cursor and return page one."""
+    try:
+        with Stage("embed"):
+            query_embedding = await embed_query(query.user_query)
     except Exception as e:
-        print(f"[ERROR] Gemini Embedding Failed: {e}")
+        print(f"[ERROR] Query Embedding Failed: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate embedding for query")
     
-    # Build audience filter
-    audience_filter = build_audience_filter(query.user_stage)
+    collections = (upskilling_collection, holistic_collection)
+    rerank_profile = rerank_profile_for(query)
+    depth = max(query.limit, PAGINATION_DEPTH)
+    try:
+        with Stage("search"):
+            ranked = await asyncio.gather(*[
+                run_blocking(
+                    rank_candidates,
+                    collection,
+                    query_embedding,
+                    query.user_stage,
+                    depth,
+                    rerank_profile,
+                    query_date_window(query),
+                    mmr_lambda_for(query)
+                )
+                for collection in collections
+            ])
+    except Exception as e:
+        print(f"[ERROR] Query failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to search the catalog")
     
-    # Query both collections
-    upskilling_results = query_collection(
-        upskilling_collection,
-        query_embedding,
-        audience_filter,
-        query.limit
+    token = secrets.token_urlsafe(16)
+    entry = {
+        "query": query,
+        "version": collection_version,
+        "lists": {collection.name: candidates for collection, candidates in zip(collections, ranked)},
+    }
+    ranked_cursors.set(token, entry)
+    return await paginated_page(token, entry, 0, query.limit)
+
+
+async def paginated_page(token: str, entry: Dict[str, Any], offset: int, limit: int) -> RecommendationResponse:
+    """Build one page from a cached candidate list, with a next_cursor while candidates remain."""
+    lists = entry["lists"]
+    fetches = []
+    for collection in (upskilling_collection, holistic_collection):
+        ids, scores = lists[collection.name]
+        fetches.append(run_blocking(fetch_page_items, collection, ids[offset:offset + limit], scores[offset:offset + limit]))
+    upskilling_results, holistic_results = await asyncio.gather(*fetches)
+    
+    response = build_recommendation_response(entry["query"], upskilling_results, holistic_results)
+    candidates = {name: len(ids) for name, (ids, _) in lists.items()}
+    response.query_info.update({"limit": limit, "offset": offset, "candidates": candidates})
+    if offset + limit < max(candidates.values()):
+        response.next_cursor = f"{token}.{offset + limit}"
+    return response
+
+
+@app.get("/recommend/next", response_model=RecommendationResponse)
+async def get_next_page(cursor: str, limit: Optional[int] = Query(default=None, ge=1, le=20)):
+    """
+    Next page of a paginated /recommend query.
+    
+    - Slices the ranked candidates cached under the cursor (no embedding or vector search)
+    - Fetches metadata only for the items on this page
+    - Cursors expire after CURSOR_TTL_SECONDS or when the catalog changes (410)
+    """
+    require_catalog_ready()
+    token, offset = parse_cursor(cursor)
+    entry = ranked_cursors.get(token)
+    if entry is None or entry["version"] != collection_version:
+        raise HTTPException(status_code=410, detail="Cursor expired; run the query again")
+    
+    try:
+        return await asyncio.wait_for(
+            paginated_page(token, entry, offset, limit or entry["query"].limit),
+            timeout=RECOMMEND_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        print(f"[ERROR] Recommendation timed out after {RECOMMEND_TIMEOUT_SECONDS}s")
+        raise HTTPException(status_code=504, detail="Recommendation request timed out")
+
+
+@app.post("/recommend/stream")
+async def stream_recommendations(query: UserQuery, format: str = "ndjson"):
+    """
+    Stream recommendations as each collection's search finishes.
+    
+    - format=ndjson: one JSON object per line
+    - format=sse: Server-Sent Events (the frame type is the event name)
+    
+    Frames are {"type": "upskilling_recommendations" | "holistic_recommendations", "items": [...]}
+    in completion order, then {"type": "query_info", "query_info": {...}}.
+    An {"type": "error", "detail": ...} frame is sent if the deadline passes mid-stream.
+    """
+    validate_recommendation_query(query)
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+    
+    cache_key = response_cache_key(query)
+    ready = lookup_ready_response(query, cache_key)
+    query_embedding = None
+    if ready is None:
+        # Embed before streaming starts so failures still map to an HTTP status
+        try:
+            query_embedding = await asyncio.wait_for(embed_query(query.user_query), timeout=RECOMMEND_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Recommendation request timed out")
+        except Exception as e:
+            print(f"[ERROR] Query Embedding Failed: {e}")
+            raise HTTPException(status_code=500, detail="Failed to generate embedding for query")
+    
+    def encode(frame: Dict[str, Any]) -> str:
+        data = json.dumps(jsonable_encoder(frame))
+        if format == "sse":
+            return f"event: {frame['type']}\ndata: {data}\n\n"
+        return data + "\n"
+    
+    async def frames():
+        if ready is not None:
+            yield encode({"type": "upskilling_recommendations", "items": ready.upskilling_recommendations})
+            yield encode({"type": "holistic_recommendations", "items": ready.holistic_recommendations})
+            yield encode({"type": "query_info", "query_info": ready.query_info})
+            return
+        
+        rerank_profile = rerank_profile_for(query)
+        n_results = candidate_count(query)
+        date_window = query_date_window(query)
+        mmr_lambda = mmr_lambda_for(query)
+        
+        async def search(field: str, collection):
+            items = await run_blocking(
+                query_collection,
+                collection,
+                query_embedding,
+                query.user_stage,
+                n_results,
+                rerank_profile,
+                query.limit,
+                date_window,
+                mmr_lambda
+            )
+            return field, items
+        
+        results: Dict[str, List[RecommendationItem]] = {}
+        try:
+            for next_done in asyncio.as_completed(
+                [
+                    search("upskilling_recommendations", upskilling_collection),
+                    search("holistic_recommendations", holistic_collection)
+                ],
+                timeout=RECOMMEND_TIMEOUT_SECONDS
+            ):
+                field, items = await next_done
+                results[field] = items
+                yield encode({"type": field, "items": items})
+        except asyncio.TimeoutError:
+            print(f"[ERROR] Recommendation stream timed out after {RECOMMEND_TIMEOUT_SECONDS}s")
+            yield encode({"type": "error", "detail": "Recommendation request timed out"})
+            return
+        
+        response = build_recommendation_response(
+            query,
+            results["upskilling_recommendations"],
+            results["holistic_recommendations"]
+        )
+        response_cache.set(cache_key, response, size_bytes=len(json.dumps(jsonable_encoder(response))))
+        yield encode({"type": "query_info", "query_info": response.query_info})
+    
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream" if format == "sse" else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
+
+
+@app.post("/recommend/batch", response_model=BatchRecommendationResponse)
+async def get_batch_recommendations(batch: BatchRecommendationRequest):
+    """
+    Get recommendations for many queries in one request.
+    
+    - Embeds all queries in bulk (cached queries are not re-embedded)
+    - Sends one multi-embedding query per collection and audience group
+    - Returns results in input order; a failing item does not fail the batch
+    """
+    
+    # Validate collections
+    require_catalog_ready()
     
-    holistic_results = query_collection(
-        holistic_collection,
-        query_embedding,
-        audience_filter,
-        query.limit
+    if len(batch.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch may contain at most {BATCH_MAX_QUERIES} queries"
+        )
+    
+    try:
+        return await asyncio.wait_for(compute_batch_recommendations(batch), timeout=RECOMMEND_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        print(f"[ERROR] Batch recommendation timed out after {RECOMMEND_TIMEOUT_SECONDS}s")
+        raise HTTPException(status_code=504, detail="Recommendation request timed out")
+
+
+async def compute_batch_recommendations(batch: BatchRecommendationRequest) -> BatchRecommendationResponse:
+    """Embed, search and assemble a validated batch (bounded by the endpoint's deadline)."""
+    queries = batch.queries
+    errors: Dict[int, str] = {}
+    for i, query in enumerate(queries):
+        if query.user_stage not in ["Secondary", "Post-Secondary"]:
+            errors[i] = "user_stage must be 'Secondary' or 'Post-Secondary'"
+        elif invalid_date_window(query):
+            errors[i] = "'from' must not be after 'to'"
+    
+    # Embed all valid queries in bulk
+    embeddings = await embed_queries([q.user_query for i, q in enumerate(queries) if i not in errors])
+    
+    # Group by audience and date window so each group needs one query per collection
+    groups: Dict[Tuple[str, Optional[DateWindow]], List[int]] = {}
+    for i, query in enumerate(queries):
+        if i in errors:
+            continue
+        if isinstance(embeddings[query.user_query], Exception):
+            errors[i] = "Failed to generate embedding for query"
+            continue
+        groups.setdefault((query.user_stage, query_date_window(query)), []).append(i)
+    
+    jobs = []
+    for (user_stage, date_window), indices in groups.items():
+        group_embeddings = [embeddings[queries[i].user_query] for i in indices]
+        n_results = max(candidate_count(queries[i]) for i in indices)
+        rerank_profiles = [rerank_profile_for(queries[i]) for i in indices]
+        limits = [queries[i].limit for i in indices]
+        mmr_lambdas = [mmr_lambda_for(queries[i]) for i in indices]
+        for collection in (upskilling_collection, holistic_collection):
+            jobs.append((collection.name, indices, run_blocking(
+                query_collection_batch,
+                collection,
+                group_embeddings,
+                user_stage,
+                n_results,
+                rerank_profiles,
+                limits,
+                date_window,
+                mmr_lambdas
+            )))
+    
+    job_results = await asyncio.gather(*[job for _, _, job in jobs], return_exceptions=True)
+    
+    found: Dict[str, Dict[int, List[RecommendationItem]]] = {
+        upskilling_collection.name: {},
+        holistic_collection.name: {}
+    }
+    for (collection_name, indices, _), result in zip(jobs, job_results):
+        if isinstance(result, Exception):
+            print(f"[ERROR] Batch query failed: {result}")
+            for i in indices:
+                errors[i] = "Failed to query recommendations"
+            continue
+        for i, items in zip(indices, result):
+            found[collection_name][i] = items[:queries[i].limit]
+    
+    results = []
+    for i, query in enumerate(queries):
+        if i in errors:
+            results.append(BatchRecommendationResult(index=i, error=errors[i]))
+            continue
+        results.append(BatchRecommendationResult(
+            index=i,
+            recommendations=build_recommendation_response(
+                query,
+                found[upskilling_collection.name][i],
+                found[holistic_collection.name][i]
+            )
+        ))
+    
+    # Queries per user stage; groups are also split by date window, reported as query_groups
+    audience_groups: Dict[str, int] = {}
+    for (user_stage, _), indices in groups.items():
+        audience_groups[user_stage] = audience_groups.get(user_stage, 0) + len(indices)
+    
+    return BatchRecommendationResponse(
+        results=results,
+        batch_info={
+            "total": len(queries),
+            "succeeded": len(queries) - len(errors),
+            "failed": len(errors),
+            "audience_groups": audience_groups,
+            "query_groups": len(groups)
+        }
     )
+
+
+@app.get("/recommend/profile/{riasec_code}/{user_stage}", response_model=RecommendationResponse)
+async def get_profile_recommendations(riasec_code: str, user_stage: str, limit: int = 3):
+    """
+    Get precomputed recommendations for a 3-letter RIASEC code and user stage.
+    Served from memory without any embedding call or vector search.
+    """
+    require_catalog_ready()
+    code = normalize_riasec_code(riasec_code)
+    if code is None:
+        raise HTTPException(
+            status_code=400,
+            detail="riasec_code must be 3 distinct letters from R, I, A, S, E, C"
+        )
+    if user_stage not in USER_STAGES:
+        raise HTTPException(
+            status_code=400,
+            detail="user_stage must be 'Secondary' or 'Post-Secondary'"
+        )
+    if not 1 <= limit <= profile_table.depth:
+        raise HTTPException(
+            status_code=400,
+            detail=f"limit must be between 1 and {profile_table.depth}"
+        )
+    
+    lists = profile_table.lookup(code, user_stage)
+    if lists is None:
+        raise HTTPException(status_code=503, detail="Profile recommendations are not ready yet")
     
+    upskilling_results = lists[upskilling_collection.name][:limit]
+    holistic_results = lists[holistic_collection.name][:limit]
     return RecommendationResponse(
         upskilling_recommendations=upskilling_results,
         holistic_recommendations=holistic_results,
         query_info={
-            "original_query": query.user_query,
-            "user_stage": query.user_stage,
-            "limit": query.limit,
+            "riasec_code": code,
+            "user_stage": user_stage,
+            "limit": limit,
             "upskilling_found": len(upskilling_results),
-            "holistic_found": len(holistic_results)
+            "holistic_found": len(holistic_results),
+            "collection_version": profile_table.version
         }
     )
 
 
+@app.get("/recommend/user/{user_id}", response_model=RecommendationResponse)
+async def get_user_recommendations(
+    user_id: int,
+    limit: int = Query(default=3, ge=1, le=20),
+    user_stage: Optional[str] = None,
+    rerank: bool = False
+):
+    """
+    Get recommendations from a user's stored RIASEC/OCEAN profile.
+    
+    - The profile is read from the user_auth service
+    - Its embedding is cached per user and only recomputed when the profile changes
+    - user_stage defaults to the user's education level
+    - rerank blends similarity with the stored RIASEC/OCEAN profile
+    """
+    require_catalog_ready()
+    entry = await get_profile_vector(user_id)
+    
+    stage = user_stage or entry["education_level"]
+    if stage not in USER_STAGES:
+        raise HTTPException(
+            status_code=400,
+            detail="user_stage must be 'Secondary' or 'Post-Secondary'"
+        )
+    
+    query = UserQuery(
+        user_query=entry["query_text"],
+        user_stage=stage,
+        limit=limit,
+        rerank=rerank,
+        riasec_code=entry["riasec_code"],
+        ocean_scores=entry["ocean_scores"]
+    )
+    try:
+        response = await asyncio.wait_for(
+            search_recommendations(query, entry["embedding"]),
+            timeout=RECOMMEND_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        print(f"[ERROR] Recommendation timed out after {RECOMMEND_TIMEOUT_SECONDS}s")
+        raise HTTPException(status_code=504, detail="Recommendation request timed out")
+    
+    response.query_info["user_id"] = user_id
+    response.query_info["profile_version"] = entry["profile_version"]
+    return response
+
+
+@app.post("/users/{user_id}/profile-changed")
+async def profile_changed(user_id: int, x_notify_token: Optional[str] = Header(None)):
+    """Drop a user's cached profile vector (called by user_auth after an assessment is saved)."""
+    if PROFILE_NOTIFY_TOKEN is None or x_notify_token is None \
+            or not secrets.compare_digest(x_notify_token, PROFILE_NOTIFY_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid or missing X-Notify-Token")
+    return {"user_id": user_id, "invalidated": user_profiles.invalidate(user_id)}
+
+
 # =============================================================================
 # ADDITIONAL ENDPOINTS
 # =============================================================================
 
-@app.get("/collections/{collection_name}/sample")
-async def get_sample(collection_name: str, n: int = 5):
-    """Get sample items from a collection (for debugging)."""
-    
+def get_collection_or_404(collection_name: str):
+    """Resolve a collection name from the URL (raises 404 if unknown, 503 if not loaded yet)."""
     if collection_name == "upskilling":
         collection = upskilling_collection
     elif collection_name == "holistic":
@@ -355,6 +2193,14 @@ async def get_sample(collection_name: str, n: int = 5):
     
     if collection is None:
         raise HTTPException(status_code=503, detail="Collection not loaded")
+    return collection
+
+
+@app.get("/collections/{collection_name}/sample")
+async def get_sample(collection_name: str, n: int = 5):
+    """Get sample items from a collection (for debugging)."""
+    
+    collection = get_collection_or_404(collection_name)
     
     # Get sample
     results = collection.peek(limit=n)
@@ -363,12 +2209,148 @@ async def get_sample(collection_name: str, n: int = 5):
         "collection": collection_name,
         "sample_count": len(results["ids"]) if results["ids"] else 0,
         "items": [
-            {"id": results["ids"][i], "metadata": results["metadatas"][i]}
+            {"id": results["ids"][i], "metadata": ingest.public_metadata(results["metadatas"][i])}
             for i in range(len(results["ids"]))
         ] if results["ids"] else []
     }
 
 
+def partitions_update_in_place() -> bool:
+    """Whether ingests can patch the Chroma audience partitions instead of rebuilding the indexes."""
+    return AUDIENCE_PARTITIONING and SEARCH_BACKEND not in ("numpy", "mmap")
+
+
+@contextmanager
+def catalog_write_lock():
+    """Held while the catalog is written: ingest_lock in this process, CATALOG_LOCK_PATH across workers."""
+    with ingest_lock, shared_index.file_lock(CATALOG_LOCK_PATH):
+        yield
+
+
+def ingest_blocking(collection, items: List[Dict[str, Any]], delete_ids: List[str]) -> Dict[str, Any]:
+    """
+    Apply a bulk change to one collection, keeping stats, partitions and the shared index
+    files in step (runs on the executor).
+    """
+    partitions = audience_partitions.get(collection.name) if partitions_update_in_place() else None
+    touched: List[str] = []
+    
+    def on_change(ids, metadatas, deleted_ids):
+        catalog_stats.upsert(collection.name, ids, metadatas)
+        catalog_stats.delete(collection.name, deleted_ids)
+        if partitions:
+            apply_partition_changes(collection, partitions, ids, deleted_ids)
+        touched.extend(ids)
+        touched.extend(deleted_ids)
+    
+    with catalog_write_lock():
+        summary = ingest.ingest_items(
+            collection,
+            items,
+            delete_ids,
+            embed=init_vector_db.get_embeddings,
+            on_change=on_change,
+            write_batch_size=min(INGEST_WRITE_BATCH_SIZE, chroma_client.get_max_batch_size()),
+            embed_batch_size=INGEST_EMBED_BATCH_SIZE
+        )
+        if touched and SEARCH_BACKEND == "mmap":
+            # Under the same lock, so the published files match the collection
+            update_shared_index(collection, touched)
+        if touched:
+            write_catalog_token()
+    return summary
+
+
+@app.post("/collections/{collection_name}/items")
+async def ingest_collection_items(
+    collection_name: str,
+    request: IngestRequest,
+    x_ingest_token: Optional[str] = Header(None)
+):
+    """
+    Bulk upsert and delete catalog items.
+    
+    - Items whose embedding text is unchanged (by content hash) are not re-embedded
+    - New or changed texts are embedded in batches and written in large chunks
+    - Catalog stats and search indexes are updated before the response, then caches are invalidated
+    """
+    if INGEST_TOKEN is None or x_ingest_token is None \
+            or not secrets.compare_digest(x_ingest_token, INGEST_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid or missing X-Ingest-Token")
+    collection = get_collection_or_404(collection_name)
+    require_catalog_ready()
+    if len(request.items) + len(request.delete) > INGEST_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {INGEST_MAX_ITEMS} items and deletes per request"
+        )
+    
+    started = time.perf_counter()
+    summary = await run_blocking(
+        ingest_blocking,
+        collection,
+        [{"id": item.id, "metadata": item.metadata} for item in request.items],
+        request.delete
+    )
+    if summary["updated"] or summary["embedded"] or summary["deleted"]:
+        if not partitions_update_in_place() and SEARCH_BACKEND != "mmap":
+            # Answer once the change is searchable, with the version that includes it
+            await run_blocking(refresh_search_indexes, True)
+        mark_catalog_changed(refresh_indexes=False)
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    summary["collection_version"] = collection_version
+    print(
+        f"[INGEST] '{collection_name}': {summary['embedded']} embedded, {summary['updated']} updated, "
+        f"{summary['unchanged']} unchanged, {summary['deleted']} deleted, {summary['failed']} failed."
+    )
+    return summary
+
+
+@app.get("/collections/{collection_name}/export")
+async def export_collection(
+    collection_name: str,
+    format: str = "ndjson",
+    fields: Optional[str] = None,
+    include_embeddings: bool = False,
+    include_documents: bool = True,
+    page_size: int = Query(default=export.PAGE_SIZE, ge=1, le=10000)
+):
+    """
+    Stream a whole collection as NDJSON or an Arrow IPC stream.
+    
+    - Pages through the collection, so memory use does not grow with its size
+    - fields: comma-separated metadata fields to keep (default: all)
+    - Pages are read on a worker thread; other requests keep being served
+    """
+    collection = get_collection_or_404(collection_name)
+    if format not in export.EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"format must be one of: {', '.join(export.EXPORT_FORMATS)}"
+        )
+    if format == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Arrow export needs pyarrow installed on the server")
+    
+    chunks = export.iter_export(
+        collection,
+        format,
+        fields=export.parse_fields(fields),
+        include_embeddings=include_embeddings,
+        include_documents=include_documents,
+        page_size=page_size,
+        exclude_fields=ingest.INTERNAL_FIELDS
+    )
+    extension = "arrows" if format == "arrow" else "ndjson"
+    return StreamingResponse(
+        chunks,
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{collection_name}.{extension}"'}
+    )
+
+
 # =============================================================================
 # RUN INSTRUCTIONS
 # =============================================================================
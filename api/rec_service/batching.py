@@ -0,0 +1,129 @@
+"""
+Request coalescing for the YUNO Recommendation Service
+Collects concurrent query texts for a short window and embeds them in one call
+"""
+
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+# Upper bounds (inclusive) of the batch-size distribution reported in stats
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 100]
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent embedding requests into batched provider calls.
+
+    Callers await embed(text). Pending texts are flushed as one call to
+    embed_batch(texts) when max_batch_size texts are queued or window_ms has
+    elapsed since the first one arrived, whichever comes first. The blocking
+    embed_batch call runs on the given executor so the event loop stays free.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], List[List[float]]],
+        executor: Optional[Executor] = None,
+        window_ms: float = 5,
+        max_batch_size: int = 32,
+    ):
+        self.embed_batch = embed_batch
+        self.executor = executor
+        self.window_seconds = window_ms / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._inflight: Set[asyncio.Task] = set()
+
+        # Metrics
+        self.batches = 0
+        self.items = 0
+        self.failed_batches = 0
+        self.max_batch_seen = 0
+        self.batch_size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush(loop)
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_seconds, self._flush, loop)
+
+        return await future
+
+    def _flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+        if self._pending:
+            self._flush_handle = loop.call_later(self.window_seconds, self._flush, loop)
+        if batch:
+            # Keep a reference so in-flight batches are not garbage collected
+            task = loop.create_task(self._run_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future, float]]) -> None:
+        dispatched_at = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            wait = dispatched_at - enqueued_at
+            self.total_wait_seconds += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+        self._record_batch_size(len(batch))
+
+        # Identical texts in the same window are embedded once
+        unique_texts = list(dict.fromkeys(text for text, _, _ in batch))
+        loop = asyncio.get_running_loop()
+        try:
+            embeddings = await loop.run_in_executor(self.executor, self.embed_batch, unique_texts)
+            if len(embeddings) != len(unique_texts):
+                raise ValueError(f"Expected {len(unique_texts)} embeddings, got {len(embeddings)}")
+        except Exception as e:
+            self.failed_batches += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(unique_texts, embeddings))
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+
+    def _record_batch_size(self, size: int) -> None:
+        self.batches += 1
+        self.items += size
+        self.max_batch_seen = max(self.max_batch_seen, size)
+        for i, bound in enumerate(BATCH_SIZE_BUCKETS):
+            if size <= bound:
+                self.batch_size_counts[i] += 1
+                return
+        self.batch_size_counts[-1] += 1  # Overflow bucket
+
+    def stats(self) -> Dict[str, Any]:
+        histogram = {
+            f"le_{bound}": count for bound, count in zip(BATCH_SIZE_BUCKETS, self.batch_size_counts)
+        }
+        histogram[f"gt_{BATCH_SIZE_BUCKETS[-1]}"] = self.batch_size_counts[-1]
+        return {
+            "window_ms": self.window_seconds * 1000,
+            "max_batch_size": self.max_batch_size,
+            "batches": self.batches,
+            "items": self.items,
+            "failed_batches": self.failed_batches,
+            "pending": len(self._pending),
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_seen": self.max_batch_seen,
+            "batch_size_histogram": histogram,
+            "avg_queue_wait_ms": round(self.total_wait_seconds / self.items * 1000, 3) if self.items else 0.0,
+            "max_queue_wait_ms": round(self.max_wait_seconds * 1000, 3),
+        }
@@ -0,0 +1,460 @@
+"""
+End-to-end load benchmark for the YUNO Recommendation Service
+Builds synthetic catalogs, runs the FastAPI app in-process and drives concurrent /recommend traffic
+
+Usage:
+    python benchmark.py --sizes 200,10000,100000,1000000 --concurrency 32 --requests 2000 --output bench.json
+
+Each catalog size runs in its own subprocess (fresh app state, comparable RSS).
+The embedder is deterministic and local, so no network or API key is needed.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from embedding_providers import EmbeddingProvider, HashingEmbeddingProvider
+
+DEFAULT_SIZES = [200, 10_000, 100_000, 1_000_000]
+PERCENTILES = [50, 95, 99]
+
+QUERY_TOPICS = [
+    "coding", "python", "data science", "robotics", "digital art", "photography", "music production",
+    "public speaking", "leadership", "volunteering", "entrepreneurship", "marketing", "finance",
+    "yoga", "cycling", "rock climbing", "pottery", "design thinking", "cybersecurity", "writing",
+]
+QUERY_TEMPLATES = [
+    "I want to learn {topic}",
+    "weekend {topic} activities near me",
+    "beginner friendly {topic} course",
+    "meet people who enjoy {topic}",
+    "{topic} workshop for students",
+]
+
+
+class RandomEmbeddingProvider(EmbeddingProvider):
+    """Deterministic fake embedder: a unit vector seeded by crc32 of the text."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.name = f"bench/random-{dim}"
+
+    def embed(self, texts: List[str], task_type: str) -> List[List[float]]:
+        matrix = np.empty((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(self.dim)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix.tolist()
+
+
+def make_provider(name: str, dim: int) -> EmbeddingProvider:
+    if name == "hashing":
+        return HashingEmbeddingProvider(dim)
+    return RandomEmbeddingProvider(dim)
+
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    """count/mean/max and percentiles of a list of milliseconds."""
+    if not values:
+        return {"count": 0}
+    array = np.asarray(values)
+    summary = {"count": len(values), "mean": round(float(array.mean()), 3), "max": round(float(array.max()), 3)}
+    for p, value in zip(PERCENTILES, np.percentile(array, PERCENTILES)):
+        summary[f"p{p}"] = round(float(value), 3)
+    return summary
+
+
+def memory_mb() -> Dict[str, float]:
+    """
+    Current and peak resident set size of this process. On Linux, rss_anon is private
+    heap and rss_file is mapped files, whose pages other workers share (mmap backend).
+    """
+    stats = {}
+    fields = {"VmRSS": "rss", "VmHWM": "peak_rss", "RssAnon": "rss_anon", "RssFile": "rss_file"}
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    stats[fields[key]] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        stats["peak_rss"] = round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    return stats
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+            text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# =============================================================================
+# CATALOG
+# =============================================================================
+
+def build_catalog(db_path: str, size: int, provider: EmbeddingProvider, chunk_size: int) -> Dict[str, Any]:
+    """Generate `size` items (half courses, half events), embed them and load them into ChromaDB."""
+    import chromadb
+    import init_vector_db
+
+    started = time.perf_counter()
+    client = chromadb.PersistentClient(path=db_path)
+    max_batch = min(chunk_size, client.get_max_batch_size())
+    sources = [
+        ("upskilling", init_vector_db.generate_upskilling_data(n_samples=(size + 1) // 2)),
+        ("holistic", init_vector_db.generate_holistic_data(n_samples=size // 2)),
+    ]
+    generated = time.perf_counter()
+
+    embed_seconds = 0.0
+    counts = {}
+    for name, df in sources:
+        collection = client.get_or_create_collection(name, metadata={"embedding_model": provider.name})
+        ids = df["id"].tolist()
+        texts = df["embedding_text"].tolist()
+        metadatas = df.drop(columns=["id", "embedding_text"]).to_dict("records")
+        del df
+        for start in range(0, len(ids), max_batch):
+            stop = start + max_batch
+            embed_started = time.perf_counter()
+            embeddings = provider.embed(texts[start:stop], "retrieval_document")
+            embed_seconds += time.perf_counter() - embed_started
+            collection.add(
+                ids=ids[start:stop],
+                documents=texts[start:stop],
+                embeddings=embeddings,
+                metadatas=metadatas[start:stop]
+            )
+        counts[name] = collection.count()
+    sources.clear()
+
+    return {
+        "items": counts,
+        "generate_seconds": round(generated - started, 3),
+        "embed_seconds": round(embed_seconds, 3),
+        "total_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def make_queries(count: int, distinct: int, profile_share: float, seed: int) -> List[Dict[str, Any]]:
+    """Request bodies: free-text queries (optionally repeated) plus a share of templated RIASEC queries."""
+    from profiles import RIASEC_CODES, riasec_query_text
+
+    rng = random.Random(seed)
+    distinct = distinct or count
+    texts = []
+    for i in range(distinct):
+        template = QUERY_TEMPLATES[i % len(QUERY_TEMPLATES)]
+        texts.append(f"{template.format(topic=rng.choice(QUERY_TOPICS))} #{i}")
+
+    queries = []
+    for i in range(count):
+        if rng.random() < profile_share:
+            text = riasec_query_text(rng.choice(RIASEC_CODES))
+        else:
+            text = texts[i % distinct]
+        queries.append({
+            "user_query": text,
+            "user_stage": rng.choice(["Secondary", "Post-Secondary"]),
+            "limit": 5,
+        })
+    return queries
+
+
+# =============================================================================
+# IN-PROCESS ASGI CLIENT
+# =============================================================================
+
+async def asgi_request(app, method: str, path: str, body: bytes = b""):
+    """Send one HTTP request straight to the ASGI app; returns (status, body)."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    response = {"status": None, "body": []}
+    done = asyncio.Event()
+    sent_body = False
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+            if not message.get("more_body"):
+                done.set()
+
+    await app(scope, receive, send)
+    done.set()
+    return response["status"], b"".join(response["body"])
+
+
+def stage_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Current rec_stage_duration_seconds series from the metrics module, keyed like Server-Timing."""
+    import metrics
+
+    return {
+        f"{name}.{collection}" if collection else name: series
+        for (name, collection), series in metrics.STAGE_SECONDS.snapshot().items()
+    }
+
+
+def summarize_stages(before: Dict[str, Dict[str, Any]], after: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Per-stage count/mean and percentiles (milliseconds) of the observations made between two
+    snapshots. Percentiles are interpolated within histogram buckets, as histogram_quantile does.
+    """
+    import metrics
+
+    bounds = [bound * 1000 for bound in metrics.STAGE_SECONDS.buckets]
+    stages = {}
+    for key, series in sorted(after.items()):
+        previous = before.get(key, {"buckets": [0] * len(series["buckets"]), "sum": 0.0, "count": 0})
+        count = series["count"] - previous["count"]
+        if count <= 0:
+            continue
+        cumulative = [now - then for now, then in zip(series["buckets"], previous["buckets"])]
+        summary = {"count": count, "mean": round((series["sum"] - previous["sum"]) * 1000 / count, 3)}
+        for p in PERCENTILES:
+            rank = count * p / 100
+            index = next(i for i, total in enumerate(cumulative) if total >= rank)
+            if index >= len(bounds):
+                # Beyond the last bucket: the best bound available is the last finite one
+                value = bounds[-1]
+            else:
+                lower = bounds[index - 1] if index else 0.0
+                below = cumulative[index - 1] if index else 0
+                in_bucket = cumulative[index] - below
+                value = lower + (bounds[index] - lower) * (rank - below) / in_bucket
+            summary[f"p{p}"] = round(value, 3)
+        stages[key] = summary
+    return stages
+
+
+async def drive_load(app, queries: List[Dict[str, Any]], concurrency: int, warmup: int):
+    """
+    Send queries from `concurrency` workers; the first `warmup` requests are not measured.
+    Returns latencies, status counts, elapsed seconds and per-stage timings from the metrics module.
+    """
+    bodies = [json.dumps(query).encode() for query in queries]
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    position = 0
+
+    async def worker():
+        nonlocal position
+        while position < len(bodies):
+            i = position
+            position += 1
+            started = time.perf_counter()
+            status, _ = await asgi_request(app, "POST", "/recommend", bodies[i])
+            elapsed = time.perf_counter() - started
+            if i >= warmup:
+                latencies.append(elapsed * 1000)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    async def start_recording():
+        while position < warmup:
+            await asyncio.sleep(0.001)
+        return time.perf_counter(), stage_snapshot()
+
+    recorder = asyncio.ensure_future(start_recording())
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finished = time.perf_counter()
+    stages_after = stage_snapshot()
+    measured_from, stages_before = await recorder
+    return latencies, statuses, finished - measured_from, summarize_stages(stages_before, stages_after)
+
+
+# =============================================================================
+# SINGLE RUN (subprocess)
+# =============================================================================
+
+async def run_size(args, work_dir: str) -> Dict[str, Any]:
+    db_path = os.path.join(work_dir, "local_vector_db")
+    provider = make_provider(args.embedder, args.dim)
+    catalog = build_catalog(db_path, args.size, provider, args.chunk_size)
+    memory_after_catalog = memory_mb()
+
+    import app as appmod
+    import init_vector_db
+
+    init_vector_db.set_embedding_provider(provider)
+    appmod.CHROMA_DB_PATH = db_path
+
+    queries = make_queries(args.requests + args.warmup, args.distinct_queries, args.profile_share, args.seed)
+    async with appmod.app.router.lifespan_context(appmod.app):
+        started = time.perf_counter()
+        while not appmod.catalog_ready.is_set():
+            if appmod.catalog_status["state"] == "failed":
+                raise RuntimeError(f"Catalog failed to load: {appmod.catalog_status['last_error']}")
+            await asyncio.sleep(0.05)
+        ready_seconds = time.perf_counter() - started
+        # Let the RIASEC profile table finish so it does not compete with the measured traffic
+        while not appmod.profile_table.ready and appmod.profile_table.last_error is None:
+            await asyncio.sleep(0.05)
+        memory_before_load = memory_mb()
+
+        latencies, statuses, elapsed, stages = await drive_load(
+            appmod.app, queries, args.concurrency, args.warmup
+        )
+        stats = appmod.response_cache.stats()
+
+    return {
+        "size": args.size,
+        "backend": appmod.SEARCH_BACKEND,
+        "partitioned": appmod.AUDIENCE_PARTITIONING,
+        "embedder": provider.name,
+        "concurrency": args.concurrency,
+        "requests": len(latencies),
+        "catalog": catalog,
+        "ready_seconds": round(ready_seconds, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_ms": summarize(latencies),
+        "status_counts": statuses,
+        "stages_ms": stages,
+        "response_cache": stats,
+        "memory_mb": {
+            "after_catalog": memory_after_catalog,
+            "before_load": memory_before_load,
+            "after_load": memory_mb(),
+        },
+    }
+
+
+def run_single(args) -> None:
+    """Subprocess entry point: benchmark one catalog size and print the result as JSON."""
+    # The benchmark's embedder is local, so skip persistent caches and request batching
+    os.environ["EMBEDDING_STORE_PATH"] = ""
+    os.environ.setdefault("EMBEDDING_BATCH_WINDOW_MS", "0")
+    # Stage timings are read from the app's metrics histograms
+    os.environ["METRICS_ENABLED"] = "true"
+    if args.backend:
+        os.environ["SEARCH_BACKEND"] = args.backend
+    with tempfile.TemporaryDirectory(prefix="yuno-bench-") as work_dir:
+        os.chdir(work_dir)
+        result = asyncio.run(run_size(args, work_dir))
+    print("BENCHMARK_RESULT " + json.dumps(result))
+
+
+# =============================================================================
+# COMMAND LINE
+# =============================================================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark /recommend throughput and latency")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated catalog sizes (items across both collections)")
+    parser.add_argument("--backends", default="", help="Comma-separated SEARCH_BACKEND values (default: app default)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000, help="Measured requests per run")
+    parser.add_argument("--warmup", type=int, default=100, help="Unmeasured requests sent first")
+    parser.add_argument("--distinct-queries", type=int, default=0,
+                        help="Number of distinct free-text queries (0 = every request distinct)")
+    parser.add_argument("--profile-share", type=float, default=0.0,
+                        help="Fraction of requests using the templated RIASEC query")
+    parser.add_argument("--embedder", choices=["random", "hashing"], default="random")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Items embedded/added per ChromaDB call")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--backend", default="", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    if args.size is not None:
+        run_single(args)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    backends = [backend for backend in args.backends.split(",") if backend] or [""]
+    passthrough = sys.argv[1:]
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "runs": [],
+    }
+    for backend in backends:
+        for size in sizes:
+            print(f"[BENCH] size={size} backend={backend or 'default'} ...", flush=True)
+            command = [sys.executable, os.path.abspath(__file__), *passthrough, "--size", str(size)]
+            if backend:
+                command += ["--backend", backend]
+            process = subprocess.run(
+                command,
+                cwd=here,
+                env={**os.environ, "PYTHONPATH": here + os.pathsep + os.environ.get("PYTHONPATH", "")},
+                capture_output=True,
+                text=True
+            )
+            lines = [line for line in process.stdout.splitlines() if line.startswith("BENCHMARK_RESULT ")]
+            if process.returncode != 0 or not lines:
+                error = (process.stderr or process.stdout).strip().splitlines()[-1:] or ["unknown error"]
+                print(f"[ERROR] Run failed: {error[0]}")
+                report["runs"].append({"size": size, "backend": backend or None, "error": error[0]})
+                continue
+            result = json.loads(lines[-1][len("BENCHMARK_RESULT "):])
+            report["runs"].append(result)
+            latency = result["latency_ms"]
+            print(
+                f"[BENCH]   {result['throughput_rps']} req/s, p50={latency.get('p50')}ms "
+                f"p95={latency.get('p95')}ms p99={latency.get('p99')}ms, "
+                f"rss={result['memory_mb']['after_load'].get('rss')}MB"
+            )
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[BENCH] Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+In-process caches for the YUNO Recommendation Service
+Bounded LRU/TTL caches used to avoid repeated Gemini embedding calls and searches
+"""
+
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Disk-tier writes between purges of expired rows and trims back to disk_max_entries
+DISK_TRIM_EVERY = 256
+
+
+def normalize_query_text(text: str) -> str:
+    """Collapse whitespace and case so trivially different queries share a key."""
+    return _WHITESPACE_RE.sub(" ", text).strip().casefold()
+
+
+# =============================================================================
+# LRU CACHE
+# =============================================================================
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with a maximum entry count and a per-entry TTL.
+    A ttl_seconds of 0 (or less) disables expiry. When max_bytes is set, entries
+    are also evicted until the sum of their declared sizes fits the budget.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 0, max_bytes: int = 0):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, size = entry
+            if expires_at and expires_at < time.monotonic():
+                del self._data[key]
+                self.total_bytes -= size
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, size_bytes: int = 0) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds > 0 else 0
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous[2]
+            self._data[key] = (value, expires_at, size_bytes)
+            self.total_bytes += size_bytes
+            while len(self._data) > self.max_entries or (
+                self.max_bytes and self.total_bytes > self.max_bytes and len(self._data) > 1
+            ):
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return None
+            self.total_bytes -= entry[2]
+            return entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+        if self.max_bytes:
+            stats["bytes"] = self.total_bytes
+            stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+# =============================================================================
+# SINGLE-FLIGHT
+# =============================================================================
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one computation.
+
+    The first caller starts fn() as its own task; callers arriving while it is
+    in flight await the same task. The task is shielded, so a caller that times
+    out or disconnects does not cancel the work for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every caller gave up
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            "computed": self.leaders,
+            "coalesced": self.shared,
+        }
+
+
+# =============================================================================
+# EMBEDDING CACHE
+# =============================================================================
+
+class EmbeddingCache:
+    """
+    Two-tier cache for query embeddings keyed on (normalized text, model, task type).
+
+    The memory tier is an LRUCache. When disk_path is set, embeddings are also
+    written to a small SQLite file so they survive restarts; disk hits are
+    promoted back into memory. The file is bounded: on open and every
+    DISK_TRIM_EVERY writes, rows past the TTL are deleted and the least
+    recently used rows beyond disk_max_entries are evicted.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 0,
+        disk_path: Optional[str] = None,
+        disk_max_entries: int = 100000,
+    ):
+        self.memory = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.disk_max_entries = max(1, disk_max_entries)
+        self.disk_hits = 0
+        self.disk_evicted = 0
+        self._disk_writes = 0
+        self._disk_lock = threading.Lock()
+        self._disk: Optional[sqlite3.Connection] = None
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    cache_key TEXT PRIMARY KEY,
+                    embedding BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            columns = {row[1] for row in self._disk.execute("PRAGMA table_info(embeddings)")}
+            if "accessed_at" not in columns:
+                # Files written before eviction existed: their rows count as last used when created
+                self._disk.execute("ALTER TABLE embeddings ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+                self._disk.execute("UPDATE embeddings SET accessed_at = created_at")
+            self._disk.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed_at ON embeddings (accessed_at)")
+            self._disk.commit()
+            with self._disk_lock:
+                self._trim_disk()
+
+    @staticmethod
+    def make_key(text: str, model: str, task_type: str) -> str:
+        return f"{model}|{task_type}|{normalize_query_text(text)}"
+
+    def get(self, text: str, model: str, task_type: str) -> Optional[List[float]]:
+        key = self.make_key(text, model, task_type)
+        embedding = self.memory.get(key)
+        if embedding is not None or self._disk is None:
+            return embedding
+
+        with self._disk_lock:
+            row = self._disk.execute(
+                "SELECT embedding, created_at FROM embeddings WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if self.ttl_seconds > 0 and row[1] + self.ttl_seconds < now:
+                return None
+            self._disk.execute("UPDATE embeddings SET accessed_at = ? WHERE cache_key = ?", (now, key))
+            self._disk.commit()
+
+        embedding = np.frombuffer(row[0], dtype=np.float32).tolist()
+        self.disk_hits += 1
+        self.memory.set(key, embedding)
+        return embedding
+
+    def set(self, text: str, model: str, task_type: str, embedding: List[float]) -> None:
+        key = self.make_key(text, model, task_type)
+        self.memory.set(key, embedding)
+        if self._disk is None:
+            return
+        blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        now = time.time()
+        with self._disk_lock:
+            self._disk.execute(
+                "INSERT OR REPLACE INTO embeddings (cache_key, embedding, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, blob, now, now),
+            )
+            self._disk.commit()
+            self._disk_writes += 1
+            if self._disk_writes % DISK_TRIM_EVERY == 0:
+                self._trim_disk()
+
+    def _trim_disk(self) -> None:
+        """Delete expired rows, then the least recently used ones beyond disk_max_entries (lock held)."""
+        evicted = 0
+        if self.ttl_seconds > 0:
+            evicted += self._disk.execute(
+                "DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+        excess = self._disk.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.disk_max_entries
+        if excess > 0:
+            evicted += self._disk.execute(
+                "DELETE FROM embeddings WHERE cache_key IN "
+                "(SELECT cache_key FROM embeddings ORDER BY accessed_at LIMIT ?)",
+                (excess,)
+            ).rowcount
+        self._disk.commit()
+        self.disk_evicted += evicted
+
+    def close(self) -> None:
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.close()
+            self._disk = None
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.memory.stats()
+        # A disk hit is a memory miss, but it still avoided the remote call
+        stats["misses"] -= self.disk_hits
+        stats["disk_hits"] = self.disk_hits
+        stats["disk_enabled"] = self._disk is not None
+        if self._disk is not None:
+            stats["disk_max_entries"] = self.disk_max_entries
+            stats["disk_evicted"] = self.disk_evicted
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,161 @@
+"""
+Incrementally maintained catalog statistics for the YUNO Recommendation Service
+Item and facet counts per collection, so /stats and /facets never scan ChromaDB,
+plus each collection's items sorted by event timestamp
+"""
+
+import threading
+from collections import Counter
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from event_dates import DATE_FIELD, TIMESTAMP_FIELD, EventDateIndex, event_timestamp
+
+# Metadata fields counted per value
+FACET_FIELDS = ("category", "type", "primary_riasec", "target_audience")
+
+# Upcoming event_date windows reported by /facets (days from today, end exclusive)
+DATE_WINDOWS = (("next_7_days", 7), ("next_30_days", 30), ("next_90_days", 90))
+
+LOAD_PAGE_SIZE = 5000
+
+# Facet values of one item: one value (or None) per FACET_FIELDS entry, then the event day
+ItemFacets = Tuple[Optional[str], ...]
+
+
+def item_facets(metadata: Optional[Dict[str, Any]]) -> ItemFacets:
+    metadata = metadata or {}
+    values = [metadata.get(field) for field in FACET_FIELDS]
+    event_date = metadata.get("event_date")
+    # Dates are stored as 'YYYY-MM-DD HH:MM:SS'; counting per day keeps the windows cheap
+    values.append(str(event_date)[:10] if event_date else None)
+    return tuple(None if value is None else str(value) for value in values)
+
+
+class CollectionStats:
+    """Counts for one collection, plus each item's facet values so deletes and upserts can be undone."""
+
+    def __init__(self):
+        self.items: Dict[str, ItemFacets] = {}
+        self.facets: Dict[str, Counter] = {field: Counter() for field in FACET_FIELDS}
+        self.event_days: Counter = Counter()
+        self.event_times = EventDateIndex()
+
+    def _count(self, facets: ItemFacets, delta: int) -> None:
+        for field, value in zip(FACET_FIELDS, facets):
+            if value is not None:
+                counter = self.facets[field]
+                counter[value] += delta
+                if counter[value] <= 0:
+                    del counter[value]
+        day = facets[-1]
+        if day is not None:
+            self.event_days[day] += delta
+            if self.event_days[day] <= 0:
+                del self.event_days[day]
+
+    def upsert(self, item_id: str, metadata: Optional[Dict[str, Any]]) -> None:
+        previous = self.items.get(item_id)
+        if previous is not None:
+            self._count(previous, -1)
+        facets = item_facets(metadata)
+        self.items[item_id] = facets
+        self._count(facets, 1)
+        metadata = metadata or {}
+        timestamp = metadata.get(TIMESTAMP_FIELD)
+        self.event_times.set(item_id, timestamp if timestamp is not None else event_timestamp(metadata.get(DATE_FIELD)))
+
+    def delete(self, item_id: str) -> None:
+        previous = self.items.pop(item_id, None)
+        if previous is not None:
+            self._count(previous, -1)
+        self.event_times.remove(item_id)
+
+    def date_windows(self, today: date) -> Dict[str, int]:
+        """Items per upcoming event_date window; summed over distinct days, not items."""
+        today_key = today.isoformat()
+        ends = [(name, (today + timedelta(days=days)).isoformat()) for name, days in DATE_WINDOWS]
+        windows = {"past": 0, **{name: 0 for name, _ in DATE_WINDOWS}, "later": 0}
+        for day, count in self.event_days.items():
+            if day < today_key:
+                windows["past"] += count
+                continue
+            upcoming = [name for name, end in ends if day < end]
+            for name in upcoming:
+                windows[name] += count
+            if not upcoming:
+                windows["later"] += count
+        windows["undated"] = len(self.items) - sum(self.event_days.values())
+        return windows
+
+
+class CatalogStats:
+    """
+    Thread-safe item and facet counts for every collection.
+
+    load() scans a collection once (at startup); afterwards every add, upsert and
+    delete goes through upsert()/delete(), so reads never touch the database.
+    """
+
+    def __init__(self):
+        self._collections: Dict[str, CollectionStats] = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def load(self, collections: Iterable[Any], page_size: int = LOAD_PAGE_SIZE) -> None:
+        """Replace the counts with a full scan of each collection's metadata."""
+        loaded = {}
+        for collection in collections:
+            stats = CollectionStats()
+            offset = 0
+            while True:
+                page = collection.get(offset=offset, limit=page_size, include=["metadatas"])
+                if not page["ids"]:
+                    break
+                for item_id, metadata in zip(page["ids"], page["metadatas"]):
+                    stats.upsert(item_id, metadata)
+                offset += len(page["ids"])
+            loaded[collection.name] = stats
+        with self._lock:
+            self._collections = loaded
+            self.loaded = True
+
+    def upsert(self, collection_name: str, ids: List[str], metadatas: List[Optional[Dict[str, Any]]]) -> None:
+        with self._lock:
+            stats = self._collections.setdefault(collection_name, CollectionStats())
+            for item_id, metadata in zip(ids, metadatas):
+                stats.upsert(item_id, metadata)
+
+    def delete(self, collection_name: str, ids: List[str]) -> None:
+        with self._lock:
+            stats = self._collections.get(collection_name)
+            if stats is not None:
+                for item_id in ids:
+                    stats.delete(item_id)
+
+    def count(self, collection_name: str) -> int:
+        stats = self._collections.get(collection_name)
+        return len(stats.items) if stats is not None else 0
+
+    def events_between(self, collection_name: str, start: Optional[int] = None, end: Optional[int] = None) -> List[str]:
+        """Ids of items whose event timestamp is in [start, end) (either end open)."""
+        with self._lock:
+            stats = self._collections.get(collection_name)
+            return stats.event_times.between(start, end) if stats is not None else []
+
+    def facets(self, collection_name: Optional[str] = None, today: Optional[date] = None) -> Dict[str, Any]:
+        """Per-collection item count, facet value counts and event_date windows."""
+        today = today or date.today()
+        with self._lock:
+            return {
+                name: {
+                    "count": len(stats.items),
+                    "facets": {
+                        field: dict(counter.most_common())
+                        for field, counter in stats.facets.items() if counter
+                    },
+                    "event_date": stats.date_windows(today),
+                }
+                for name, stats in self._collections.items()
+                if collection_name is None or name == collection_name
+            }
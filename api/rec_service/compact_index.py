@@ -0,0 +1,267 @@
+"""
+Compact vector storage for the NumPy search backend
+float16 or per-vector-scaled int8 codes, optional PCA reduction and exact float32 re-scoring
+
+Usage:
+    python compact_index.py upskilling --precision int8 --pca-dim 256 --rescore 50 --queries 200 --k 10
+
+The command prints a recall@k and latency report comparing the compact index with
+the full-precision ExactSearchIndex built from the same collection.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from exact_search import ExactSearchIndex
+
+PRECISIONS = ("float32", "float16", "int8")
+
+# Rows decoded to float32 at a time while scoring; small enough for the copy to stay in cache
+SCORE_BLOCK_ROWS = 4096
+
+# Rows sampled to fit the PCA projection
+PCA_SAMPLE_ROWS = 20000
+
+
+def fit_projection(matrix: np.ndarray, dim: int, seed: int = 0) -> np.ndarray:
+    """
+    Orthonormal (d x dim) projection onto the top right-singular vectors of a row sample.
+    Uncentered, so inner products, cosine and L2 distances are all preserved approximately.
+    """
+    rng = np.random.default_rng(seed)
+    sample = matrix if len(matrix) <= PCA_SAMPLE_ROWS else matrix[rng.choice(len(matrix), PCA_SAMPLE_ROWS, replace=False)]
+    _, _, vt = np.linalg.svd(np.asarray(sample, dtype=np.float32), full_matrices=False)
+    return np.ascontiguousarray(vt[:dim].T)
+
+
+class CompactSearchIndex(ExactSearchIndex):
+    """
+    ExactSearchIndex variant that scores against compact codes instead of a float32 matrix.
+
+    - float16: 2 bytes per value
+    - int8:    1 byte per value plus one float32 scale per vector (max |value| / 127)
+    - pca_dim: vectors are first projected onto pca_dim principal directions
+
+    With rescore > 0, the best `rescore` candidates per query are re-ranked with
+    exact float32 distances read from `full` (ideally a memory-mapped file, so
+    the float32 copy lives in the page cache rather than the heap).
+    Subsets share `codes`, `scales` and `full` with the parent and map their rows through `rows`.
+    """
+
+    @classmethod
+    def from_index(
+        cls,
+        index: ExactSearchIndex,
+        precision: str = "int8",
+        pca_dim: int = 0,
+        rescore: int = 0,
+        rescore_path: Optional[str] = None,
+    ) -> "CompactSearchIndex":
+        if precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of: {', '.join(PRECISIONS)}")
+        compact = cls.__new__(cls)
+        compact.name = index.name
+        compact.space = index.space
+        compact.ids = index.ids
+        compact.dim = index.dim
+        compact.columns = index.columns
+        compact._mask_cache = {}
+        compact._numeric_columns = index._numeric_columns
+        compact._row_of_id = None
+        compact.matrix = None
+        compact.rows = None
+        compact.sq_norms = None
+        compact.precision = precision
+        compact.rescore_k = rescore
+
+        # Stored rows are already L2-normalized for cosine
+        matrix = index.stored_matrix()
+        vectors = matrix
+        compact.projection = None
+        if pca_dim and 0 < pca_dim < index.dim:
+            compact.projection = fit_projection(vectors, pca_dim)
+            vectors = vectors @ compact.projection
+
+        compact.scales = None
+        if precision == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+            compact.codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+            compact.scales = scales
+        else:
+            compact.codes = np.ascontiguousarray(vectors, dtype=np.float32 if precision == "float32" else np.float16)
+        if index.space == "l2":
+            decoded = compact.decode(np.arange(len(compact.ids)))
+            compact.sq_norms = np.einsum("ij,ij->i", decoded, decoded)
+
+        compact.full = None
+        if rescore > 0:
+            if rescore_path:
+                directory = os.path.dirname(os.path.abspath(rescore_path))
+                os.makedirs(directory, exist_ok=True)
+                # Write a new file and swap it in, so an index still mapping the old one keeps working
+                fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+                os.close(fd)
+                full = np.lib.format.open_memmap(temp_path, mode="w+", dtype=np.float32, shape=matrix.shape)
+                full[:] = matrix
+                full.flush()
+                del full
+                os.replace(temp_path, rescore_path)
+                compact.full = np.load(rescore_path, mmap_mode="r")
+            else:
+                compact.full = matrix
+        return compact
+
+    def subset(self, rows: np.ndarray, name: Optional[str] = None) -> "CompactSearchIndex":
+        """Smaller index over the given rows; codes and the float32 re-scoring copy are shared, not sliced."""
+        subset = CompactSearchIndex.__new__(CompactSearchIndex)
+        subset.__dict__.update(self.__dict__)
+        subset.name = name or self.name
+        subset.ids = self.ids[rows]
+        subset.rows = self._base_rows(np.asarray(rows, dtype=np.int64))
+        subset.sq_norms = self.sq_norms[rows] if self.sq_norms is not None else None
+        subset.columns = {field: column[rows] for field, column in self.columns.items()}
+        subset._mask_cache = {}
+        subset._numeric_columns = {}
+        subset._row_of_id = None
+        return subset
+
+    def decode(self, rows) -> np.ndarray:
+        """float32 approximation of the stored (projected) vectors of the given rows."""
+        rows = self._base_rows(rows)
+        decoded = self.codes[rows].astype(np.float32)
+        if self.scales is not None:
+            decoded *= self.scales[rows, None] if np.ndim(rows) else self.scales[rows]
+        return decoded
+
+    def nbytes(self) -> int:
+        """Heap bytes of the search representation (codes, scales, norms, projection)."""
+        parts = [self.codes, self.scales, self.sq_norms, self.projection]
+        if self.full is not None and not isinstance(self.full, np.memmap):
+            parts.append(self.full)
+        return int(sum(part.nbytes for part in parts if part is not None))
+
+    # -------------------------------------------------------------------------
+    # Search
+    # -------------------------------------------------------------------------
+
+    def distances(self, query_embeddings: np.ndarray) -> np.ndarray:
+        queries = self._prepare_queries(query_embeddings)
+        if self.space == "cosine":
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        projected = queries @ self.projection if self.projection is not None else queries
+
+        dots = np.empty((len(projected), len(self.ids)), dtype=np.float32)
+        for start in range(0, len(self.ids), SCORE_BLOCK_ROWS):
+            stop = min(start + SCORE_BLOCK_ROWS, len(self.ids))
+            # A subset gathers its own rows; the full index reads a contiguous slice
+            rows = slice(start, stop) if self.rows is None else self.rows[start:stop]
+            block = self.codes[rows].astype(np.float32) @ projected.T
+            if self.scales is not None:
+                block *= self.scales[rows, None]
+            dots[:, start:stop] = block.T
+
+        if self.space == "l2":
+            query_sq = np.einsum("ij,ij->i", projected, projected)[:, None]
+            return np.maximum(query_sq + self.sq_norms[None, :] - 2.0 * dots, 0.0)
+        return 1.0 - dots
+
+    def candidate_count(self, k: int) -> int:
+        return max(k, self.rescore_k) if self.full is not None else k
+
+    def rescore(self, queries: np.ndarray, rows: np.ndarray, distances: np.ndarray) -> np.ndarray:
+        if self.full is None:
+            return np.take_along_axis(distances, rows, axis=1)
+        return self.pair_distances(queries, self.vectors(rows))
+
+    def vectors(self, rows) -> np.ndarray:
+        if self.full is not None:
+            return np.asarray(self.full[self._base_rows(rows)])
+        decoded = self.decode(rows)
+        return decoded @ self.projection.T if self.projection is not None else decoded
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "precision": self.precision,
+            "pca_dim": self.projection.shape[1] if self.projection is not None else None,
+            "rescore": self.rescore_k if self.full is not None else 0,
+            "rescore_memory_mapped": isinstance(self.full, np.memmap),
+            "search_bytes": self.nbytes(),
+            "float32_bytes": len(self.ids) * self.dim * 4,
+        }
+
+
+# =============================================================================
+# RECALL / LATENCY REPORT
+# =============================================================================
+
+def recall_report(
+    exact: ExactSearchIndex,
+    compact: CompactSearchIndex,
+    queries: np.ndarray,
+    k: int = 10,
+) -> Dict[str, Any]:
+    """recall@k of compact against exact top-k, and per-query latency of both, one query at a time."""
+    def timed_top_k(index):
+        rows, latencies = [], []
+        for query in queries:
+            started = time.perf_counter()
+            top, _ = index.top_k(query[None, :], k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            rows.append(top[0])
+        return rows, np.asarray(latencies)
+
+    exact_rows, exact_ms = timed_top_k(exact)
+    compact_rows, compact_ms = timed_top_k(compact)
+    hits = [len(set(e.tolist()) & set(c.tolist())) / max(len(e), 1) for e, c in zip(exact_rows, compact_rows)]
+    return {
+        "k": k,
+        "queries": len(queries),
+        "recall_at_k": round(float(np.mean(hits)), 4) if hits else None,
+        "exact_ms": {"p50": round(float(np.percentile(exact_ms, 50)), 3), "p95": round(float(np.percentile(exact_ms, 95)), 3)},
+        "compact_ms": {"p50": round(float(np.percentile(compact_ms, 50)), 3), "p95": round(float(np.percentile(compact_ms, 95)), 3)},
+        **compact.describe(),
+    }
+
+
+def sample_queries(index: ExactSearchIndex, count: int, noise: float = 0.1, seed: int = 0) -> np.ndarray:
+    """Query vectors near stored items (an item plus Gaussian noise), so neighbours are meaningful."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(index.count(), size=min(count, index.count()), replace=False)
+    base = index.vectors(rows)
+    scale = noise * np.linalg.norm(base, axis=1, keepdims=True) / np.sqrt(max(index.dim, 1))
+    return (base + rng.standard_normal(base.shape).astype(np.float32) * scale).astype(np.float32)
+
+
+# =============================================================================
+# COMMAND LINE
+# =============================================================================
+
+def main():
+    import chromadb
+
+    parser = argparse.ArgumentParser(description="Compare a compact index against full-precision search")
+    parser.add_argument("collection", help="Collection name (upskilling or holistic)")
+    parser.add_argument("--precision", choices=PRECISIONS, default="int8")
+    parser.add_argument("--pca-dim", type=int, default=0, help="Project vectors to this many dimensions (0 = off)")
+    parser.add_argument("--rescore", type=int, default=0, help="Candidates re-scored with float32 vectors (0 = off)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--db", default="./local_vector_db", help="ChromaDB path")
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=args.db)
+    exact = ExactSearchIndex.from_collection(client.get_collection(args.collection))
+    compact = CompactSearchIndex.from_index(exact, args.precision, args.pca_dim, args.rescore)
+    report = recall_report(exact, compact, sample_queries(exact, args.queries), args.k)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
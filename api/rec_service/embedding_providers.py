@@ -0,0 +1,149 @@
+"""
+Embedding providers for the YUNO Recommendation Service
+Gemini (remote) and a local CPU hashing vectorizer behind one interface, selected by EMBEDDING_PROVIDER
+"""
+
+import os
+import re
+import zlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Model of collections created before the embedding model was recorded in their metadata
+LEGACY_EMBEDDING_MODEL = "models/text-embedding-004"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have i in is it of on or that the this to with".split()
+)
+
+
+class EmbeddingModelMismatch(ValueError):
+    """A collection holds vectors from a different embedding model than the configured one."""
+
+
+class EmbeddingProvider:
+    """
+    Turns texts into vectors.
+
+    name identifies the model (it is recorded in collection metadata and in
+    cache/store keys, so vectors from different models never mix). remote
+    providers benefit from request batching; local ones are cheap enough to
+    call inline.
+    """
+
+    name: str = ""
+    remote: bool = False
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def embed(self, texts: List[str], task_type: str) -> List[List[float]]:
+        """One vector per text; raises on failure."""
+        raise NotImplementedError
+
+    def describe(self) -> Dict[str, Any]:
+        return {"provider": type(self).__name__, "model": self.name, "remote": self.remote}
+
+
+class GeminiEmbeddingProvider(EmbeddingProvider):
+    """Gemini embedding API (one request per batch of texts)."""
+
+    remote = True
+
+    def __init__(self, model: str = LEGACY_EMBEDDING_MODEL):
+        self.name = model
+
+    @property
+    def available(self) -> bool:
+        return bool(os.getenv("GEMINI_API_KEY"))
+
+    def embed(self, texts: List[str], task_type: str) -> List[List[float]]:
+        import google.generativeai as genai
+
+        result = genai.embed_content(model=self.name, content=texts, task_type=task_type)
+        return result["embedding"]
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Local signed feature-hashing vectorizer (NumPy only, no network or model files).
+
+    Words, word bigrams and character trigrams are hashed (crc32, stable across
+    processes) into dim buckets with a +/-1 sign, counts are log-scaled and each
+    vector is L2-normalized. Queries and documents use the same projection, so
+    task_type is ignored.
+    """
+
+    def __init__(self, dim: int = 384, char_ngram_weight: float = 0.5):
+        self.dim = dim
+        self.char_ngram_weight = char_ngram_weight
+        self.name = f"local/hashing-{dim}"
+
+    def _features(self, text: str):
+        tokens = [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+        for token in tokens:
+            yield token, 1.0
+            padded = f"<{token}>"
+            for i in range(len(padded) - 2):
+                yield "#" + padded[i:i + 3], self.char_ngram_weight
+        for first, second in zip(tokens, tokens[1:]):
+            yield f"{first} {second}", 1.0
+
+    def embed(self, texts: List[str], task_type: str) -> List[List[float]]:
+        rows, columns, values = [], [], []
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                rows.append(row)
+                columns.append(h % self.dim)
+                values.append(weight if h & 0x80000000 else -weight)
+
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.intp), np.asarray(columns, dtype=np.intp)), values)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix.tolist()
+
+
+def provider_from_env() -> EmbeddingProvider:
+    """
+    Build the configured provider:
+    EMBEDDING_PROVIDER=gemini (default, model from GEMINI_EMBEDDING_MODEL)
+    or EMBEDDING_PROVIDER=hashing (dimension from HASHING_EMBEDDING_DIM).
+    """
+    kind = os.getenv("EMBEDDING_PROVIDER", "gemini").lower()
+    if kind == "gemini":
+        return GeminiEmbeddingProvider(os.getenv("GEMINI_EMBEDDING_MODEL", LEGACY_EMBEDDING_MODEL))
+    if kind == "hashing":
+        return HashingEmbeddingProvider(int(os.getenv("HASHING_EMBEDDING_DIM", "384")))
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER '{kind}' (expected 'gemini' or 'hashing')")
+
+
+def collection_embedding_model(collection) -> Optional[str]:
+    """Model recorded on a collection; non-empty collections without one predate the field."""
+    model = (collection.metadata or {}).get("embedding_model")
+    if model is None and collection.count() > 0:
+        return LEGACY_EMBEDDING_MODEL
+    return model
+
+
+def ensure_collection_model(collection, model: str) -> None:
+    """
+    Refuse a non-empty collection embedded with another model, and record the
+    model on collections that do not carry it yet (or are still empty).
+    """
+    existing = collection_embedding_model(collection)
+    if existing is not None and existing != model and collection.count() > 0:
+        raise EmbeddingModelMismatch(
+            f"Collection '{collection.name}' was embedded with '{existing}' but EMBEDDING_PROVIDER "
+            f"is configured for '{model}'. Re-embed the catalog or change the configuration."
+        )
+    metadata = collection.metadata or {}
+    if metadata.get("embedding_model") != model:
+        # hnsw:* settings are fixed at creation and may not be passed to modify()
+        kept = {key: value for key, value in metadata.items() if not key.startswith("hnsw:")}
+        collection.modify(metadata={**kept, "embedding_model": model})
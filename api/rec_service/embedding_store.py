@@ -0,0 +1,206 @@
+"""
+Content-addressed embedding store for the YUNO Recommendation Service
+Persists document embeddings keyed by hash(text, model, task type) so rebuilds only embed new or changed texts
+"""
+
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+VECTORS_FILE = "vectors.npy"
+KEYS_FILE = "keys.txt"
+LOCK_FILE = "store.lock"
+
+# Rows reserved when the vector file is first created; capacity doubles after that
+INITIAL_CAPACITY = 1024
+
+
+def content_key(text: str, model: str, task_type: str) -> str:
+    """Stable key for an embedding: sha256 over model, task type and the exact text."""
+    digest = hashlib.sha256()
+    digest.update(f"{model}\x1f{task_type}\x1f{text}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Append-only embedding store on disk.
+
+    Vectors live in a memory-mapped float32 .npy matrix; keys.txt holds one
+    content key per line, line i naming row i. Vectors are flushed before their
+    keys are appended, so a crash can leave unused rows but never a key
+    pointing at an unwritten vector.
+
+    Several processes (e.g. uvicorn workers) may share one directory: appends
+    hold an exclusive flock on store.lock, and every read or append first picks
+    up the keys other processes appended and remaps the vector file if it was
+    replaced by a grow.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        self._vectors_file = None
+        self._count = 0
+        self._keys_read = 0
+        os.makedirs(path, exist_ok=True)
+        with self._lock, self._file_lock(exclusive=False):
+            self._sync()
+
+    @property
+    def dim(self) -> Optional[int]:
+        return None if self._vectors is None else self._vectors.shape[1]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        """Stored vectors for each key (None where missing)."""
+        with self._lock, self._file_lock(exclusive=False):
+            self._sync()
+            results = []
+            for key in keys:
+                row = self._rows.get(key)
+                results.append(None if row is None else np.array(self._vectors[row]))
+            return results
+
+    def put_many(self, keys: List[str], vectors: List[List[float]]) -> None:
+        """Store vectors under their keys; keys already present (from any process) are left unchanged."""
+        with self._lock, self._file_lock(exclusive=True):
+            self._sync()
+            new = {}
+            for key, vector in zip(keys, vectors):
+                if key not in self._rows and key not in new:
+                    new[key] = vector
+            if not new:
+                return
+
+            matrix = np.asarray(list(new.values()), dtype=np.float32)
+            if self._vectors is not None and matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match store dimension {self.dim}")
+            self._reserve(self._count + len(matrix), matrix.shape[1])
+
+            self._vectors[self._count:self._count + len(matrix)] = matrix
+            self._vectors.flush()
+            keys_path = os.path.join(self.path, KEYS_FILE)
+            if os.path.exists(keys_path) and os.path.getsize(keys_path) > self._keys_read:
+                # A line left half-written by a crashed append
+                os.truncate(keys_path, self._keys_read)
+            lines = "".join(f"{key}\n" for key in new)
+            with open(keys_path, "a", encoding="ascii") as f:
+                f.write(lines)
+            self._keys_read += len(lines)
+            for key in new:
+                self._rows[key] = self._count
+                self._count += 1
+
+    def embed(
+        self,
+        texts: List[str],
+        model: str,
+        task_type: str,
+        embed_texts: Callable[[List[str]], List[List[float]]],
+    ) -> List[List[float]]:
+        """
+        Embeddings for texts, calling embed_texts only for texts not yet stored.
+        Failed embeddings come back as [] (as embed_texts reports them) and are not stored.
+        """
+        keys = [content_key(text, model, task_type) for text in texts]
+        stored = self.get_many(keys)
+        missing = [i for i, vector in enumerate(stored) if vector is None]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        results: List[Any] = [None if vector is None else vector.tolist() for vector in stored]
+        if missing:
+            # Identical texts in one call are embedded once
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            fresh = dict(zip(unique, embed_texts(unique)))
+            succeeded = [i for i in missing if len(fresh[texts[i]])]
+            self.put_many([keys[i] for i in succeeded], [fresh[texts[i]] for i in succeeded])
+            for i in missing:
+                results[i] = list(fresh[texts[i]])
+        return results
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool) -> Iterator[None]:
+        """flock on the store directory: shared while reading, exclusive while appending."""
+        try:
+            import fcntl
+        except ImportError:
+            # No flock (Windows): only one process may write the store
+            yield
+            return
+        with open(os.path.join(self.path, LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _sync(self) -> None:
+        """Catch up with appends and grows made by other processes (file lock held)."""
+        vectors_path = os.path.join(self.path, VECTORS_FILE)
+        try:
+            stat = os.stat(vectors_path)
+        except FileNotFoundError:
+            return
+        if (stat.st_ino, stat.st_size) != self._vectors_file:
+            self._vectors = np.load(vectors_path, mmap_mode="r+")
+            self._vectors_file = (stat.st_ino, stat.st_size)
+
+        keys_path = os.path.join(self.path, KEYS_FILE)
+        if not os.path.exists(keys_path) or os.path.getsize(keys_path) <= self._keys_read:
+            return
+        with open(keys_path, "rb") as f:
+            f.seek(self._keys_read)
+            appended = f.read()
+        # Only whole lines; the writer holds the lock, so a partial line means a crashed append
+        appended = appended[:appended.rfind(b"\n") + 1]
+        for key in appended.decode("ascii").split():
+            if self._count >= self._vectors.shape[0]:
+                break
+            self._rows.setdefault(key, self._count)
+            self._count += 1
+        self._keys_read += len(appended)
+
+    def _reserve(self, rows: int, dim: int) -> None:
+        """Grow (or create) the vector file so it holds at least `rows` rows."""
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(INITIAL_CAPACITY, capacity * 2, rows)
+        vectors_path = os.path.join(self.path, VECTORS_FILE)
+        temp_path = vectors_path + ".growing.npy"
+        grown = np.lib.format.open_memmap(temp_path, mode="w+", dtype=np.float32, shape=(new_capacity, dim))
+        if self._vectors is not None:
+            grown[:self._count] = self._vectors[:self._count]
+        grown.flush()
+        del grown
+        self._vectors = None
+        os.replace(temp_path, vectors_path)
+        self._vectors = np.load(vectors_path, mmap_mode="r+")
+        stat = os.stat(vectors_path)
+        self._vectors_file = (stat.st_ino, stat.st_size)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "vectors": self._count,
+            "dim": self.dim,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
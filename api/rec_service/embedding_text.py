@@ -0,0 +1,15 @@
+"""
+Embedding text for YUNO catalog items
+Kept free of heavy imports so ingestion and export tools can build it without loading the generator
+"""
+
+
+def create_embedding_text(row: dict, is_course: bool = True) -> str:
+    """Create embedding text by concatenating relevant fields."""
+    
+    if is_course:
+        personality_tags = f"RIASEC: {row['primary_riasec']}. OCEAN Focus: {row['ocean_trait_focus']}."
+        return f"{row['title']}. {row['provider']}. {row['category']}. {row['description']} {personality_tags}"
+    else:
+        personality_tags = f"RIASEC: {row['primary_riasec']}. OCEAN Focus: {row['ocean_trait_focus']}."
+        return f"{row['event_name']}. {row['type']}. {row['description']} {personality_tags}"
@@ -0,0 +1,135 @@
+"""
+Numeric event dates for the YUNO Recommendation Service
+event_date strings are mirrored into epoch-second metadata, so date windows can be filtered inside the index query
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Human-readable date ('YYYY-MM-DD HH:MM:SS', local time) and its numeric mirror (epoch seconds)
+DATE_FIELD = "event_date"
+TIMESTAMP_FIELD = "event_ts"
+
+# (from, to) epoch seconds, both inclusive; either end may be open
+DateWindow = Tuple[Optional[int], Optional[int]]
+
+
+def event_timestamp(value: Any) -> Optional[int]:
+    """Epoch seconds of an event_date value (ISO string or number); None when missing or unparseable."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    try:
+        return int(datetime.fromisoformat(str(value).strip()).timestamp())
+    except ValueError:
+        return None
+
+
+def add_event_timestamp(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Set TIMESTAMP_FIELD from DATE_FIELD (in place); drops a stale timestamp when the date is gone."""
+    timestamp = event_timestamp(metadata.get(DATE_FIELD))
+    if timestamp is None:
+        metadata.pop(TIMESTAMP_FIELD, None)
+    else:
+        metadata[TIMESTAMP_FIELD] = timestamp
+    return metadata
+
+
+def date_window_filter(window: Optional[DateWindow]) -> Optional[Dict]:
+    """Chroma-style `where` clause for a date window (None when the window is open on both ends)."""
+    if window is None:
+        return None
+    start, end = window
+    bounds = {}
+    if start is not None:
+        bounds["$gte"] = start
+    if end is not None:
+        bounds["$lte"] = end
+    if not bounds:
+        return None
+    if len(bounds) == 1:
+        return {TIMESTAMP_FIELD: bounds}
+    # Chroma allows one operator per field clause
+    return {"$and": [{TIMESTAMP_FIELD: {op: bound}} for op, bound in bounds.items()]}
+
+
+def combine_filters(*filters: Optional[Dict]) -> Optional[Dict]:
+    """AND together the non-empty `where` filters."""
+    present = [where for where in filters if where]
+    if not present:
+        return None
+    if len(present) == 1:
+        return present[0]
+    return {"$and": present}
+
+
+def backfill_event_timestamps(collection, page_size: int = 5000) -> int:
+    """
+    Add TIMESTAMP_FIELD to items stored before it existed (metadata-only update, no re-embedding).
+    Returns the number of items updated.
+    """
+    offset = 0
+    updated = 0
+    while True:
+        page = collection.get(offset=offset, limit=page_size, include=["metadatas"])
+        if not page["ids"]:
+            return updated
+        ids, metadatas = [], []
+        for item_id, metadata in zip(page["ids"], page["metadatas"]):
+            metadata = dict(metadata or {})
+            before = metadata.get(TIMESTAMP_FIELD)
+            if add_event_timestamp(metadata).get(TIMESTAMP_FIELD) != before:
+                ids.append(item_id)
+                metadatas.append(metadata)
+        if ids:
+            collection.update(ids=ids, metadatas=metadatas)
+            updated += len(ids)
+        offset += len(page["ids"])
+
+
+class EventDateIndex:
+    """
+    Item ids of one collection sorted by event timestamp.
+
+    Changes go into a dict; the sorted arrays are rebuilt on the next lookup
+    after a change, and each lookup is then two binary searches.
+    Not thread-safe on its own (CatalogStats holds the lock).
+    """
+
+    def __init__(self):
+        self._timestamps: Dict[str, int] = {}
+        self._sorted: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def set(self, item_id: str, timestamp: Optional[int]) -> None:
+        if timestamp is None:
+            self.remove(item_id)
+        elif self._timestamps.get(item_id) != timestamp:
+            self._timestamps[item_id] = timestamp
+            self._sorted = None
+
+    def remove(self, item_id: str) -> None:
+        if self._timestamps.pop(item_id, None) is not None:
+            self._sorted = None
+
+    def _arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._sorted is None:
+            ids = np.array(list(self._timestamps), dtype=object)
+            timestamps = np.fromiter(self._timestamps.values(), dtype=np.int64, count=len(ids))
+            order = np.argsort(timestamps, kind="stable")
+            self._sorted = (timestamps[order], ids[order])
+        return self._sorted
+
+    def between(self, start: Optional[int] = None, end: Optional[int] = None) -> List[str]:
+        """Ids with start <= timestamp < end (either end open)."""
+        timestamps, ids = self._arrays()
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side="left"))
+        hi = len(ids) if end is None else int(np.searchsorted(timestamps, end, side="left"))
+        return ids[lo:hi].tolist() if hi > lo else []
@@ -0,0 +1,407 @@
+"""
+Exact in-memory vector search for the YUNO Recommendation Service
+Loads a ChromaDB collection into NumPy arrays and answers top-k with one matrix product
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Chroma collection.get page size used while loading
+LOAD_PAGE_SIZE = 5000
+
+# Queries scored per matrix product in top_k
+QUERY_CHUNK_SIZE = 64
+
+# Rows of a subset gathered from the shared matrix per matrix product
+SUBSET_BLOCK_ROWS = 8192
+
+# Filter masks kept per index; date windows make `where` clauses vary per request
+MASK_CACHE_SIZE = 256
+
+# Placeholder for metadata keys an item does not have
+_MISSING = object()
+
+_RANGE_OPS = ("$gt", "$gte", "$lt", "$lte")
+
+
+def collection_space(collection) -> str:
+    """Return the distance space ('l2', 'cosine' or 'ip') a Chroma collection was built with."""
+    metadata = collection.metadata or {}
+    if "hnsw:space" in metadata:
+        return metadata["hnsw:space"]
+    configuration = getattr(collection, "configuration", None) or {}
+    hnsw = configuration.get("hnsw") or {}
+    return hnsw.get("space") or "l2"
+
+
+# Item digests are summed modulo this, so a fingerprint can be updated item by item
+FINGERPRINT_MODULUS = 1 << 128
+
+
+def item_digest(item_id: str, metadata: Optional[Dict[str, Any]]) -> int:
+    """128-bit digest of one item's id and metadata."""
+    record = json.dumps([item_id, metadata or {}], sort_keys=True, default=str)
+    return int.from_bytes(hashlib.blake2b(record.encode("utf-8"), digest_size=16).digest(), "big")
+
+
+def collection_fingerprint(collection, page_size: int = LOAD_PAGE_SIZE) -> str:
+    """
+    Digest of a Chroma collection's ids and metadata, independent of storage order.
+    Derived copies store it to detect any change since they were built; text changes are
+    covered through the content_hash metadata field that ingests keep up to date.
+    """
+    total = 0
+    offset = 0
+    while True:
+        page = collection.get(offset=offset, limit=page_size, include=["metadatas"])
+        if not page["ids"]:
+            break
+        for item_id, metadata in zip(page["ids"], page["metadatas"]):
+            total += item_digest(item_id, metadata)
+        offset += len(page["ids"])
+    return f"{total % FINGERPRINT_MODULUS:032x}"
+
+
+def update_fingerprint(
+    fingerprint: str,
+    removed: List[Tuple[str, Dict[str, Any]]],
+    added: List[Tuple[str, Dict[str, Any]]]
+) -> str:
+    """collection_fingerprint after replacing the `removed` (id, metadata) items with the `added` ones."""
+    total = int(fingerprint, 16)
+    total -= sum(item_digest(item_id, metadata) for item_id, metadata in removed)
+    total += sum(item_digest(item_id, metadata) for item_id, metadata in added)
+    return f"{total % FINGERPRINT_MODULUS:032x}"
+
+
+class ExactSearchIndex:
+    """
+    Brute-force search over a contiguous float32 matrix.
+
+    Exposes the same query() signature and result shape as a Chroma collection,
+    so it can stand in for one on the read path. Distances follow the
+    collection's space so scores match the Chroma path:
+      - l2:     squared euclidean distance
+      - cosine: 1 - cosine similarity (rows are stored L2-normalized)
+      - ip:     1 - inner product
+    Metadata is kept as one array per field; `where` filters are evaluated
+    into boolean masks once and cached. Range operators compare against a
+    float64 copy of the field, built on first use.
+    Subsets (audience partitions) share the parent's matrix and keep
+    the row numbers they cover in `rows`; only ids, norms and metadata
+    references are sliced.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ids: List[str],
+        embeddings: np.ndarray,
+        metadatas: List[Dict[str, Any]],
+        space: str = "l2",
+    ):
+        if space not in ("l2", "cosine", "ip"):
+            raise ValueError(f"Unsupported distance space: {space}")
+        self.name = name
+        self.space = space
+        self.ids = np.asarray(ids, dtype=object)
+        self.dim = embeddings.shape[1] if embeddings.ndim == 2 and len(ids) else 0
+
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(len(ids), self.dim)
+        if space == "cosine":
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.maximum(norms, 1e-12)
+        self.matrix = matrix
+        self.rows: Optional[np.ndarray] = None
+        self.sq_norms = np.einsum("ij,ij->i", matrix, matrix) if space == "l2" else None
+
+        fields = sorted({key for metadata in metadatas for key in metadata})
+        self.columns: Dict[str, np.ndarray] = {}
+        for field in fields:
+            column = np.empty(len(ids), dtype=object)
+            column[:] = [metadata.get(field, _MISSING) for metadata in metadatas]
+            self.columns[field] = column
+        self._mask_cache: Dict[str, np.ndarray] = {}
+        self._numeric_columns: Dict[str, np.ndarray] = {}
+        self._row_of_id: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = LOAD_PAGE_SIZE) -> "ExactSearchIndex":
+        """Load every embedding and metadata record of a Chroma collection."""
+        ids: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        blocks: List[np.ndarray] = []
+        offset = 0
+        while True:
+            page = collection.get(
+                offset=offset,
+                limit=page_size,
+                include=["embeddings", "metadatas"]
+            )
+            if not page["ids"]:
+                break
+            ids.extend(page["ids"])
+            metadatas.extend(metadata or {} for metadata in page["metadatas"])
+            blocks.append(np.asarray(page["embeddings"], dtype=np.float32))
+            offset += len(page["ids"])
+
+        embeddings = np.vstack(blocks) if blocks else np.zeros((0, 0), dtype=np.float32)
+        return cls(collection.name, ids, embeddings, metadatas, space=collection_space(collection))
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def _base_rows(self, rows):
+        """Row numbers in the shared matrix of this index's rows."""
+        return rows if self.rows is None else self.rows[rows]
+
+    def stored_matrix(self) -> np.ndarray:
+        """float32 vectors of this index's rows (the shared matrix itself unless this is a subset)."""
+        return self.matrix if self.rows is None else self.matrix[self.rows]
+
+    def subset(self, rows: np.ndarray, name: Optional[str] = None) -> "ExactSearchIndex":
+        """Smaller index over the given rows; the vector matrix is shared, not copied."""
+        subset = ExactSearchIndex.__new__(ExactSearchIndex)
+        subset.name = name or self.name
+        subset.space = self.space
+        subset.ids = self.ids[rows]
+        subset.dim = self.dim
+        subset.matrix = self.matrix
+        subset.rows = self._base_rows(np.asarray(rows, dtype=np.int64))
+        subset.sq_norms = self.sq_norms[rows] if self.sq_norms is not None else None
+        subset.columns = {field: column[rows] for field, column in self.columns.items()}
+        subset._mask_cache = {}
+        subset._numeric_columns = {}
+        subset._row_of_id = None
+        return subset
+
+    def id_at(self, row: int) -> str:
+        return self.ids[row]
+
+    def rows_of(self, ids: List[str]) -> np.ndarray:
+        """Row numbers of the given ids, in order (unknown ids are skipped)."""
+        if self._row_of_id is None:
+            self._row_of_id = {item_id: row for row, item_id in enumerate(self.ids)}
+        return np.array([self._row_of_id[item_id] for item_id in ids if item_id in self._row_of_id], dtype=np.int64)
+
+    def without(self, ids: List[str]) -> "ExactSearchIndex":
+        """This index minus the given ids (self when none of them are present)."""
+        rows = self.rows_of(ids)
+        if not len(rows):
+            return self
+        keep = np.ones(self.count(), dtype=bool)
+        keep[rows] = False
+        return self.subset(np.flatnonzero(keep))
+
+    # -------------------------------------------------------------------------
+    # Filtering
+    # -------------------------------------------------------------------------
+
+    def mask(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Boolean row mask for a Chroma-style `where` filter (None means all rows)."""
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True)
+        cached = self._mask_cache.get(key)
+        if cached is None:
+            cached = self._evaluate(where)
+            if len(self._mask_cache) >= MASK_CACHE_SIZE:
+                del self._mask_cache[next(iter(self._mask_cache))]
+            self._mask_cache[key] = cached
+        return cached
+
+    def _numeric_column(self, field: str) -> np.ndarray:
+        """float64 values of a field, NaN where the value is missing or not a number."""
+        values = self._numeric_columns.get(field)
+        if values is None:
+            values = np.array(
+                [
+                    value if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+                    for value in self.columns[field]
+                ],
+                dtype=np.float64
+            )
+            self._numeric_columns[field] = values
+        return values
+
+    def _evaluate(self, where: Dict) -> np.ndarray:
+        result = np.ones(self.count(), dtype=bool)
+        for key, condition in where.items():
+            # Clauses go through the mask cache, so a fixed part (e.g. the audience filter)
+            # is evaluated once however often the rest of the filter changes
+            if key == "$and":
+                for clause in condition:
+                    result &= self.mask(clause) if clause else True
+            elif key == "$or":
+                any_match = np.zeros(self.count(), dtype=bool)
+                for clause in condition:
+                    any_match |= self.mask(clause) if clause else True
+                result &= any_match
+            else:
+                result &= self._evaluate_field(key, condition)
+        return result
+
+    def _evaluate_field(self, field: str, condition: Any) -> np.ndarray:
+        column = self.columns.get(field)
+        if column is None:
+            return np.zeros(len(self.ids), dtype=bool)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        if all(op in _RANGE_OPS for op in condition):
+            # Missing values are NaN in the numeric column, so no comparison matches them
+            present = np.ones(len(self.ids), dtype=bool)
+        else:
+            present = np.array([value is not _MISSING for value in column], dtype=bool)
+        result = present.copy()
+        for op, operand in condition.items():
+            if op == "$eq":
+                result &= column == operand
+            elif op == "$ne":
+                result &= column != operand
+            elif op == "$in":
+                result &= np.isin(column, list(operand))
+            elif op == "$nin":
+                result &= ~np.isin(column, list(operand))
+            elif op in _RANGE_OPS:
+                values = self._numeric_column(field)
+                with np.errstate(invalid="ignore"):
+                    if op == "$gt":
+                        result &= values > operand
+                    elif op == "$gte":
+                        result &= values >= operand
+                    elif op == "$lt":
+                        result &= values < operand
+                    else:
+                        result &= values <= operand
+            else:
+                raise ValueError(f"Unsupported where operator: {op}")
+        return result & present
+
+    # -------------------------------------------------------------------------
+    # Search
+    # -------------------------------------------------------------------------
+
+    def distances(self, query_embeddings: np.ndarray) -> np.ndarray:
+        """Distance from each query (rows) to every stored item (columns)."""
+        queries = self._prepare_queries(query_embeddings)
+        if self.space == "cosine":
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries = queries / np.maximum(norms, 1e-12)
+            return 1.0 - self._dots(queries)
+        if self.space == "ip":
+            return 1.0 - self._dots(queries)
+        query_sq = np.einsum("ij,ij->i", queries, queries)[:, None]
+        return np.maximum(query_sq + self.sq_norms[None, :] - 2.0 * self._dots(queries), 0.0)
+
+    def _dots(self, queries: np.ndarray) -> np.ndarray:
+        """Inner products with this index's rows; a subset gathers its rows block by block."""
+        if self.rows is None:
+            return queries @ self.matrix.T
+        dots = np.empty((len(queries), len(self.rows)), dtype=np.float32)
+        for start in range(0, len(self.rows), SUBSET_BLOCK_ROWS):
+            block = self.rows[start:start + SUBSET_BLOCK_ROWS]
+            dots[:, start:start + len(block)] = queries @ self.matrix[block].T
+        return dots
+
+    def _prepare_queries(self, query_embeddings) -> np.ndarray:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        if queries.shape[1] != self.dim and self.count():
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match index dimension {self.dim}")
+        return queries
+
+    def pair_distances(self, queries: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        """Exact distances between each query and its own candidate vectors (queries x candidates x dim)."""
+        if self.space == "l2":
+            return ((queries[:, None, :] - vectors) ** 2).sum(axis=2)
+        if self.space == "cosine":
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries = queries / np.maximum(norms, 1e-12)
+        return 1.0 - np.einsum("qd,qcd->qc", queries, vectors)
+
+    def candidate_count(self, k: int) -> int:
+        """Candidates selected per query before rescore() picks the final k."""
+        return k
+
+    def rescore(self, queries: np.ndarray, rows: np.ndarray, distances: np.ndarray) -> np.ndarray:
+        """Final distances of the selected rows (queries x candidates)."""
+        if self.space == "l2":
+            # Recompute the selected distances directly to avoid cancellation error
+            return self.pair_distances(queries, self.vectors(rows))
+        return np.take_along_axis(distances, rows, axis=1)
+
+    def top_k(self, query_embeddings, n_results: int, where: Optional[Dict] = None):
+        """Return (row indices, distances) of the n_results nearest items per query."""
+        queries = self._prepare_queries(query_embeddings)
+        mask = self.mask(where)
+        candidates = self.count() if mask is None else int(mask.sum())
+        k = min(n_results, candidates)
+        if k <= 0:
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0))
+        fetch = min(self.candidate_count(k), candidates)
+
+        all_rows, all_distances = [], []
+        # Bound the (queries x items) distance matrix for large batches
+        for start in range(0, len(queries), QUERY_CHUNK_SIZE):
+            chunk = queries[start:start + QUERY_CHUNK_SIZE]
+            distances = self.distances(chunk)
+            if mask is not None:
+                distances = np.where(mask[None, :], distances, np.inf)
+            if fetch < distances.shape[1]:
+                rows = np.argpartition(distances, fetch - 1, axis=1)[:, :fetch]
+            else:
+                rows = np.broadcast_to(np.arange(distances.shape[1]), distances.shape)
+            row_distances = self.rescore(chunk, rows, distances)
+            order = np.argsort(row_distances, axis=1, kind="stable")[:, :k]
+            all_rows.append(np.take_along_axis(rows, order, axis=1))
+            all_distances.append(np.take_along_axis(row_distances, order, axis=1))
+        return np.vstack(all_rows), np.vstack(all_distances)
+
+    def vectors(self, rows) -> np.ndarray:
+        """Stored float32 vectors of the given rows."""
+        return self.matrix[self._base_rows(rows)]
+
+    def metadata_at(self, row: int) -> Dict[str, Any]:
+        metadata = {}
+        for field, column in self.columns.items():
+            value = column[row]
+            if value is not _MISSING:
+                metadata[field] = value
+        return metadata
+
+    def fingerprint(self) -> str:
+        """collection_fingerprint of the items held in this index."""
+        total = sum(item_digest(self.id_at(row), self.metadata_at(row)) for row in range(self.count()))
+        return f"{total % FINGERPRINT_MODULUS:032x}"
+
+    def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 10,
+        where: Optional[Dict] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Chroma-compatible query: returns ids/distances/metadatas/embeddings per query."""
+        include = include or ["metadatas", "distances"]
+        rows, distances = self.top_k(query_embeddings, n_results, where)
+        return {
+            "ids": [[self.ids[r] for r in row] for row in rows],
+            "distances": [d.tolist() for d in distances] if "distances" in include else None,
+            "metadatas": [[self.metadata_at(r) for r in row] for row in rows] if "metadatas" in include else None,
+            "embeddings": [self.vectors(row) for row in rows] if "embeddings" in include else None,
+        }
+
+    def get(self, ids: List[str], include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Chroma-compatible get by ids (unknown ids are skipped)."""
+        include = include or ["metadatas"]
+        rows = self.rows_of(ids)
+        return {
+            "ids": [self.ids[r] for r in rows],
+            "metadatas": [self.metadata_at(r) for r in rows] if "metadatas" in include else None,
+            "embeddings": [self.vectors(r) for r in rows] if "embeddings" in include else None,
+        }
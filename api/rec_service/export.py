@@ -0,0 +1,233 @@
+"""
+Streaming collection export for the YUNO Recommendation Service
+Pages through a collection with collection.get(offset, limit) and yields NDJSON lines or Arrow IPC batches
+
+Usage:
+    python export.py upskilling --output upskilling.ndjson
+    python export.py holistic --format arrow --include-embeddings --output holistic.arrow
+    python export.py holistic --fields title,category,event_date --output - | head
+
+Only one page is held in memory at a time, whatever the collection size.
+Arrow output needs pyarrow (pip install pyarrow); it reads the metadata once more up front to fix the schema.
+"""
+
+import argparse
+import io
+import json
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+import ingest
+
+EXPORT_FORMATS = ("ndjson", "arrow")
+
+# Items read from ChromaDB (and emitted as one Arrow batch) per call
+PAGE_SIZE = 1000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Turn 'a,b,c' into a list of metadata fields (None keeps every field)."""
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+
+def iter_pages(
+    collection,
+    fields: Optional[List[str]] = None,
+    include_embeddings: bool = False,
+    include_documents: bool = True,
+    page_size: int = PAGE_SIZE,
+    exclude_fields: Sequence[str] = (),
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the collection one page at a time as {"ids", "documents", "metadatas", "embeddings"}.
+    Metadata is projected onto fields when given and never contains exclude_fields; excluded parts are None.
+    """
+    include = ["metadatas"]
+    if include_documents:
+        include.append("documents")
+    if include_embeddings:
+        include.append("embeddings")
+
+    offset = 0
+    while True:
+        page = collection.get(offset=offset, limit=page_size, include=include)
+        if not page["ids"]:
+            return
+        metadatas = [metadata or {} for metadata in page["metadatas"]]
+        if fields is not None:
+            metadatas = [{field: metadata.get(field) for field in fields} for metadata in metadatas]
+        if exclude_fields:
+            metadatas = [
+                {key: value for key, value in metadata.items() if key not in exclude_fields}
+                for metadata in metadatas
+            ]
+        yield {
+            "ids": page["ids"],
+            "documents": page["documents"] if include_documents else None,
+            "metadatas": metadatas,
+            "embeddings": np.asarray(page["embeddings"], dtype=np.float32) if include_embeddings else None,
+        }
+        offset += len(page["ids"])
+
+
+def iter_ndjson(collection, **options) -> Iterator[bytes]:
+    """One JSON object per item: id, metadata and, when requested, document and embedding."""
+    for page in iter_pages(collection, **options):
+        lines = []
+        for i, item_id in enumerate(page["ids"]):
+            record = {"id": item_id}
+            if page["documents"] is not None:
+                record["document"] = page["documents"][i]
+            record["metadata"] = page["metadatas"][i]
+            if page["embeddings"] is not None:
+                record["embedding"] = page["embeddings"][i].tolist()
+            lines.append(json.dumps(record))
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def metadata_types(collection, **options) -> Dict[str, type]:
+    """
+    One Python type per metadata field across the whole collection (a metadata-only pass):
+    bool, int or float when every value has it (ints widen to float), otherwise str.
+    """
+    options = {**options, "include_embeddings": False, "include_documents": False}
+    kinds: Dict[str, set] = {}
+    for page in iter_pages(collection, **options):
+        for metadata in page["metadatas"]:
+            for key, value in metadata.items():
+                field_kinds = kinds.setdefault(key, set())
+                if value is not None:
+                    field_kinds.add(type(value))
+
+    types = {}
+    for key, field_kinds in kinds.items():
+        if field_kinds == {bool}:
+            types[key] = bool
+        elif field_kinds and field_kinds <= {int}:
+            types[key] = int
+        elif field_kinds and field_kinds <= {int, float}:
+            types[key] = float
+        else:
+            types[key] = str
+    return types
+
+
+def _arrow_values(values: List[Any], kind: type) -> List[Any]:
+    """Values of one metadata column converted to its unified type (strings for mixed columns)."""
+    if kind is str:
+        return [value if value is None or isinstance(value, str) else json.dumps(value) for value in values]
+    if kind is float:
+        return [None if value is None else float(value) for value in values]
+    return values
+
+
+def iter_arrow(collection, **options) -> Iterator[bytes]:
+    """
+    An Arrow IPC stream: columns id, document, one per metadata field and embedding
+    (fixed-size float32 list). Metadata columns and their types are fixed before the
+    first page from a metadata-only pass, so a value type that changes between pages
+    cannot break the stream; missing values are null.
+    """
+    import pyarrow as pa
+
+    arrow_types = {bool: pa.bool_(), int: pa.int64(), float: pa.float64(), str: pa.string()}
+    types = metadata_types(collection, **options)
+
+    sink = io.BytesIO()
+    writer = None
+    for page in iter_pages(collection, **options):
+        columns = {"id": pa.array(page["ids"], type=pa.string())}
+        if page["documents"] is not None:
+            columns["document"] = pa.array(page["documents"], type=pa.string())
+        for key, kind in types.items():
+            values = _arrow_values([metadata.get(key) for metadata in page["metadatas"]], kind)
+            columns[f"metadata.{key}"] = pa.array(values, type=arrow_types[kind])
+
+        if page["embeddings"] is not None:
+            embeddings = page["embeddings"]
+            columns["embedding"] = pa.FixedSizeListArray.from_arrays(
+                pa.array(embeddings.reshape(-1), type=pa.float32()), embeddings.shape[1]
+            )
+
+        batch = pa.RecordBatch.from_pydict(columns)
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, batch.schema)
+        writer.write_batch(batch)
+        yield _drain(sink)
+
+    if writer is None:
+        # Empty collection: still emit a valid (schema-only) stream
+        writer = pa.ipc.new_stream(sink, pa.schema([("id", pa.string())]))
+    writer.close()
+    yield _drain(sink)
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    """Take what the IPC writer has produced so far, leaving the buffer empty."""
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def iter_export(collection, format: str = "ndjson", **options) -> Iterator[bytes]:
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if format == "arrow":
+        return iter_arrow(collection, **options)
+    return iter_ndjson(collection, **options)
+
+
+# =============================================================================
+# COMMAND LINE
+# =============================================================================
+
+def main():
+    import chromadb
+
+    parser = argparse.ArgumentParser(description="Stream a YUNO collection to NDJSON or Arrow")
+    parser.add_argument("collection", help="Collection name (upskilling or holistic)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--output", default="-", help="Output file ('-' for stdout)")
+    parser.add_argument("--fields", default=None, help="Comma-separated metadata fields to keep (default: all)")
+    parser.add_argument("--include-embeddings", action="store_true", help="Add each item's vector")
+    parser.add_argument("--no-documents", action="store_true", help="Leave out the embedded text")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--db", default="./local_vector_db", help="ChromaDB path")
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=args.db)
+    collection = client.get_collection(args.collection)
+    started = time.perf_counter()
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    written = 0
+    try:
+        for chunk in iter_export(
+            collection,
+            args.format,
+            fields=parse_fields(args.fields),
+            include_embeddings=args.include_embeddings,
+            include_documents=not args.no_documents,
+            page_size=args.page_size,
+            exclude_fields=ingest.INTERNAL_FIELDS
+        ):
+            output.write(chunk)
+            written += len(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    print(f"[EXPORT] Wrote {written} bytes from '{args.collection}' in {time.perf_counter() - started:.2f}s.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
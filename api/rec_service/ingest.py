@@ -0,0 +1,200 @@
+"""
+Incremental catalog ingestion for the YUNO Recommendation Service
+Bulk upserts and deletes that only embed items whose embedding text changed
+
+Usage:
+    python ingest.py upskilling courses.ndjson
+    python ingest.py holistic events.ndjson --delete removed_ids.txt --api http://localhost:8000
+
+Each NDJSON line is one item: {"id": "...", "metadata": {...}}. The CLI posts
+the file in chunks to POST /collections/{name}/items on the running service,
+which stays the only writer to ChromaDB.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+import urllib.request
+from typing import Any, Callable, Dict, List, Optional
+
+from embedding_text import create_embedding_text
+from event_dates import TIMESTAMP_FIELD, add_event_timestamp
+
+# Metadata key holding the sha256 of an item's embedding text
+CONTENT_HASH_FIELD = "content_hash"
+
+# Bookkeeping fields the service adds to stored metadata; kept out of API responses and exports
+INTERNAL_FIELDS = (CONTENT_HASH_FIELD, TIMESTAMP_FIELD)
+
+# Items compared/written per ChromaDB call, and texts per embedding call
+WRITE_BATCH_SIZE = 5000
+EMBED_BATCH_SIZE = 100
+
+# Items sent per request by the CLI
+CLI_CHUNK_SIZE = 2000
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def public_metadata(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """A copy of stored metadata without INTERNAL_FIELDS."""
+    return {key: value for key, value in (metadata or {}).items() if key not in INTERNAL_FIELDS}
+
+
+def item_embedding_text(collection_name: str, metadata: Dict[str, Any]) -> str:
+    """The text an item is embedded from (same as generated items); raises KeyError on missing fields."""
+    return create_embedding_text(metadata, is_course=collection_name == "upskilling")
+
+
+def ingest_items(
+    collection,
+    items: List[Dict[str, Any]],
+    delete_ids: List[str],
+    embed: Callable[[List[str]], List[List[float]]],
+    on_change: Optional[Callable[[List[str], List[Dict[str, Any]], List[str]], None]] = None,
+    write_batch_size: int = WRITE_BATCH_SIZE,
+    embed_batch_size: int = EMBED_BATCH_SIZE,
+) -> Dict[str, Any]:
+    """
+    Upsert items ({"id", "metadata"}) and delete ids in one collection.
+
+    Each item's embedding text is hashed and compared with the hash stored on the
+    existing record: unchanged items are skipped, items whose metadata alone
+    changed are updated without embedding, and only new or re-worded items are
+    sent to embed() (batches of embed_batch_size; [] marks a failure).
+    event_date is mirrored into numeric event_ts metadata for date filtering.
+    on_change(ids, metadatas, deleted_ids) is called after every write.
+    """
+    # The last occurrence of an id wins
+    latest = {item["id"]: item["metadata"] for item in items}
+    ids = list(latest)
+    summary = {"received": len(items), "unchanged": 0, "updated": 0, "embedded": 0, "deleted": 0, "errors": []}
+
+    for start in range(0, len(ids), write_batch_size):
+        chunk = ids[start:start + write_batch_size]
+        existing = collection.get(ids=chunk, include=["metadatas"])
+        existing_metadata = dict(zip(existing["ids"], existing["metadatas"] or []))
+
+        metadata_only, to_embed = [], []
+        records = {}
+        for item_id in chunk:
+            metadata = add_event_timestamp({key: value for key, value in latest[item_id].items() if value is not None})
+            try:
+                text = item_embedding_text(collection.name, metadata)
+            except KeyError as e:
+                summary["errors"].append({"id": item_id, "error": f"missing field {e}"})
+                continue
+            metadata[CONTENT_HASH_FIELD] = content_hash(text)
+            records[item_id] = (text, metadata)
+
+            previous = existing_metadata.get(item_id)
+            if previous is None or previous.get(CONTENT_HASH_FIELD) != metadata[CONTENT_HASH_FIELD]:
+                to_embed.append(item_id)
+            elif previous != metadata:
+                metadata_only.append(item_id)
+            else:
+                summary["unchanged"] += 1
+
+        if metadata_only:
+            collection.update(ids=metadata_only, metadatas=[records[i][1] for i in metadata_only])
+            summary["updated"] += len(metadata_only)
+            if on_change is not None:
+                on_change(metadata_only, [records[i][1] for i in metadata_only], [])
+
+        embedded_ids, embeddings = [], []
+        for batch_start in range(0, len(to_embed), embed_batch_size):
+            batch = to_embed[batch_start:batch_start + embed_batch_size]
+            for item_id, embedding in zip(batch, embed([records[i][0] for i in batch])):
+                if len(embedding):
+                    embedded_ids.append(item_id)
+                    embeddings.append(embedding)
+                else:
+                    summary["errors"].append({"id": item_id, "error": "embedding failed"})
+        if embedded_ids:
+            collection.upsert(
+                ids=embedded_ids,
+                embeddings=embeddings,
+                documents=[records[i][0] for i in embedded_ids],
+                metadatas=[records[i][1] for i in embedded_ids]
+            )
+            summary["embedded"] += len(embedded_ids)
+            if on_change is not None:
+                on_change(embedded_ids, [records[i][1] for i in embedded_ids], [])
+
+    unique_deletes = list(dict.fromkeys(delete_ids))
+    for start in range(0, len(unique_deletes), write_batch_size):
+        chunk = unique_deletes[start:start + write_batch_size]
+        found = collection.get(ids=chunk, include=[])["ids"]
+        if found:
+            collection.delete(ids=found)
+            summary["deleted"] += len(found)
+            if on_change is not None:
+                on_change([], [], found)
+
+    summary["failed"] = len(summary["errors"])
+    return summary
+
+
+# =============================================================================
+# COMMAND LINE
+# =============================================================================
+
+def post_items(api_url: str, collection_name: str, body: Dict[str, Any], token: Optional[str]) -> Dict[str, Any]:
+    request = urllib.request.Request(
+        f"{api_url}/collections/{collection_name}/items",
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json", **({"X-Ingest-Token": token} if token else {})},
+        method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=600) as response:
+        return json.loads(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upsert or delete YUNO catalog items through the running service")
+    parser.add_argument("collection", choices=["upskilling", "holistic"])
+    parser.add_argument("items", nargs="?", help="NDJSON file of {\"id\", \"metadata\"} items to upsert")
+    parser.add_argument("--delete", default=None, help="File with one item id per line to delete")
+    parser.add_argument("--api", default=os.getenv("REC_SERVICE_URL", "http://localhost:8000"), help="Service URL")
+    parser.add_argument("--token", default=os.getenv("INGEST_TOKEN"), help="X-Ingest-Token (the service's INGEST_TOKEN)")
+    parser.add_argument("--chunk-size", type=int, default=CLI_CHUNK_SIZE, help="Items per request")
+    args = parser.parse_args()
+
+    api_url = args.api.rstrip("/")
+    totals = {"received": 0, "unchanged": 0, "updated": 0, "embedded": 0, "deleted": 0, "failed": 0}
+    started = time.perf_counter()
+
+    def send(body):
+        summary = post_items(api_url, args.collection, body, args.token)
+        for key in totals:
+            totals[key] += summary.get(key, 0)
+        for error in summary.get("errors", []):
+            print(f"[ERROR] {error['id']}: {error['error']}")
+
+    if args.items:
+        with open(args.items, "r", encoding="utf-8") as f:
+            chunk = []
+            for line in f:
+                if line.strip():
+                    chunk.append(json.loads(line))
+                if len(chunk) >= args.chunk_size:
+                    send({"items": chunk})
+                    chunk = []
+            if chunk:
+                send({"items": chunk})
+
+    if args.delete:
+        with open(args.delete, "r", encoding="utf-8") as f:
+            delete_ids = [line.strip() for line in f if line.strip()]
+        for start in range(0, len(delete_ids), args.chunk_size):
+            send({"delete": delete_ids[start:start + args.chunk_size]})
+
+    print(f"[INGEST] {totals} in {time.perf_counter() - started:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -237,6 +237,11 @@ HOLISTIC_TEMPLATES = [
 import google.generativeai as genai
 import os
 
+from embedding_providers import provider_from_env
+from embedding_text import create_embedding_text
+from embedding_store import EmbeddingStore
+from event_dates import add_event_timestamp
+
 # Configure Gemini
 GENAI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GENAI_API_KEY:
@@ -246,28 +251,62 @@ if not GENAI_API_KEY:
 else:
     genai.configure(api_key=GENAI_API_KEY)
 
-# Use Gemini Embedding Model
-EMBEDDING_MODEL = "models/text-embedding-004"
+# Embedding model comes from EMBEDDING_PROVIDER (Gemini text-embedding-004 by default)
+_embedding_provider = None
+
+# Persistent, content-addressed document embeddings; set to "" to disable
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "./embedding_store")
+DOCUMENT_TASK_TYPE = "retrieval_document"
+_embedding_store = None
+
+def get_embedding_provider():
+    """Create the configured embedding provider on first use"""
+    global _embedding_provider
+    if _embedding_provider is None:
+        _embedding_provider = provider_from_env()
+    return _embedding_provider
+
+def set_embedding_provider(provider):
+    """Use a specific embedding provider instead of the configured one (e.g. for benchmarks)"""
+    global _embedding_provider
+    _embedding_provider = provider
+
+def get_embedding_store():
+    """Open the embedding store on first use (None when disabled)"""
+    global _embedding_store
+    if _embedding_store is None and EMBEDDING_STORE_PATH:
+        _embedding_store = EmbeddingStore(EMBEDDING_STORE_PATH)
+    return _embedding_store
 
 def get_embedding(text):
-    """Generate embedding using Gemini API"""
+    """Generate embedding with the configured provider (reusing the stored one if the text is unchanged)"""
+    return get_embeddings([text])[0]
+
+def get_embeddings(texts):
+    """
+    Generate embeddings for a batch of texts ([] for each failure).
+    Texts already in the embedding store are not sent to the API.
+    """
+    if not texts:
+        return []
+    store = get_embedding_store()
+    if store is None:
+        return embed_documents(texts)
+    return store.embed(texts, get_embedding_provider().name, DOCUMENT_TASK_TYPE, embed_documents)
+
+def embed_documents(texts):
+    """Embed a batch of texts with one provider call ([] for each failure)"""
+    provider = get_embedding_provider()
     try:
-        # Check if key exists
-        if not GENAI_API_KEY:
-             return []
-        
+        # Check if the provider can be used (e.g. Gemini key exists)
+        if not provider.available:
+            return [[] for _ in texts]
+
         # Strip newlines for robustness
-        text = text.replace("\n", " ")
-        
-        result = genai.embed_content(
-            model=EMBEDDING_MODEL,
-            content=text,
-            task_type="retrieval_document"
-        )
-        return result['embedding']
+        return provider.embed([text.replace("\n", " ") for text in texts], DOCUMENT_TASK_TYPE)
     except Exception as e:
-        print(f"Error generating embedding for text '{text[:20]}...': {e}")
-        return []
+        print(f"Error generating embeddings for a batch of {len(texts)} texts: {e}")
+        return [[] for _ in texts]
 
 def generate_course_description(title: str, category: str, difficulty: str, provider: str) -> str:
     """Generate realistic course descriptions based on title and category."""
@@ -327,17 +366,6 @@ def generate_event_description(event_name: str, event_type: str, intensity: str,
     return random.choice(templates.get(event_type, templates["Social"]))
 
 
-def create_embedding_text(row: dict, is_course: bool = True) -> str:
-    """Create embedding text by concatenating relevant fields."""
-    
-    if is_course:
-        personality_tags = f"RIASEC: {row['primary_riasec']}. OCEAN Focus: {row['ocean_trait_focus']}."
-        return f"{row['title']}. {row['provider']}. {row['category']}. {row['description']} {personality_tags}"
-    else:
-        personality_tags = f"RIASEC: {row['primary_riasec']}. OCEAN Focus: {row['ocean_trait_focus']}."
-        return f"{row['event_name']}. {row['type']}. {row['description']} {personality_tags}"
-
-
 # =============================================================================
 # DATA GENERATION FUNCTIONS
 # =============================================================================
@@ -371,6 +399,7 @@ def generate_upskilling_data(n_samples: int = 200) -> pd.DataFrame:
             "description": description,
             "event_date": (datetime.now() + timedelta(days=random.randint(1, 60))).strftime("%Y-%m-%d %H:%M:%S")
         }
+        add_event_timestamp(row)
         row["embedding_text"] = create_embedding_text(row, is_course=True)
         data.append(row)
         course_id += 1
@@ -417,6 +446,7 @@ def generate_upskilling_data(n_samples: int = 200) -> pd.DataFrame:
             "description": description,
             "event_date": (datetime.now() + timedelta(days=random.randint(1, 60))).strftime("%Y-%m-%d %H:%M:%S")
         }
+        add_event_timestamp(row)
         row["embedding_text"] = create_embedding_text(row, is_course=True)
         data.append(row)
         course_id += 1
@@ -452,6 +482,7 @@ def generate_holistic_data(n_samples: int = 200) -> pd.DataFrame:
             "description": description,
             "event_date": (datetime.now() + timedelta(days=random.randint(1, 60))).strftime("%Y-%m-%d %H:%M:%S")
         }
+        add_event_timestamp(row)
         row["embedding_text"] = create_embedding_text(row, is_course=False)
         data.append(row)
         event_id += 1
@@ -497,6 +528,7 @@ def generate_holistic_data(n_samples: int = 200) -> pd.DataFrame:
             "description": description,
             "event_date": (datetime.now() + timedelta(days=random.randint(1, 60))).strftime("%Y-%m-%d %H:%M:%S")
         }
+        add_event_timestamp(row)
         row["embedding_text"] = create_embedding_text(row, is_course=False)
         data.append(row)
         event_id += 1
@@ -0,0 +1,188 @@
+"""
+Lightweight latency instrumentation for the YUNO Recommendation Service
+Per-stage histograms exposed in Prometheus text format, plus Server-Timing headers
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds; an implicit +Inf bucket follows the last one
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stage recording is on by default; see set_enabled
+_enabled = True
+
+# Stage durations (milliseconds) of the request currently being served, for Server-Timing
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# =============================================================================
+# HISTOGRAM
+# =============================================================================
+
+class Histogram:
+    """
+    Thread-safe fixed-bucket histogram keyed by a tuple of label values.
+    Observing is a bisect plus three additions under a lock, so it can stay on in production.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: Tuple[str, ...] = ()) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[labels] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Dict[str, object]]:
+        """Copy of every series: cumulative bucket counts, sum and count."""
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        snapshot = {}
+        for labels, (counts, total, count) in series.items():
+            cumulative, running = [], 0
+            for bucket_count in counts:
+                running += bucket_count
+                cumulative.append(running)
+            snapshot[labels] = {"buckets": cumulative, "sum": total, "count": count}
+        return snapshot
+
+    def render(self) -> List[str]:
+        """Prometheus text exposition lines for this histogram."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        bounds = list(self.buckets) + [float("inf")]
+        for labels, series in sorted(self.snapshot().items()):
+            pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(self.labelnames, labels)]
+            for bound, count in zip(bounds, series["buckets"]):
+                bucket_labels = ",".join(pairs + [f'le="{_format_value(bound)}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {count}")
+            suffix = "{" + ",".join(pairs) + "}" if pairs else ""
+            lines.append(f"{self.name}_sum{suffix} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{suffix} {series['count']}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "rec_stage_duration_seconds",
+    "Time spent in each stage of the recommendation path.",
+    labelnames=("stage", "collection")
+)
+
+
+def render_metrics() -> str:
+    """All metrics in Prometheus text format (version 0.0.4)."""
+    return "\n".join(STAGE_SECONDS.render()) + "\n"
+
+
+# =============================================================================
+# STAGE TIMING
+# =============================================================================
+
+def set_enabled(enabled: bool) -> None:
+    """Turn stage recording (histograms and Server-Timing) on or off."""
+    global _enabled
+    _enabled = enabled
+
+
+class Stage:
+    """
+    Context manager that times a block as one stage of the current request:
+    `with Stage("embed"): ...` or `with Stage("vector_query", collection.name): ...`.
+    """
+
+    __slots__ = ("name", "collection", "started")
+
+    def __init__(self, name: str, collection: str = ""):
+        self.name = name
+        self.collection = collection
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if _enabled:
+            record_stage(self.name, time.perf_counter() - self.started, self.collection)
+        return False
+
+
+def record_stage(name: str, seconds: float, collection: str = "") -> None:
+    """Add a stage duration to its histogram and to the current request's Server-Timing."""
+    STAGE_SECONDS.observe(seconds, (name, collection))
+    timings = _request_timings.get()
+    if timings is not None:
+        key = f"{name}.{collection}" if collection else name
+        # A stage can run more than once per request (e.g. per batch row); report the total
+        timings[key] = timings.get(key, 0.0) + seconds * 1000
+
+
+def server_timing_header(timings: Dict[str, float], total_ms: float) -> bytes:
+    """Format stage durations as a Server-Timing header value."""
+    entries = [f"{name};dur={duration:.2f}" for name, duration in timings.items()]
+    entries.append(f"total;dur={total_ms:.2f}")
+    return ", ".join(entries).encode("latin-1")
+
+
+class ServerTimingMiddleware:
+    """
+    Pure ASGI middleware that collects the stages recorded while serving a request
+    and reports them, with the total time to first byte, in a Server-Timing header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _enabled:
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - started) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing_header(timings, total_ms)))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
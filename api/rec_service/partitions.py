@@ -0,0 +1,148 @@
+"""
+Per-audience index partitions for the YUNO Recommendation Service
+Keeps one physical index per user stage so queries need no target_audience filter
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from exact_search import ExactSearchIndex, collection_fingerprint, collection_space
+
+USER_STAGES = ["Secondary", "Post-Secondary"]
+
+# Chroma collection.get page size used while copying items into partitions
+COPY_PAGE_SIZE = 5000
+
+
+def stage_audiences(user_stage: str) -> List[str]:
+    """target_audience values visible to a user stage ('Both' is visible to everyone)."""
+    return [user_stage, "Both"]
+
+
+def partition_name(collection_name: str, user_stage: str) -> str:
+    """Name of the Chroma collection holding one stage's partition."""
+    return f"{collection_name}__{user_stage.lower()}"
+
+
+def build_exact_partitions(index: ExactSearchIndex) -> Dict[str, ExactSearchIndex]:
+    """Split an in-memory index into one sub-index per user stage."""
+    partitions = {}
+    for user_stage in USER_STAGES:
+        rows = np.flatnonzero(index.mask({"target_audience": {"$in": stage_audiences(user_stage)}}))
+        partitions[user_stage] = index.subset(rows, name=partition_name(index.name, user_stage))
+    return partitions
+
+
+def build_chroma_partitions(
+    client,
+    collection,
+    partitions: Optional[Dict[str, object]] = None,
+    force: bool = False
+) -> Dict[str, object]:
+    """
+    Create (or reuse) one persistent Chroma collection per user stage.
+
+    A partition is rebuilt when it is missing, when force is set, or when the
+    source collection's fingerprint (ids and metadata) differs from the one it was built from.
+    Rebuilds fill a temporary collection first and swap it into `partitions`
+    (the live mapping, updated in place) before the old one is dropped, so
+    concurrent queries never see a half-built or deleted partition.
+    """
+    if partitions is None:
+        partitions = {}
+    source_fingerprint = collection_fingerprint(collection)
+    existing = {c.name if hasattr(c, "name") else c for c in client.list_collections()}
+    stale = []
+    for user_stage in USER_STAGES:
+        name = partition_name(collection.name, user_stage)
+        partition = client.get_collection(name) if name in existing else None
+        if force or partition is None or (partition.metadata or {}).get("source_fingerprint") != source_fingerprint:
+            stale.append(user_stage)
+        else:
+            partitions[user_stage] = partition
+
+    if not stale:
+        return partitions
+
+    print(f"[INDEX] Building audience partitions for '{collection.name}': {', '.join(stale)}")
+    building = {}
+    for user_stage in stale:
+        temp_name = f"{partition_name(collection.name, user_stage)}__building"
+        if temp_name in existing:
+            client.delete_collection(temp_name)
+        building[user_stage] = client.create_collection(
+            temp_name,
+            metadata={
+                "hnsw:space": collection_space(collection),
+                "partition_of": collection.name,
+                "user_stage": user_stage,
+                "source_fingerprint": source_fingerprint,
+            }
+        )
+
+    offset = 0
+    while True:
+        page = collection.get(
+            offset=offset,
+            limit=COPY_PAGE_SIZE,
+            include=["embeddings", "metadatas", "documents"]
+        )
+        if not page["ids"]:
+            break
+        offset += len(page["ids"])
+        for user_stage in stale:
+            audiences = stage_audiences(user_stage)
+            rows = [
+                i for i, metadata in enumerate(page["metadatas"])
+                if (metadata or {}).get("target_audience") in audiences
+            ]
+            if not rows:
+                continue
+            building[user_stage].add(
+                ids=[page["ids"][i] for i in rows],
+                embeddings=[page["embeddings"][i] for i in rows],
+                metadatas=[page["metadatas"][i] for i in rows],
+                documents=[page["documents"][i] for i in rows] if page["documents"] else None
+            )
+
+    for user_stage in stale:
+        name = partition_name(collection.name, user_stage)
+        partitions[user_stage] = building[user_stage]
+        if name in existing:
+            client.delete_collection(name)
+        building[user_stage].modify(name=name)
+    return partitions
+
+
+def apply_partition_changes(
+    collection,
+    partitions: Dict[str, object],
+    ids: List[str],
+    deleted_ids: List[str]
+) -> None:
+    """
+    Mirror upserted and deleted items of a source collection into its Chroma partitions,
+    moving items whose target_audience changed. Costs a read of the changed items only.
+    Partitions keep their build-time source_fingerprint, so an ingest applied here means one rebuild at the next startup.
+    """
+    page = collection.get(ids=ids, include=["embeddings", "metadatas", "documents"]) if ids else None
+    for user_stage, partition in partitions.items():
+        audiences = stage_audiences(user_stage)
+        rows = []
+        leaving = list(deleted_ids)
+        if page is not None:
+            for i, metadata in enumerate(page["metadatas"]):
+                if (metadata or {}).get("target_audience") in audiences:
+                    rows.append(i)
+                else:
+                    leaving.append(page["ids"][i])
+        if leaving:
+            partition.delete(ids=leaving)
+        if rows:
+            partition.upsert(
+                ids=[page["ids"][i] for i in rows],
+                embeddings=[page["embeddings"][i] for i in rows],
+                metadatas=[page["metadatas"][i] for i in rows],
+                documents=[page["documents"][i] for i in rows] if page["documents"] else None
+            )
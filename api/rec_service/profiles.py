@@ -0,0 +1,182 @@
+"""
+Personality-profile recommendations for the YUNO Recommendation Service
+Precomputes ranked lists for every 3-letter RIASEC code and user stage
+"""
+
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cache import LRUCache, normalize_query_text
+
+RIASEC_LETTERS = ["R", "I", "A", "S", "E", "C"]
+
+# Every ordered 3-letter code without repeated letters (6 * 5 * 4 = 120)
+RIASEC_CODES = ["".join(code) for code in itertools.permutations(RIASEC_LETTERS, 3)]
+
+
+def normalize_riasec_code(code: str) -> Optional[str]:
+    """Upper-case a RIASEC code and return it if it is one of the 120 valid codes."""
+    code = (code or "").strip().upper()
+    return code if code in RIASEC_CODES else None
+
+
+def riasec_query_text(code: str) -> str:
+    """The query text the discovery page sends for a RIASEC profile (see CommunityDiscovery.tsx)."""
+    return f"Find activities for a student with RIASEC code {code}."
+
+
+def profile_query_text(riasec_code: str, ocean_scores: Optional[Dict[str, int]] = None) -> str:
+    """
+    Query text describing a stored user profile, built the same way as the
+    discovery page: the RIASEC template plus any OCEAN traits scored above 70.
+    Users without a completed assessment get the generic fallback query.
+    """
+    code = normalize_riasec_code(riasec_code)
+    if code is None:
+        return "popular student activities"
+    text = riasec_query_text(code)
+    high_traits = [trait for trait, score in (ocean_scores or {}).items() if score > 70]
+    if high_traits:
+        text += f" I have high {', '.join(high_traits)}."
+    return text
+
+
+# Normalized templated query text -> RIASEC code, to recognise profile queries sent to /recommend
+_CODES_BY_QUERY_TEXT = {normalize_query_text(riasec_query_text(code)): code for code in RIASEC_CODES}
+
+
+def riasec_code_for_query(text: str) -> Optional[str]:
+    """Return the RIASEC code if text is exactly the templated profile query, else None."""
+    return _CODES_BY_QUERY_TEXT.get(normalize_query_text(text))
+
+
+class ProfileRecommendationTable:
+    """
+    Ranked candidate lists for every (RIASEC code, user stage) pair.
+
+    rebuild() embeds the 120 templated profile queries and runs one batched
+    search per stage and collection; lookups afterwards need no embedding call
+    or vector search. Each table remembers the collection version it was built
+    from so stale tables can be told apart from fresh ones.
+    """
+
+    def __init__(self, depth: int = 20):
+        self.depth = depth
+        self.version: Optional[int] = None
+        self.built_at: Optional[float] = None
+        self.build_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._table: Dict[Tuple[str, str], Dict[str, List[Any]]] = {}
+        self._build_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._table)
+
+    def rebuild(
+        self,
+        version: int,
+        user_stages: List[str],
+        embed_texts: Callable[[List[str]], List[List[float]]],
+        search: Callable[[List[List[float]], str, int], Dict[str, List[List[Any]]]],
+    ) -> None:
+        """
+        Recompute the whole table.
+        search(embeddings, user_stage, n_results) must return, per collection name,
+        one ranked list per embedding.
+        """
+        with self._build_lock:
+            started = time.perf_counter()
+            try:
+                embeddings = embed_texts([riasec_query_text(code) for code in RIASEC_CODES])
+                table = {}
+                for user_stage in user_stages:
+                    results = search(embeddings, user_stage, self.depth)
+                    for i, code in enumerate(RIASEC_CODES):
+                        table[(code, user_stage)] = {
+                            collection_name: ranked[i] for collection_name, ranked in results.items()
+                        }
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[ERROR] Failed to build RIASEC profile table: {e}")
+                return
+
+            self._table = table
+            self.version = version
+            self.built_at = time.time()
+            self.build_seconds = round(time.perf_counter() - started, 3)
+            self.last_error = None
+            print(f"[PROFILES] Built {len(table)} RIASEC profile lists in {self.build_seconds}s (version {version}).")
+
+    def lookup(self, code: str, user_stage: str) -> Optional[Dict[str, List[Any]]]:
+        return self._table.get((code, user_stage))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "entries": len(self._table),
+            "depth": self.depth,
+            "collection_version": self.version,
+            "build_seconds": self.build_seconds,
+            "last_error": self.last_error,
+        }
+
+
+class UserProfileVectors:
+    """
+    Cached profile embeddings for returning users.
+
+    Each entry holds the profile_version it was built from. Entries are trusted
+    for poll_seconds; after that the caller re-reads the profile and only
+    re-embeds when the version has changed. invalidate() drops an entry
+    immediately (used when user_auth reports a saved assessment).
+    """
+
+    def __init__(self, max_users: int = 10000, poll_seconds: float = 60):
+        self.poll_seconds = poll_seconds
+        self._entries = LRUCache(max_entries=max_users)
+        self.embedded = 0
+        self.revalidated = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        return self._entries.get(user_id)
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.monotonic() - entry["checked_at"] < self.poll_seconds
+
+    def revalidate(self, entry: Dict[str, Any]) -> None:
+        """Mark an entry as confirmed against the current profile_version."""
+        entry["checked_at"] = time.monotonic()
+        self.revalidated += 1
+
+    def put(self, user_id: int, profile: Dict[str, Any], query_text: str, embedding: List[float]) -> Dict[str, Any]:
+        entry = {
+            "user_id": user_id,
+            "profile_version": profile.get("profile_version", 0),
+            "education_level": profile.get("education_level"),
+            "riasec_code": profile.get("riasec_code"),
+            "ocean_scores": profile.get("ocean_scores") or {},
+            "query_text": query_text,
+            "embedding": embedding,
+            "checked_at": time.monotonic(),
+        }
+        self._entries.set(user_id, entry)
+        self.embedded += 1
+        return entry
+
+    def invalidate(self, user_id: int) -> bool:
+        self.invalidations += 1
+        return self._entries.pop(user_id) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached_users": len(self._entries),
+            "hits": self._entries.hits,
+            "profiles_embedded": self.embedded,
+            "revalidated": self.revalidated,
+            "invalidations": self.invalidations,
+            "poll_seconds": self.poll_seconds,
+        }
@@ -0,0 +1,120 @@
+"""
+Hybrid re-ranking for the YUNO Recommendation Service
+Blends vector similarity with RIASEC and OCEAN profile matches using NumPy
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+RIASEC_LETTERS = ["R", "I", "A", "S", "E", "C"]
+OCEAN_TRAITS = ["Openness", "Conscientiousness", "Extraversion", "Agreeableness", "Neuroticism"]
+
+_RIASEC_INDEX = {letter: i for i, letter in enumerate(RIASEC_LETTERS)}
+_OCEAN_INDEX = {trait: i for i, trait in enumerate(OCEAN_TRAITS)}
+
+
+class RerankProfile:
+    """
+    A user's personality profile prepared for vectorized scoring.
+
+    RIASEC letters are weighted by their position in the user's code
+    (first 1.0, second 2/3, third 1/3); OCEAN scores are scaled to 0-1.
+    Index len(letters) / len(traits) is a padding slot scoring 0 for items
+    without (or with unknown) metadata.
+    """
+
+    def __init__(
+        self,
+        riasec_code: Optional[str] = None,
+        ocean_scores: Optional[Dict[str, float]] = None,
+        weight_similarity: float = 0.7,
+        weight_riasec: float = 0.2,
+        weight_ocean: float = 0.1,
+    ):
+        self.riasec_weights = np.zeros(len(RIASEC_LETTERS) + 1)
+        code = [letter for letter in (riasec_code or "").upper() if letter in _RIASEC_INDEX]
+        for position, letter in enumerate(code[:3]):
+            self.riasec_weights[_RIASEC_INDEX[letter]] = max(self.riasec_weights[_RIASEC_INDEX[letter]], 1 - position / 3)
+
+        self.ocean_weights = np.zeros(len(OCEAN_TRAITS) + 1)
+        for trait, score in (ocean_scores or {}).items():
+            if trait in _OCEAN_INDEX:
+                self.ocean_weights[_OCEAN_INDEX[trait]] = min(max(score / 100, 0.0), 1.0)
+
+        self.weight_similarity = weight_similarity
+        self.weight_riasec = weight_riasec
+        self.weight_ocean = weight_ocean
+
+    def score(self, similarities: np.ndarray, metadatas: List[Dict[str, Any]]) -> np.ndarray:
+        """Blended score for each candidate (same order as the inputs)."""
+        riasec_rows = np.fromiter(
+            (_RIASEC_INDEX.get(str(metadata.get("primary_riasec", ""))[:1], len(RIASEC_LETTERS)) for metadata in metadatas),
+            dtype=np.intp,
+            count=len(metadatas)
+        )
+        ocean_rows = np.fromiter(
+            (_OCEAN_INDEX.get(metadata.get("ocean_trait_focus"), len(OCEAN_TRAITS)) for metadata in metadatas),
+            dtype=np.intp,
+            count=len(metadatas)
+        )
+        return (
+            self.weight_similarity * similarities
+            + self.weight_riasec * self.riasec_weights[riasec_rows]
+            + self.weight_ocean * self.ocean_weights[ocean_rows]
+        )
+
+    def rerank(
+        self,
+        similarities: np.ndarray,
+        metadatas: List[Dict[str, Any]],
+        limit: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (candidate positions, blended scores) of the best `limit` candidates."""
+        if not len(metadatas):
+            return np.zeros(0, dtype=np.intp), np.zeros(0)
+        scores = self.score(similarities, metadatas)
+        order = np.argsort(-scores, kind="stable")[:limit]
+        return order, scores[order]
+
+
+def mmr_select(
+    relevance: np.ndarray,
+    embeddings: np.ndarray,
+    limit: int,
+    mmr_lambda: float = 0.7,
+) -> np.ndarray:
+    """
+    Maximal Marginal Relevance: pick `limit` candidate positions, each maximizing
+    mmr_lambda * relevance - (1 - mmr_lambda) * (max cosine similarity to those already picked).
+
+    Rows are normalized and scaled by sqrt(1 - mmr_lambda) once, so each step is a
+    single matrix-vector product against the last pick plus a running maximum:
+    limit * O(n * dim) with no Python pair loops. mmr_lambda=1 keeps the relevance order.
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    n = len(relevance)
+    limit = min(limit, n)
+    if limit <= 0:
+        return np.zeros(0, dtype=np.intp)
+
+    vectors = np.asarray(embeddings, dtype=np.float32).reshape(n, -1)
+    norms = np.sqrt(np.einsum("ij,ij->i", vectors, vectors))
+    vectors = vectors * ((1 - mmr_lambda) ** 0.5 / np.maximum(norms, 1e-12))[:, None]
+
+    gain = mmr_lambda * relevance
+    penalty = np.full(n, -np.inf, dtype=np.float32)
+    similarities = np.empty(n, dtype=np.float32)
+    scores = np.empty(n, dtype=np.float32)
+    order = np.empty(limit, dtype=np.intp)
+    # The first pick has nothing to be redundant with
+    picked = int(np.argmax(relevance))
+    order[0] = picked
+    for step in range(1, limit):
+        gain[picked] = -np.inf
+        np.dot(vectors, vectors[picked], out=similarities)
+        np.maximum(penalty, similarities, out=penalty)
+        np.subtract(gain, penalty, out=scores)
+        picked = int(scores.argmax())
+        order[step] = picked
+    return order
@@ -0,0 +1,1089 @@
+"""
+Shared read-only index files for the NumPy search backend
+One file set per collection (vectors, kNN neighbor lists, column-stored metadata) that every
+worker process memory-maps, so N workers share a single copy through the OS page cache
+
+Usage:
+    python shared_index.py build ./shared_index --collection upskilling --collection holistic
+    python shared_index.py info ./shared_index
+
+Layout of SEARCH_INDEX_DIR:
+    <collection>.current           name of the generation currently served
+    <collection>.lock              held while a worker checks or (re)builds the files
+    <collection>-<ns>/             one immutable generation (manifest.json + .npy arrays)
+
+A generation is never modified after it is published. Changes write a new one and swap
+the pointer, so workers still mapping the previous generation keep answering from it.
+
+Ingests do not rebuild a generation: write_update copies the mapped arrays, tombstones the
+rows of changed and deleted items, appends the new rows and links only those into the kNN
+graph. A full build (graph construction is quadratic in the collection size) happens when
+no generation exists, and as a background compaction once tombstones pile up; for large
+catalogs, build the first generation offline with the command line below.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from exact_search import (
+    SUBSET_BLOCK_ROWS,
+    ExactSearchIndex,
+    collection_fingerprint,
+    collection_space,
+    update_fingerprint,
+)
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+# kNN graph: neighbors stored per item, and the collection size from which it is built
+# (below that, exact search over the mapped matrix is already fast)
+GRAPH_NEIGHBORS = 16
+GRAPH_MIN_ITEMS = 20000
+# Result list size kept while walking the graph (larger = better recall, slower)
+GRAPH_EF = 64
+# Rows sampled as entry points: each search scores all of them and starts from the best `ef`.
+# A kNN graph has few links between clusters, so the walk has to start in the right ones
+GRAPH_ENTRY_POINTS = 1024
+# Filters keeping fewer rows than this share use exact search; the walk would visit mostly rejected rows
+GRAPH_MIN_SELECTIVITY = 0.2
+# Candidates expanded per step of the walk (their neighbor lists are scored in one array operation)
+GRAPH_EXPAND_BATCH = 8
+# Rows scored per matrix product while building the graph
+GRAPH_BUILD_BLOCK_ROWS = 1024
+# Appended rows, and mapped rows per block, scored at a time when linking new rows into the graph
+LINK_BLOCK_QUERIES = 256
+LINK_BLOCK_ROWS = 65536
+
+# Tombstoned share of the rows above which a generation should be compacted (fully rebuilt)
+MAX_TOMBSTONE_SHARE = 0.2
+
+# Value tables with at most this many distinct values are decoded once into the heap
+SMALL_VOCABULARY = 4096
+
+# Generations kept per collection; the previous one stays for workers that have not reloaded yet
+KEEP_GENERATIONS = 2
+
+
+# =============================================================================
+# FILES
+# =============================================================================
+
+def map_array(path: str) -> np.ndarray:
+    """
+    Read-only view of a .npy file backed by a shared mmap (no copy into the heap).
+    The pages are requested with MADV_WILLNEED, so a worker starts warm from the page cache.
+    """
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mmap, "MADV_WILLNEED"):
+        buffer.madvise(mmap.MADV_WILLNEED)
+    return np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset, order="F" if fortran_order else "C")
+
+
+def save_concat(path: str, parts: List[np.ndarray]) -> None:
+    """np.save of the parts concatenated, written through a file mapping (no joined copy in the heap)."""
+    total = sum(len(part) for part in parts)
+    shape = (total,) + parts[0].shape[1:]
+    if total == 0:
+        np.save(path, np.empty(shape, dtype=parts[0].dtype))
+        return
+    array = np.lib.format.open_memmap(path, mode="w+", dtype=parts[0].dtype, shape=shape)
+    start = 0
+    for part in parts:
+        array[start:start + len(part)] = part
+        start += len(part)
+    array.flush()
+    del array
+
+
+class StringTable:
+    """Strings stored as one UTF-8 blob plus int64 offsets; decoded one at a time on access."""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self.offsets = offsets
+        self.blob = blob
+
+    @staticmethod
+    def write(directory: str, prefix: str, strings: List[str]) -> None:
+        encoded = [value.encode("utf-8") for value in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        np.save(os.path.join(directory, f"{prefix}.offsets.npy"), offsets)
+        np.save(os.path.join(directory, f"{prefix}.blob.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    @staticmethod
+    def append(directory: str, prefix: str, table: Optional["StringTable"], strings: List[str]) -> None:
+        """Write an existing table followed by more strings (its blob is copied, not decoded)."""
+        encoded = [value.encode("utf-8") for value in strings]
+        offsets = table.offsets if table is not None else np.zeros(1, dtype=np.int64)
+        added = offsets[-1] + np.cumsum([len(value) for value in encoded], dtype=np.int64)
+        save_concat(os.path.join(directory, f"{prefix}.offsets.npy"), [offsets, added])
+        save_concat(os.path.join(directory, f"{prefix}.blob.npy"), [
+            table.blob if table is not None else np.zeros(0, dtype=np.uint8),
+            np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        ])
+
+    @classmethod
+    def open(cls, directory: str, prefix: str) -> "StringTable":
+        return cls(
+            map_array(os.path.join(directory, f"{prefix}.offsets.npy")),
+            map_array(os.path.join(directory, f"{prefix}.blob.npy"))
+        )
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def raw(self, i: int) -> bytes:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def __getitem__(self, i: int) -> str:
+        return self.raw(i).decode("utf-8")
+
+
+class MappedColumn:
+    """
+    One metadata field: an int32 code per row (-1 = missing) into a table of JSON-encoded
+    distinct values, plus a float64 copy (NaN where not a number) when the field has numbers.
+    """
+
+    def __init__(self, directory: str, prefix: str, numeric: bool):
+        self.codes = map_array(os.path.join(directory, f"{prefix}.codes.npy"))
+        self.table = StringTable.open(directory, f"{prefix}.values")
+        self.numbers = map_array(os.path.join(directory, f"{prefix}.numbers.npy")) if numeric else None
+        self._values: Optional[List[Any]] = None
+        self._codes_by_value: Optional[Dict[Any, List[int]]] = None
+
+    def value(self, code: int) -> Any:
+        if self._values is None and len(self.table) <= SMALL_VOCABULARY:
+            self._values = [json.loads(self.table[i]) for i in range(len(self.table))]
+        if self._values is not None:
+            return self._values[code]
+        return json.loads(self.table[code])
+
+    def codes_of(self, values: List[Any]) -> List[int]:
+        """Codes of the table entries equal to any of the given values (Python equality, like the object columns)."""
+        if self._codes_by_value is None:
+            codes_by_value: Dict[Any, List[int]] = {}
+            for code in range(len(self.table)):
+                codes_by_value.setdefault(self.value(code), []).append(code)
+            self._codes_by_value = codes_by_value
+        return [code for value in values for code in self._codes_by_value.get(value, [])]
+
+
+def write_columns(index: ExactSearchIndex, directory: str) -> List[Dict[str, Any]]:
+    """Dictionary-encode every metadata column of an in-memory index; returns the manifest entries."""
+    entries = []
+    for position, (field, column) in enumerate(index.columns.items()):
+        prefix = f"column_{position}"
+        table: Dict[Any, int] = {}
+        codes = np.empty(len(column), dtype=np.int32)
+        for row, value in enumerate(column):
+            if not isinstance(value, (str, int, float, bool)):
+                codes[row] = -1
+                continue
+            # Keyed by type as well, so True, 1 and 1.0 keep their own entries
+            codes[row] = table.setdefault((type(value), value), len(table))
+        np.save(os.path.join(directory, f"{prefix}.codes.npy"), codes)
+        StringTable.write(directory, f"{prefix}.values", [json.dumps(value) for _, value in table])
+        numeric = any(kind in (int, float) for kind, _ in table)
+        if numeric:
+            np.save(os.path.join(directory, f"{prefix}.numbers.npy"), index._numeric_column(field))
+        entries.append({"field": field, "prefix": prefix, "distinct": len(table), "numeric": numeric})
+    return entries
+
+
+def append_columns(base: "SharedSearchIndex", directory: str, metadatas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Write every column of a mapped index followed by the values of appended rows; returns the
+    manifest entries. Small value tables reuse their codes; larger ones (mostly unique text)
+    just get the new values appended, since a value may own several codes.
+    """
+    base_rows = len(base.base_matrix)
+    fields = list(base.fields) + sorted({key for metadata in metadatas for key in metadata} - set(base.fields))
+    entries = []
+    for position, field in enumerate(fields):
+        prefix = f"column_{position}"
+        column = base.fields.get(field)
+        table_size = len(column.table) if column is not None else 0
+        code_of: Dict[Any, int] = {}
+        if column is not None and table_size <= SMALL_VOCABULARY:
+            for code in range(table_size):
+                value = column.value(code)
+                code_of.setdefault((type(value), value), code)
+
+        strings: List[str] = []
+        codes = np.empty(len(metadatas), dtype=np.int32)
+        numbers = np.full(len(metadatas), np.nan)
+        for row, metadata in enumerate(metadatas):
+            value = metadata.get(field)
+            if not isinstance(value, (str, int, float, bool)):
+                codes[row] = -1
+                continue
+            key = (type(value), value)
+            if key not in code_of:
+                code_of[key] = table_size + len(strings)
+                strings.append(json.dumps(value))
+            codes[row] = code_of[key]
+            if not isinstance(value, bool) and isinstance(value, (int, float)):
+                numbers[row] = value
+
+        base_codes = column.codes if column is not None else np.full(base_rows, -1, dtype=np.int32)
+        save_concat(os.path.join(directory, f"{prefix}.codes.npy"), [base_codes, codes])
+        StringTable.append(directory, f"{prefix}.values", column.table if column is not None else None, strings)
+        base_numbers = column.numbers if column is not None else None
+        numeric = base_numbers is not None or not np.isnan(numbers).all()
+        if numeric:
+            if base_numbers is None:
+                base_numbers = np.full(base_rows, np.nan)
+            save_concat(os.path.join(directory, f"{prefix}.numbers.npy"), [base_numbers, numbers])
+        entries.append({"field": field, "prefix": prefix, "distinct": table_size + len(strings), "numeric": numeric})
+    return entries
+
+
+def build_neighbors(matrix: np.ndarray, space: str, degree: int) -> np.ndarray:
+    """Exact k-nearest-neighbor lists (rows x degree, nearest first), scored one block of rows at a time."""
+    count = len(matrix)
+    sq_norms = np.einsum("ij,ij->i", matrix, matrix) if space == "l2" else None
+    neighbors = np.empty((count, degree), dtype=np.int32)
+    for start in range(0, count, GRAPH_BUILD_BLOCK_ROWS):
+        stop = min(start + GRAPH_BUILD_BLOCK_ROWS, count)
+        dots = matrix[start:stop] @ matrix.T
+        if space == "l2":
+            distances = sq_norms[start:stop, None] + sq_norms[None, :] - 2.0 * dots
+        else:
+            distances = 1.0 - dots
+        distances[np.arange(stop - start), np.arange(start, stop)] = np.inf
+        nearest = np.argpartition(distances, degree - 1, axis=1)[:, :degree]
+        order = np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1, kind="stable")
+        neighbors[start:stop] = np.take_along_axis(nearest, order, axis=1)
+    return neighbors
+
+
+def nearest_rows(
+    matrix: np.ndarray,
+    sq_norms: Optional[np.ndarray],
+    rows: np.ndarray,
+    space: str,
+    degree: int,
+    skip: np.ndarray
+) -> np.ndarray:
+    """
+    The `degree` nearest rows of `matrix` to each of the given rows (nearest first), leaving
+    out the row itself and rows where `skip` is set. Costs len(rows) x len(matrix) distances,
+    scored in blocks so memory stays bounded whatever the collection size.
+    """
+    neighbors = np.empty((len(rows), degree), dtype=np.int32)
+    for query_start in range(0, len(rows), LINK_BLOCK_QUERIES):
+        query_rows = rows[query_start:query_start + LINK_BLOCK_QUERIES]
+        queries = np.asarray(matrix[query_rows])
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        best_distances = np.zeros((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(matrix), LINK_BLOCK_ROWS):
+            stop = min(start + LINK_BLOCK_ROWS, len(matrix))
+            dots = queries @ np.asarray(matrix[start:stop]).T
+            if space == "l2":
+                distances = sq_norms[query_rows, None] + sq_norms[None, start:stop] - 2.0 * dots
+            else:
+                distances = 1.0 - dots
+            distances[:, skip[start:stop]] = np.inf
+            inside = (query_rows >= start) & (query_rows < stop)
+            distances[np.flatnonzero(inside), query_rows[inside] - start] = np.inf
+
+            candidates = np.hstack([best_rows, np.broadcast_to(np.arange(start, stop), distances.shape)])
+            candidate_distances = np.hstack([best_distances, distances])
+            if candidates.shape[1] > degree:
+                keep = np.argpartition(candidate_distances, degree - 1, axis=1)[:, :degree]
+                candidates = np.take_along_axis(candidates, keep, axis=1)
+                candidate_distances = np.take_along_axis(candidate_distances, keep, axis=1)
+            best_rows, best_distances = candidates, candidate_distances
+        order = np.argsort(best_distances, axis=1, kind="stable")
+        neighbors[query_start:query_start + len(query_rows)] = np.take_along_axis(best_rows, order, axis=1)
+    return neighbors
+
+
+def link_back(neighbors: np.ndarray, matrix: np.ndarray, space: str, rows: np.ndarray, skip: np.ndarray) -> None:
+    """
+    Offer each new row to the neighbor lists of its own neighbors (in place): a list keeps its
+    `degree` nearest among its current entries and the new rows pointing at it. Tombstoned
+    entries count as infinitely far, so they are the first to be replaced.
+    """
+    new = set(rows.tolist())
+    incoming: Dict[int, List[int]] = {}
+    for row, row_neighbors in zip(rows.tolist(), neighbors[rows].tolist()):
+        for neighbor in row_neighbors:
+            if neighbor not in new:
+                incoming.setdefault(neighbor, []).append(row)
+
+    degree = neighbors.shape[1]
+    for row, sources in incoming.items():
+        candidates = np.unique(np.concatenate([neighbors[row], sources]))
+        vectors = np.asarray(matrix[candidates])
+        if space == "l2":
+            distances = ((vectors - matrix[row]) ** 2).sum(axis=1)
+        else:
+            distances = 1.0 - vectors @ matrix[row]
+        distances[skip[candidates]] = np.inf
+        neighbors[row] = candidates[np.argsort(distances, kind="stable")[:degree]]
+
+
+def write_index(
+    index: ExactSearchIndex,
+    directory: str,
+    neighbors: int = GRAPH_NEIGHBORS,
+    graph_min_items: int = GRAPH_MIN_ITEMS,
+    source: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Write an in-memory index as a shared file set into an (empty) directory; returns the manifest."""
+    count = index.count()
+    matrix = index.stored_matrix()
+    np.save(os.path.join(directory, "vectors.npy"), matrix)
+    if index.sq_norms is not None:
+        np.save(os.path.join(directory, "sq_norms.npy"), index.sq_norms)
+
+    ids = [str(item_id) for item_id in index.ids]
+    StringTable.write(directory, "ids", ids)
+    # Row numbers in id order, so id lookups are binary searches instead of a per-worker dict
+    np.save(os.path.join(directory, "ids.order.npy"), np.array(sorted(range(count), key=ids.__getitem__), dtype=np.int32))
+
+    degree = min(neighbors, count - 1)
+    graph = degree > 0 and count >= graph_min_items
+    if graph:
+        started = time.perf_counter()
+        np.save(os.path.join(directory, "neighbors.npy"), build_neighbors(matrix, index.space, degree))
+        rng = np.random.default_rng(0)
+        entry_points = np.sort(rng.choice(count, size=min(GRAPH_ENTRY_POINTS, count), replace=False))
+        np.save(os.path.join(directory, "entry_points.npy"), entry_points.astype(np.int32))
+        print(f"[INDEX] Built {degree}-NN graph for '{index.name}' in {time.perf_counter() - started:.1f}s.")
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "name": index.name,
+        "space": index.space,
+        "count": count,
+        "dim": index.dim,
+        "neighbors": degree if graph else 0,
+        "columns": write_columns(index, directory),
+        "source": source or {},
+        "built_at": time.time(),
+        # Generations updated from this one share its lineage (see compact)
+        "lineage": f"{index.name}-{time.time_ns()}",
+        "tombstones": 0,
+    }
+    with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def write_update(
+    base: "SharedSearchIndex",
+    directory: str,
+    touched_ids: List[str],
+    ids: List[str],
+    embeddings: np.ndarray,
+    metadatas: List[Dict[str, Any]],
+    source: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Write a mapped generation plus one change as a new file set; returns the manifest.
+    The live rows of every touched id are tombstoned, and the (id, embedding, metadata)
+    items are appended: touched ids without an item were deleted. Existing arrays are
+    copied as they are, and only the appended rows are scored to link them into the graph.
+    """
+    base_rows = len(base.base_matrix)
+    count = base_rows + len(ids)
+    vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), base.dim)
+    if base.space == "cosine":
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    save_concat(os.path.join(directory, "vectors.npy"), [base.base_matrix, vectors])
+    if base.space == "l2":
+        save_concat(os.path.join(directory, "sq_norms.npy"), [base.base_sq_norms, np.einsum("ij,ij->i", vectors, vectors)])
+
+    StringTable.append(directory, "ids", base.id_table, [str(item_id) for item_id in ids])
+    np.save(os.path.join(directory, "ids.order.npy"), base.merged_id_order(ids))
+
+    deleted = np.zeros(count, dtype=bool)
+    if base.deleted is not None:
+        deleted[:base_rows] = base.deleted
+    deleted[base._base_rows(base.rows_of(touched_ids))] = True
+    np.save(os.path.join(directory, "deleted.npy"), deleted)
+
+    degree = base.manifest["neighbors"]
+    if degree:
+        started = time.perf_counter()
+        matrix = map_array(os.path.join(directory, "vectors.npy"))
+        sq_norms = map_array(os.path.join(directory, "sq_norms.npy")) if base.space == "l2" else None
+        new_rows = np.arange(base_rows, count)
+        neighbors = np.lib.format.open_memmap(
+            os.path.join(directory, "neighbors.npy"), mode="w+", dtype=np.int32, shape=(count, degree)
+        )
+        neighbors[:base_rows] = base.neighbors
+        if len(new_rows):
+            neighbors[base_rows:] = nearest_rows(matrix, sq_norms, new_rows, base.space, degree, deleted)
+            link_back(neighbors, matrix, base.space, new_rows, deleted)
+        neighbors.flush()
+        del neighbors
+        np.save(os.path.join(directory, "entry_points.npy"), np.asarray(base.entry_points))
+        print(f"[INDEX] Linked {len(new_rows)} new rows into the graph of '{base.name}' in {time.perf_counter() - started:.2f}s.")
+
+    manifest = {
+        **base.manifest,
+        "count": count,
+        "columns": append_columns(base, directory, metadatas),
+        "source": source,
+        "built_at": time.time(),
+        "tombstones": int(deleted.sum()),
+    }
+    with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# =============================================================================
+# INDEX
+# =============================================================================
+
+class SharedSearchIndex(ExactSearchIndex):
+    """
+    ExactSearchIndex over a memory-mapped file set; nothing per item is copied into the heap.
+
+    Subsets (audience partitions) and generations with tombstoned rows keep a sorted
+    array of row numbers into the shared arrays instead of copying vectors: exact search
+    gathers and scores only those rows, one block at a time, and filters are evaluated on
+    the shared columns.
+    When the file set has neighbor lists, top_k walks the kNN graph (best-first, GRAPH_EF
+    results kept) instead of scoring every row, unless the filter is very selective.
+    """
+
+    @classmethod
+    def open(cls, directory: str, ef: int = GRAPH_EF) -> "SharedSearchIndex":
+        with open(os.path.join(directory, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported shared index format {manifest.get('format')} in {directory}")
+
+        index = cls.__new__(cls)
+        index.path = directory
+        index.manifest = manifest
+        index.name = manifest["name"]
+        index.space = manifest["space"]
+        index.dim = manifest["dim"]
+        index.ef = ef
+        index.base_matrix = map_array(os.path.join(directory, "vectors.npy"))
+        index.base_sq_norms = map_array(os.path.join(directory, "sq_norms.npy")) if index.space == "l2" else None
+        index.id_table = StringTable.open(directory, "ids")
+        index.id_order = map_array(os.path.join(directory, "ids.order.npy"))
+        index.neighbors = None
+        index.entry_points = None
+        if manifest["neighbors"]:
+            index.neighbors = map_array(os.path.join(directory, "neighbors.npy"))
+            index.entry_points = map_array(os.path.join(directory, "entry_points.npy"))
+        index.fields = {
+            entry["field"]: MappedColumn(directory, entry["prefix"], entry["numeric"])
+            for entry in manifest["columns"]
+        }
+        index.deleted = None
+        index.rows = None
+        if manifest.get("tombstones"):
+            index.deleted = map_array(os.path.join(directory, "deleted.npy"))
+            index.rows = np.flatnonzero(~index.deleted)
+        index.matrix = None
+        index.sq_norms = None
+        index._mask_cache = {}
+        index._numeric_columns = {}
+        return index
+
+    @property
+    def source(self) -> Dict[str, Any]:
+        return self.manifest.get("source") or {}
+
+    def count(self) -> int:
+        return len(self.base_matrix) if self.rows is None else len(self.rows)
+
+    def _local(self, values: np.ndarray) -> np.ndarray:
+        return values if self.rows is None else values[self.rows]
+
+    def subset(self, rows: np.ndarray, name: Optional[str] = None) -> "SharedSearchIndex":
+        """Smaller index over the given rows (kept in index order); the mapped files are shared, not sliced."""
+        subset = SharedSearchIndex.__new__(SharedSearchIndex)
+        subset.__dict__.update(self.__dict__)
+        subset.name = name or self.name
+        subset.rows = self._base_rows(np.sort(np.asarray(rows, dtype=np.int64)))
+        subset._mask_cache = {}
+        return subset
+
+    def id_at(self, row: int) -> str:
+        return self.id_table[int(self._base_rows(row))]
+
+    def _id_position(self, target: bytes, after: bool = False) -> int:
+        """Binary search of an encoded id in id_order: first position at (or, with after, past) it."""
+        lo, hi = 0, len(self.id_order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = self.id_table.raw(int(self.id_order[mid]))
+            if value < target or (after and value == target):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def rows_of(self, ids: List[str]) -> np.ndarray:
+        """Row numbers of the given ids, in order (unknown ids are skipped); binary search over the id table."""
+        found = []
+        for item_id in ids:
+            target = str(item_id).encode("utf-8")
+            # An updated id also has tombstoned rows, so take the first one still in this index
+            position = self._id_position(target)
+            while position < len(self.id_order) and self.id_table.raw(int(self.id_order[position])) == target:
+                row = int(self.id_order[position])
+                position += 1
+                if self.rows is not None:
+                    local = int(np.searchsorted(self.rows, row))
+                    if local == len(self.rows) or self.rows[local] != row:
+                        continue
+                    row = local
+                found.append(row)
+                break
+        return np.array(found, dtype=np.int64)
+
+    def merged_id_order(self, ids: List[str]) -> np.ndarray:
+        """id_order after appending rows for the given ids (numbered from the current row count)."""
+        encoded = [str(item_id).encode("utf-8") for item_id in ids]
+        appended = sorted(range(len(ids)), key=encoded.__getitem__)
+        positions = [self._id_position(encoded[i], after=True) for i in appended]
+        rows = len(self.base_matrix) + np.array(appended, dtype=np.int64)
+        return np.insert(np.asarray(self.id_order), positions, rows).astype(np.int32)
+
+    def describe(self) -> Dict[str, Any]:
+        arrays = [self.base_matrix, self.base_sq_norms, self.neighbors, self.deleted, self.id_table.blob, self.id_table.offsets]
+        for column in self.fields.values():
+            arrays.extend([column.codes, column.numbers, column.table.blob, column.table.offsets])
+        return {
+            "path": self.path,
+            "items": self.count(),
+            "dim": self.dim,
+            "neighbors": self.manifest["neighbors"],
+            "tombstones": self.manifest.get("tombstones", 0),
+            "mapped_bytes": int(sum(array.nbytes for array in arrays if array is not None)),
+            "built_at": self.manifest["built_at"],
+        }
+
+    # -------------------------------------------------------------------------
+    # Filtering
+    # -------------------------------------------------------------------------
+
+    def _numeric_column(self, field: str) -> np.ndarray:
+        # Mapped values of every row; _evaluate_field selects this index's rows at the end
+        column = self.fields[field]
+        if column.numbers is None:
+            return np.full(len(self.base_matrix), np.nan)
+        return column.numbers
+
+    def _evaluate_field(self, field: str, condition: Any) -> np.ndarray:
+        column = self.fields.get(field)
+        if column is None:
+            return np.zeros(self.count(), dtype=bool)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        present = column.codes >= 0
+        result = present.copy()
+        for op, operand in condition.items():
+            if op in ("$eq", "$ne"):
+                matches = np.isin(column.codes, column.codes_of([operand]))
+                result &= matches if op == "$eq" else ~matches
+            elif op in ("$in", "$nin"):
+                matches = np.isin(column.codes, column.codes_of(list(operand)))
+                result &= matches if op == "$in" else ~matches
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                values = self._numeric_column(field)
+                with np.errstate(invalid="ignore"):
+                    if op == "$gt":
+                        result &= values > operand
+                    elif op == "$gte":
+                        result &= values >= operand
+                    elif op == "$lt":
+                        result &= values < operand
+                    else:
+                        result &= values <= operand
+            else:
+                raise ValueError(f"Unsupported where operator: {op}")
+        return self._local(result)
+
+    # -------------------------------------------------------------------------
+    # Search
+    # -------------------------------------------------------------------------
+
+    def distances(self, query_embeddings: np.ndarray) -> np.ndarray:
+        queries = self._prepare_queries(query_embeddings)
+        if self.space == "cosine":
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        if self.rows is None:
+            dots = queries @ self.base_matrix.T
+        else:
+            dots = np.empty((len(queries), len(self.rows)), dtype=np.float32)
+            for start in range(0, len(self.rows), SUBSET_BLOCK_ROWS):
+                block = self.rows[start:start + SUBSET_BLOCK_ROWS]
+                dots[:, start:start + len(block)] = queries @ self.base_matrix[block].T
+        if self.space == "l2":
+            query_sq = np.einsum("ij,ij->i", queries, queries)[:, None]
+            return np.maximum(query_sq + self._local(self.base_sq_norms)[None, :] - 2.0 * dots, 0.0)
+        return 1.0 - dots
+
+    def vectors(self, rows) -> np.ndarray:
+        return np.asarray(self.base_matrix[self._base_rows(rows)])
+
+    def top_k(self, query_embeddings, n_results: int, where: Optional[Dict] = None):
+        if self.neighbors is None:
+            return super().top_k(query_embeddings, n_results, where)
+        mask = self.mask(where)
+        allowed = self.count() if mask is None else int(mask.sum())
+        if allowed < GRAPH_MIN_SELECTIVITY * len(self.base_matrix):
+            return super().top_k(query_embeddings, n_results, where)
+
+        queries = self._prepare_queries(query_embeddings)
+        k = min(n_results, allowed)
+        if k <= 0:
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0))
+        # The graph links all mapped rows; rows outside this subset or filter are walked, not returned
+        accept = None
+        if self.rows is not None or mask is not None:
+            accept = np.zeros(len(self.base_matrix), dtype=bool)
+            accept[self._base_rows(np.arange(self.count()) if mask is None else np.flatnonzero(mask))] = True
+
+        all_rows = np.empty((len(queries), k), dtype=np.int64)
+        all_distances = np.empty((len(queries), k), dtype=np.float32)
+        for i, query in enumerate(queries):
+            rows, distances = self._graph_search(query, k, accept)
+            if len(rows) < k:
+                # Accepted rows unreachable from the entry points: answer this query exactly
+                exact_rows, exact_distances = super().top_k(query[None, :], k, where)
+                all_rows[i], all_distances[i] = exact_rows[0], exact_distances[0]
+                continue
+            if self.rows is not None:
+                rows = np.searchsorted(self.rows, rows)
+            all_rows[i], all_distances[i] = rows, distances
+        return all_rows, all_distances
+
+    def _row_distances(self, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Exact distances from one query to the given mapped rows."""
+        vectors = self.base_matrix[rows]
+        if self.space == "l2":
+            return ((vectors - query) ** 2).sum(axis=1)
+        return 1.0 - vectors @ query
+
+    def _graph_search(self, query: np.ndarray, k: int, accept: Optional[np.ndarray]):
+        """
+        Best-first walk of the kNN graph; returns (mapped rows, distances) of up to k accepted rows.
+
+        Each step expands the GRAPH_EXPAND_BATCH nearest unexpanded candidates at once and
+        scores all their unvisited neighbors in one array operation, so the per-query cost is
+        a few dozen NumPy calls rather than a Python heap operation per neighbor.
+        """
+        if self.space == "cosine":
+            query = query / max(float(np.linalg.norm(query)), 1e-12)
+        ef = max(self.ef, k)
+        entry_distances = self._row_distances(query, self.entry_points)
+        seeds = np.argpartition(entry_distances, ef - 1)[:ef] if ef < len(entry_distances) else np.arange(len(entry_distances))
+        visited = np.zeros(len(self.base_matrix), dtype=bool)
+
+        # candidates: rows still to expand; best: the ef nearest accepted rows found so far
+        candidates = self.entry_points[seeds].astype(np.int64)
+        candidate_distances = entry_distances[seeds]
+        visited[candidates] = True
+        keep = slice(None) if accept is None else accept[candidates]
+        best, best_distances = self._nearest(candidates[keep], candidate_distances[keep], ef)
+
+        while len(candidates):
+            bound = best_distances.max() if len(best) >= ef else np.inf
+            open_ = candidate_distances <= bound
+            candidates, candidate_distances = candidates[open_], candidate_distances[open_]
+            if not len(candidates):
+                break
+            if len(candidates) > GRAPH_EXPAND_BATCH:
+                chosen = np.zeros(len(candidates), dtype=bool)
+                chosen[np.argpartition(candidate_distances, GRAPH_EXPAND_BATCH - 1)[:GRAPH_EXPAND_BATCH]] = True
+            else:
+                chosen = np.ones(len(candidates), dtype=bool)
+            expand = candidates[chosen]
+            candidates, candidate_distances = candidates[~chosen], candidate_distances[~chosen]
+
+            neighbors = np.unique(self.neighbors[expand])
+            neighbors = neighbors[~visited[neighbors]]
+            if not len(neighbors):
+                continue
+            visited[neighbors] = True
+            distances = self._row_distances(query, neighbors)
+            closer = distances < bound
+            neighbors, distances = neighbors[closer], distances[closer]
+            candidates = np.concatenate([candidates, neighbors])
+            candidate_distances = np.concatenate([candidate_distances, distances])
+            keep = slice(None) if accept is None else accept[neighbors]
+            best, best_distances = self._nearest(
+                np.concatenate([best, neighbors[keep]]),
+                np.concatenate([best_distances, distances[keep]]),
+                ef
+            )
+
+        order = np.argsort(best_distances, kind="stable")[:k]
+        return best[order], best_distances[order].astype(np.float32)
+
+    @staticmethod
+    def _nearest(rows: np.ndarray, distances: np.ndarray, count: int):
+        """The `count` nearest of the given rows (unordered)."""
+        if len(rows) <= count:
+            return rows, distances
+        keep = np.argpartition(distances, count - 1)[:count]
+        return rows[keep], distances[keep]
+
+    def metadata_at(self, row: int) -> Dict[str, Any]:
+        row = int(self._base_rows(row))
+        metadata = {}
+        for field, column in self.fields.items():
+            code = int(column.codes[row])
+            if code >= 0:
+                metadata[field] = column.value(code)
+        return metadata
+
+    def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 10,
+        where: Optional[Dict] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        include = include or ["metadatas", "distances"]
+        rows, distances = self.top_k(query_embeddings, n_results, where)
+        return {
+            "ids": [[self.id_at(r) for r in row] for row in rows],
+            "distances": [d.tolist() for d in distances] if "distances" in include else None,
+            "metadatas": [[self.metadata_at(r) for r in row] for row in rows] if "metadatas" in include else None,
+            "embeddings": [self.vectors(row) for row in rows] if "embeddings" in include else None,
+        }
+
+    def get(self, ids: List[str], include: Optional[List[str]] = None) -> Dict[str, Any]:
+        include = include or ["metadatas"]
+        rows = self.rows_of(ids)
+        return {
+            "ids": [self.id_at(r) for r in rows],
+            "metadatas": [self.metadata_at(r) for r in rows] if "metadatas" in include else None,
+            "embeddings": [self.vectors(r) for r in rows] if "embeddings" in include else None,
+        }
+
+
+# =============================================================================
+# GENERATIONS
+# =============================================================================
+
+def _pointer_path(root: str, name: str) -> str:
+    return os.path.join(root, f"{name}.current")
+
+
+def current_index_path(root: str, name: str) -> Optional[str]:
+    """Directory of the generation currently published for a collection (None if there is none)."""
+    try:
+        with open(_pointer_path(root, name), "r", encoding="utf-8") as f:
+            generation = f.read().strip()
+    except FileNotFoundError:
+        return None
+    path = os.path.join(root, generation)
+    return path if os.path.exists(os.path.join(path, MANIFEST_FILE)) else None
+
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True) -> Iterator[bool]:
+    """
+    Exclusive flock on `path` (created if missing), held across worker processes.
+    Yields whether the lock is held: False only when blocking is off and another holder has it.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        # No flock (Windows): run a single worker there
+        yield True
+        return
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def build_lock(root: str, name: str) -> Iterator[None]:
+    """Exclusive lock across worker processes, so only one of them builds a collection's files."""
+    os.makedirs(root, exist_ok=True)
+    with file_lock(os.path.join(root, f"{name}.lock")):
+        yield
+
+
+def _set_current(root: str, name: str, generation: str) -> None:
+    fd, temp_pointer = tempfile.mkstemp(dir=root, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(generation)
+    os.replace(temp_pointer, _pointer_path(root, name))
+
+
+def _publish(root: str, name: str, write: Callable[[str], Any]) -> str:
+    """
+    Fill a new generation with write(directory) and make it current; returns its directory.
+    Call with build_lock held. Old generations beyond KEEP_GENERATIONS are removed: workers
+    still mapping one keep their pages until they unmap it (POSIX unlink semantics).
+    """
+    os.makedirs(root, exist_ok=True)
+    generation = f"{name}-{time.time_ns()}"
+    temp_dir = tempfile.mkdtemp(dir=root, prefix=f".{generation}.")
+    try:
+        write(temp_dir)
+        os.rename(temp_dir, os.path.join(root, generation))
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    _set_current(root, name, generation)
+    prune_generations(root, name)
+    return os.path.join(root, generation)
+
+
+def publish_index(index: ExactSearchIndex, root: str, **options) -> str:
+    """Write a new generation for an in-memory index and make it current (build_lock held)."""
+    return _publish(root, index.name, lambda directory: write_index(index, directory, **options))
+
+
+def publish_update(base: SharedSearchIndex, root: str, collection, touched_ids: List[str]) -> str:
+    """
+    Publish `base` updated with the current state of the touched ids in the collection
+    (see write_update); returns base.path when none of them changed anything. Call with
+    build_lock held, and with the collection guarded against writes.
+    """
+    touched_ids = list(dict.fromkeys(touched_ids))
+    page = collection.get(ids=touched_ids, include=["embeddings", "metadatas"]) if touched_ids else None
+    ids = list(page["ids"]) if page is not None else []
+    live = base.rows_of(touched_ids)
+    if not ids and not len(live):
+        return base.path
+
+    metadatas = [metadata or {} for metadata in page["metadatas"]] if ids else []
+    source = {**base.source, "count": base.count() - len(live) + len(ids)}
+    if "fingerprint" in source:
+        removed = [(base.id_at(row), base.metadata_at(row)) for row in live]
+        source["fingerprint"] = update_fingerprint(source["fingerprint"], removed, list(zip(ids, metadatas)))
+    embeddings = np.asarray(page["embeddings"], dtype=np.float32) if ids else np.zeros((0, base.dim), dtype=np.float32)
+    return _publish(root, base.name, lambda directory: write_update(
+        base, directory, touched_ids, ids, embeddings, metadatas, source
+    ))
+
+
+def prune_generations(root: str, name: str, keep: int = KEEP_GENERATIONS) -> None:
+    """Remove all but the newest `keep` generations, and any half-written ones (build_lock held)."""
+    pattern = re.compile(rf"^\.?{re.escape(name)}-(\d+)(\..*)?$")
+    generations = []
+    for entry in os.listdir(root):
+        match = pattern.match(entry)
+        if not match or not os.path.isdir(os.path.join(root, entry)):
+            continue
+        if entry.startswith("."):
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+        else:
+            generations.append((int(match.group(1)), entry))
+    for _, entry in sorted(generations)[:-keep]:
+        shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+
+def collection_source(collection, index: Optional[ExactSearchIndex] = None) -> Dict[str, Any]:
+    """
+    What a generation was built from; a mismatch on load means the files are stale.
+    Pass the index loaded from the collection to describe exactly the items it holds.
+    """
+    return {
+        "count": collection.count() if index is None else index.count(),
+        "fingerprint": collection_fingerprint(collection) if index is None else index.fingerprint(),
+        "space": collection_space(collection),
+        "embedding_model": (collection.metadata or {}).get("embedding_model"),
+    }
+
+
+def load_or_build(collection, root: str, force: bool = False, ef: int = GRAPH_EF, **options) -> SharedSearchIndex:
+    """
+    Map the current generation of a collection's files, building it first when it is missing,
+    stale or `force` is set. The first worker to take the lock builds; the others wait for it
+    and then map the same files.
+    """
+    source = collection_source(collection)
+    with build_lock(root, collection.name):
+        path = current_index_path(root, collection.name)
+        if path is not None and not force:
+            try:
+                index = SharedSearchIndex.open(path, ef=ef)
+            except (ValueError, OSError, KeyError) as e:
+                print(f"[WARNING] Could not open shared index {path}: {e}. Rebuilding.")
+            else:
+                if index.source == source:
+                    return index
+        exact = ExactSearchIndex.from_collection(collection)
+        path = publish_index(exact, root, source=source, **options)
+    return SharedSearchIndex.open(path, ef=ef)
+
+
+def apply_changes(collection, root: str, touched_ids: List[str], ef: int = GRAPH_EF, **options) -> SharedSearchIndex:
+    """
+    Bring a collection's files up to date after the touched ids were upserted or deleted, and map
+    them. The current generation is updated (see write_update); it is only built when missing.
+    Call with the collection guarded against writes, so the files match it afterwards.
+    """
+    with build_lock(root, collection.name):
+        path = current_index_path(root, collection.name)
+        if path is None:
+            exact = ExactSearchIndex.from_collection(collection)
+            path = publish_index(exact, root, source=collection_source(collection, exact), **options)
+        else:
+            path = publish_update(SharedSearchIndex.open(path), root, collection, touched_ids)
+    return SharedSearchIndex.open(path, ef=ef)
+
+
+def needs_compaction(
+    index: SharedSearchIndex,
+    neighbors: int = GRAPH_NEIGHBORS,
+    graph_min_items: int = GRAPH_MIN_ITEMS
+) -> bool:
+    """Whether a generation should be rebuilt: too many tombstones, or grown past the graph threshold without one."""
+    if index.manifest.get("tombstones", 0) > MAX_TOMBSTONE_SHARE * len(index.base_matrix):
+        return True
+    return not index.manifest["neighbors"] and neighbors > 0 and index.count() >= graph_min_items
+
+
+def _touched_since(current: SharedSearchIndex, rows: int, deleted: Optional[np.ndarray]) -> List[str]:
+    """Ids changed in `current` since a generation of its lineage that had `rows` rows and `deleted` tombstones."""
+    touched = np.arange(rows, len(current.base_matrix))
+    if current.deleted is not None:
+        newly_deleted = np.asarray(current.deleted[:rows]).copy()
+        if deleted is not None:
+            newly_deleted &= ~deleted
+        touched = np.concatenate([np.flatnonzero(newly_deleted), touched])
+    return list(dict.fromkeys(current.id_table[int(row)] for row in touched))
+
+
+def compact(
+    collection,
+    root: str,
+    write_lock: Callable[[], ContextManager],
+    ef: int = GRAPH_EF,
+    **options
+) -> Optional[SharedSearchIndex]:
+    """
+    Rebuild a collection's current generation from scratch (dropping its tombstones and
+    rebuilding the graph) without holding writers up for the build. Returns the mapped
+    result, or None when another process is compacting or no generation exists.
+
+    The collection is read under write_lock (the lock ingests hold while they change it
+    and apply_changes). The build runs unlocked; then, under write_lock again, the result
+    is published and every id touched by updates published meanwhile is re-applied on top.
+    A full build published meanwhile (another lineage) makes the compaction moot.
+    """
+    name = collection.name
+    os.makedirs(root, exist_ok=True)
+    with file_lock(os.path.join(root, f"{name}.compact.lock"), blocking=False) as acquired:
+        if not acquired:
+            return None
+        prefix = f".compact.{name}."
+        for entry in os.listdir(root):
+            if entry.startswith(prefix):
+                shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+        with write_lock():
+            start_path = current_index_path(root, name)
+            if start_path is None:
+                return None
+            start = SharedSearchIndex.open(start_path)
+            start_lineage = start.manifest.get("lineage")
+            start_rows = len(start.base_matrix)
+            start_deleted = np.array(start.deleted) if start.deleted is not None else None
+            del start
+            exact = ExactSearchIndex.from_collection(collection)
+
+        started = time.perf_counter()
+        temp_dir = tempfile.mkdtemp(dir=root, prefix=prefix)
+        try:
+            write_index(exact, temp_dir, source=collection_source(collection, exact), **options)
+            del exact
+            with write_lock(), build_lock(root, name):
+                current_path = current_index_path(root, name)
+                current = SharedSearchIndex.open(current_path) if current_path is not None else None
+                if current is None or current.manifest.get("lineage") != start_lineage:
+                    print(f"[INDEX] Compaction of '{name}' superseded by a full build; discarded.")
+                    return None
+                touched = _touched_since(current, start_rows, start_deleted)
+                generation = f"{name}-{time.time_ns()}"
+                os.rename(temp_dir, os.path.join(root, generation))
+                _set_current(root, name, generation)
+                path = os.path.join(root, generation)
+                if touched:
+                    path = publish_update(SharedSearchIndex.open(path), root, collection, touched)
+                prune_generations(root, name)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    print(f"[INDEX] Compacted '{name}' in {time.perf_counter() - started:.1f}s ({len(touched)} changes re-applied).")
+    return SharedSearchIndex.open(path, ef=ef)
+
+
+# =============================================================================
+# COMMAND LINE
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the shared memory-mapped search index files")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("root", help="Index directory (SEARCH_INDEX_DIR)")
+    parser.add_argument("--collection", action="append", help="Collection to build (default: upskilling and holistic)")
+    parser.add_argument("--neighbors", type=int, default=GRAPH_NEIGHBORS, help="kNN graph degree (0 = no graph)")
+    parser.add_argument("--graph-min-items", type=int, default=GRAPH_MIN_ITEMS)
+    parser.add_argument("--db", default="./local_vector_db", help="ChromaDB path")
+    args = parser.parse_args()
+    names = args.collection or ["upskilling", "holistic"]
+
+    if args.command == "info":
+        for name in names:
+            path = current_index_path(args.root, name)
+            info = SharedSearchIndex.open(path).describe() if path else None
+            print(json.dumps({name: info}, indent=2))
+        return
+
+    import chromadb
+
+    client = chromadb.PersistentClient(path=args.db)
+    for name in names:
+        collection = client.get_collection(name)
+        with build_lock(args.root, name):
+            exact = ExactSearchIndex.from_collection(collection)
+            path = publish_index(
+                exact,
+                args.root,
+                neighbors=args.neighbors,
+                graph_min_items=args.graph_min_items,
+                source=collection_source(collection, exact)
+            )
+        print(json.dumps({name: SharedSearchIndex.open(path).describe()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
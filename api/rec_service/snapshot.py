@@ -0,0 +1,209 @@
+"""
+Catalog snapshots for the YUNO Recommendation Service
+Exports collections (vectors + documents + metadata) to disk and restores them without any embedding calls
+
+Usage:
+    python snapshot.py export ./snapshots/catalog
+    python snapshot.py import ./snapshots/catalog [--replace]
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from embedding_providers import collection_embedding_model
+from embedding_store import EmbeddingStore, content_key
+from exact_search import collection_space
+
+SNAPSHOT_FORMAT = 1
+MANIFEST_FILE = "manifest.json"
+SNAPSHOT_COLLECTIONS = ["upskilling", "holistic"]
+
+# Items read from / written to ChromaDB per call
+PAGE_SIZE = 5000
+
+
+def has_snapshot(path: Optional[str]) -> bool:
+    return bool(path) and os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def export_snapshot(
+    client,
+    path: str,
+    embedding_model: Optional[str] = None,
+    collection_names: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Write each collection to <name>.npy (float32 vectors, row i = record i)
+    and <name>.jsonl (id, document, metadata), plus a manifest. The embedding
+    model defaults to the one recorded on the collections; all must agree.
+    """
+    os.makedirs(path, exist_ok=True)
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "created_at": time.time(),
+        "embedding_model": embedding_model,
+        "collections": {},
+    }
+
+    for name in collection_names or SNAPSHOT_COLLECTIONS:
+        collection = client.get_collection(name)
+        model = collection_embedding_model(collection)
+        if manifest["embedding_model"] is None:
+            manifest["embedding_model"] = model
+        elif model is not None and model != manifest["embedding_model"]:
+            raise ValueError(
+                f"Collection '{name}' was embedded with '{model}', not '{manifest['embedding_model']}'"
+            )
+        count = collection.count()
+        vectors = None
+        written = 0
+        with open(os.path.join(path, f"{name}.jsonl"), "w", encoding="utf-8") as records:
+            while written < count:
+                page = collection.get(
+                    offset=written,
+                    limit=PAGE_SIZE,
+                    include=["embeddings", "metadatas", "documents"]
+                )
+                if not page["ids"]:
+                    break
+                embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+                if vectors is None:
+                    vectors = np.lib.format.open_memmap(
+                        os.path.join(path, f"{name}.npy"),
+                        mode="w+",
+                        dtype=np.float32,
+                        shape=(count, embeddings.shape[1])
+                    )
+                vectors[written:written + len(embeddings)] = embeddings
+                documents = page["documents"] or [None] * len(page["ids"])
+                for item_id, document, metadata in zip(page["ids"], documents, page["metadatas"]):
+                    records.write(json.dumps({"id": item_id, "document": document, "metadata": metadata}) + "\n")
+                written += len(page["ids"])
+
+        if vectors is not None:
+            vectors.flush()
+            dim = vectors.shape[1]
+            del vectors
+        else:
+            np.save(os.path.join(path, f"{name}.npy"), np.zeros((0, 0), dtype=np.float32))
+            dim = 0
+        manifest["collections"][name] = {
+            "count": written,
+            "dim": dim,
+            "space": collection_space(collection),
+        }
+        print(f"[SNAPSHOT] Exported {written} items from '{name}'.")
+
+    with open(os.path.join(path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def import_snapshot(
+    client,
+    path: str,
+    embedding_model: Optional[str] = None,
+    replace: bool = False,
+    store: Optional[EmbeddingStore] = None,
+    document_task_type: str = "retrieval_document",
+) -> Dict[str, int]:
+    """
+    Restore every collection in a snapshot. Existing non-empty collections are
+    only overwritten when replace is set. When a store is given, the restored
+    vectors are also added to it under their document's content key.
+    """
+    manifest = read_manifest(path)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format: {manifest.get('format')}")
+    if embedding_model and manifest.get("embedding_model") != embedding_model:
+        raise ValueError(
+            f"Snapshot was embedded with '{manifest.get('embedding_model')}', not '{embedding_model}'"
+        )
+
+    restored = {}
+    for name, info in manifest["collections"].items():
+        metadata = {"hnsw:space": info["space"], "embedding_model": manifest["embedding_model"]}
+        existing = client.get_or_create_collection(name, metadata=metadata)
+        if existing.count() > 0:
+            if not replace:
+                raise ValueError(f"Collection '{name}' is not empty (use replace to overwrite it)")
+            client.delete_collection(name)
+        collection = client.get_or_create_collection(name, metadata=metadata)
+
+        vectors = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        added = 0
+        with open(os.path.join(path, f"{name}.jsonl"), "r", encoding="utf-8") as records:
+            while True:
+                page = [json.loads(line) for _, line in zip(range(PAGE_SIZE), records)]
+                if not page:
+                    break
+                embeddings = np.asarray(vectors[added:added + len(page)])
+                documents = [record["document"] for record in page]
+                collection.add(
+                    ids=[record["id"] for record in page],
+                    embeddings=embeddings,
+                    metadatas=[record["metadata"] for record in page],
+                    documents=documents if all(d is not None for d in documents) else None
+                )
+                if store is not None:
+                    rows = [i for i, document in enumerate(documents) if document is not None]
+                    store.put_many(
+                        [content_key(documents[i], manifest["embedding_model"], document_task_type) for i in rows],
+                        embeddings[rows]
+                    )
+                added += len(page)
+        restored[name] = added
+        print(f"[SNAPSHOT] Restored {added} items into '{name}'.")
+    return restored
+
+
+# =============================================================================
+# COMMAND LINE
+# =============================================================================
+
+def main():
+    import chromadb
+
+    parser = argparse.ArgumentParser(description="Export or restore YUNO catalog snapshots")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="Snapshot directory")
+    parser.add_argument("--db", default="./local_vector_db", help="ChromaDB path")
+    parser.add_argument("--replace", action="store_true", help="Overwrite non-empty collections on import")
+    parser.add_argument(
+        "--model",
+        default=None,
+        help="Embedding model: recorded in the export (default: from collection metadata) or required on import"
+    )
+    parser.add_argument(
+        "--store",
+        default=os.getenv("EMBEDDING_STORE_PATH", "./embedding_store"),
+        help="Embedding store to warm on import ('' to skip)"
+    )
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=args.db)
+    started = time.perf_counter()
+    try:
+        if args.command == "export":
+            export_snapshot(client, args.path, args.model)
+        else:
+            store = EmbeddingStore(args.store) if args.store else None
+            import_snapshot(client, args.path, args.model, replace=args.replace, store=store)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        raise SystemExit(1)
+    print(f"[SNAPSHOT] Done in {time.perf_counter() - started:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
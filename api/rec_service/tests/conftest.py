@@ -0,0 +1,104 @@
+"""
+Shared fixtures for the YUNO Recommendation Service tests
+A small fixed catalog is loaded into an in-memory ChromaDB collection per distance space
+"""
+
+import os
+import sys
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+# Test modules import the service modules the way app.py does (from the service directory)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb  # noqa: E402
+
+from compact_index import CompactSearchIndex  # noqa: E402
+from exact_search import ExactSearchIndex  # noqa: E402
+from partitions import stage_audiences  # noqa: E402
+from shared_index import SharedSearchIndex, publish_index  # noqa: E402
+
+ITEM_COUNT = 60
+DIM = 16
+AUDIENCES = ["Secondary", "Post-Secondary", "Both"]
+DAY_SECONDS = 86400
+N_RESULTS = 8
+
+# SEARCH_BACKEND / COMPACT_INDEX configurations checked against ChromaDB
+BACKENDS = ["numpy", "compact", "compact-int8-rescore", "mmap"]
+
+
+def catalog_items(seed: int = 7):
+    """Fixed ids, embeddings and metadata; event_ts runs from 30 days ago to 29 days ahead."""
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((ITEM_COUNT, DIM)).astype(np.float32)
+    now = int(time.time())
+    ids = [f"item-{i:03d}" for i in range(ITEM_COUNT)]
+    metadatas = [
+        {
+            "target_audience": AUDIENCES[i % len(AUDIENCES)],
+            "event_ts": now + (i - ITEM_COUNT // 2) * DAY_SECONDS,
+            "category": "event" if i % 2 else "course",
+        }
+        for i in range(ITEM_COUNT)
+    ]
+    return ids, embeddings, metadatas
+
+
+def make_backend(name: str, collection, root) -> ExactSearchIndex:
+    """The index a backend configuration would serve the collection from."""
+    index = ExactSearchIndex.from_collection(collection)
+    if name == "compact":
+        return CompactSearchIndex.from_index(index, precision="float32")
+    if name == "compact-int8-rescore":
+        # Re-scoring every item makes int8 codes exact again
+        return CompactSearchIndex.from_index(index, precision="int8", rescore=ITEM_COUNT)
+    if name == "mmap":
+        return SharedSearchIndex.open(publish_index(index, str(root)))
+    return index
+
+
+def assert_same_results(expected, actual):
+    """Same ids in the same order, same metadata, and distances equal up to float32 rounding."""
+    assert actual["ids"] == expected["ids"]
+    np.testing.assert_allclose(
+        np.asarray(actual["distances"], dtype=np.float64),
+        np.asarray(expected["distances"], dtype=np.float64),
+        rtol=1e-4,
+        atol=1e-4
+    )
+    assert actual["metadatas"] == expected["metadatas"]
+
+
+def audience_filter(user_stage: str):
+    return {"target_audience": {"$in": stage_audiences(user_stage)}}
+
+
+@pytest.fixture(scope="session")
+def chroma_client():
+    return chromadb.EphemeralClient()
+
+
+@pytest.fixture(scope="session", params=["l2", "cosine", "ip"])
+def collection(request, chroma_client):
+    """The fixed catalog in a Chroma collection using one distance space."""
+    ids, embeddings, metadatas = catalog_items()
+    collection = chroma_client.create_collection(
+        f"catalog-{request.param}-{uuid.uuid4().hex[:8]}",
+        metadata={"hnsw:space": request.param}
+    )
+    collection.add(ids=ids, embeddings=embeddings.tolist(), metadatas=metadatas)
+    return collection
+
+
+@pytest.fixture(scope="session")
+def queries():
+    return np.random.default_rng(11).standard_normal((5, DIM)).astype(np.float32)
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, collection, tmp_path):
+    return make_backend(request.param, collection, tmp_path)
@@ -0,0 +1,82 @@
+"""
+Event expiry filtering in the YUNO Recommendation Service
+Expired events are dropped by the query filter, identically on ChromaDB and every in-process backend
+"""
+
+import pytest
+
+import app
+from event_dates import combine_filters
+from partitions import USER_STAGES, build_exact_partitions
+
+from conftest import N_RESULTS, assert_same_results
+
+
+@pytest.fixture
+def expiry(monkeypatch, collection):
+    """Turn expiry on for the test collection."""
+    monkeypatch.setattr(app, "EVENT_EXPIRY", True)
+    monkeypatch.setattr(app, "EVENT_EXPIRY_COLLECTIONS", [collection.name])
+    monkeypatch.setattr(app, "EVENT_EXPIRY_INTERVAL_SECONDS", 300.0)
+    monkeypatch.setattr(app, "EVENT_EXPIRY_GRACE_SECONDS", 0)
+    return app.expiry_cutoff()
+
+
+def test_cutoff_is_quantized(expiry):
+    assert expiry % 300 == 0
+    assert 0 <= app.time.time() - expiry < 300 + 1
+
+
+def test_expiry_off_leaves_window(monkeypatch, collection):
+    monkeypatch.setattr(app, "EVENT_EXPIRY", False)
+    assert app.expiry_cutoff() is None
+    assert app.expiry_window(collection.name, None) is None
+    assert app.expiry_window(collection.name, (10, 20)) == (10, 20)
+
+
+def test_expiry_window_narrows_start(expiry, collection):
+    assert app.expiry_window(collection.name, None) == (expiry, None)
+    assert app.expiry_window(collection.name, (expiry - 1000, expiry + 50)) == (expiry, expiry + 50)
+    assert app.expiry_window(collection.name, (expiry + 1000, None)) == (expiry + 1000, None)
+    # Collections without expiry keep their window
+    assert app.expiry_window("upskilling", None) is None
+
+
+@pytest.mark.parametrize("user_stage", USER_STAGES)
+def test_partitioned_searcher_drops_expired_events(monkeypatch, expiry, collection, backend, queries, user_stage):
+    monkeypatch.setitem(app.audience_partitions, collection.name, build_exact_partitions(backend))
+    searcher, where = app.get_searcher(collection, user_stage)
+    actual = searcher.query(query_embeddings=queries.tolist(), n_results=N_RESULTS, where=where)
+
+    expected = collection.query(
+        query_embeddings=queries.tolist(),
+        n_results=N_RESULTS,
+        where=combine_filters(app.build_audience_filter(user_stage), where)
+    )
+    assert_same_results(expected, actual)
+    returned = [metadata for row in actual["metadatas"] for metadata in row]
+    assert returned and all(metadata["event_ts"] >= expiry for metadata in returned)
+
+
+@pytest.mark.parametrize("user_stage", USER_STAGES)
+def test_unpartitioned_searcher_drops_expired_events(monkeypatch, expiry, collection, backend, queries, user_stage):
+    monkeypatch.delitem(app.audience_partitions, collection.name, raising=False)
+    monkeypatch.setitem(app.search_indexes, collection.name, backend)
+    searcher, where = app.get_searcher(collection, user_stage)
+    assert searcher is backend
+    actual = backend.query(query_embeddings=queries.tolist(), n_results=N_RESULTS, where=where)
+    expected = collection.query(query_embeddings=queries.tolist(), n_results=N_RESULTS, where=where)
+    assert_same_results(expected, actual)
+    returned = [metadata for row in actual["metadatas"] for metadata in row]
+    assert returned and all(metadata["event_ts"] >= expiry for metadata in returned)
+
+
+def test_chroma_searcher_drops_expired_events(monkeypatch, expiry, collection, queries):
+    monkeypatch.delitem(app.audience_partitions, collection.name, raising=False)
+    monkeypatch.delitem(app.search_indexes, collection.name, raising=False)
+    searcher, where = app.get_searcher(collection, "Secondary")
+    assert searcher is collection
+    result = collection.query(query_embeddings=queries.tolist(), n_results=N_RESULTS, where=where)
+    returned = [metadata for row in result["metadatas"] for metadata in row]
+    assert returned and all(metadata["event_ts"] >= expiry for metadata in returned)
+    assert all(metadata["target_audience"] in ("Secondary", "Both") for metadata in returned)
@@ -0,0 +1,76 @@
+"""
+Equivalence of the in-process search backends with ChromaDB
+Each backend must return the same ids, order and distances as the collection it was built from
+"""
+
+import numpy as np
+import pytest
+
+from event_dates import combine_filters, date_window_filter
+from exact_search import ExactSearchIndex
+from partitions import USER_STAGES, build_chroma_partitions, build_exact_partitions
+
+from conftest import DAY_SECONDS, ITEM_COUNT, N_RESULTS, assert_same_results, audience_filter
+
+def test_unfiltered_query_matches_chroma(collection, backend, queries):
+    expected = collection.query(query_embeddings=queries.tolist(), n_results=N_RESULTS)
+    actual = backend.query(query_embeddings=queries.tolist(), n_results=N_RESULTS)
+    assert_same_results(expected, actual)
+
+
+@pytest.mark.parametrize("user_stage", USER_STAGES)
+def test_audience_filter_matches_chroma(collection, backend, queries, user_stage):
+    where = audience_filter(user_stage)
+    expected = collection.query(query_embeddings=queries.tolist(), n_results=N_RESULTS, where=where)
+    actual = backend.query(query_embeddings=queries.tolist(), n_results=N_RESULTS, where=where)
+    assert_same_results(expected, actual)
+
+
+def test_date_window_matches_chroma(collection, backend, queries):
+    now = collection.get(ids=["item-030"])["metadatas"][0]["event_ts"]
+    where = combine_filters(
+        audience_filter("Secondary"),
+        date_window_filter((now - 10 * DAY_SECONDS, now + 5 * DAY_SECONDS))
+    )
+    expected = collection.query(query_embeddings=queries.tolist(), n_results=N_RESULTS, where=where)
+    actual = backend.query(query_embeddings=queries.tolist(), n_results=N_RESULTS, where=where)
+    assert_same_results(expected, actual)
+
+
+@pytest.mark.parametrize("user_stage", USER_STAGES)
+def test_partitions_match_chroma_partitions(chroma_client, collection, backend, queries, user_stage):
+    partition = build_exact_partitions(backend)[user_stage]
+    chroma_partition = build_chroma_partitions(chroma_client, collection)[user_stage]
+    assert partition.count() == chroma_partition.count()
+
+    expected = chroma_partition.query(query_embeddings=queries.tolist(), n_results=N_RESULTS)
+    actual = partition.query(query_embeddings=queries.tolist(), n_results=N_RESULTS)
+    assert_same_results(expected, actual)
+    # A partition answers like the full index with the audience filter
+    filtered = backend.query(query_embeddings=queries.tolist(), n_results=N_RESULTS, where=audience_filter(user_stage))
+    assert_same_results(filtered, actual)
+
+
+def test_subset_of_subset_matches_fresh_index(collection, backend, queries):
+    index = ExactSearchIndex.from_collection(collection)
+    outer = np.arange(5, ITEM_COUNT - 5)
+    inner = np.arange(0, len(outer), 3)
+    rows = outer[inner]
+    fresh = ExactSearchIndex(
+        collection.name,
+        [index.id_at(row) for row in rows],
+        index.vectors(rows),
+        [index.metadata_at(row) for row in rows],
+        space=index.space
+    )
+    expected = fresh.query(query_embeddings=queries.tolist(), n_results=N_RESULTS)
+    actual = backend.subset(outer).subset(inner).query(query_embeddings=queries.tolist(), n_results=N_RESULTS)
+    assert_same_results(expected, actual)
+
+
+def test_without_drops_items(collection, backend, queries):
+    removed = collection.query(query_embeddings=queries[:1].tolist(), n_results=2)["ids"][0]
+    remaining = backend.without(removed)
+    assert remaining.count() == ITEM_COUNT - 2
+    result = remaining.query(query_embeddings=queries.tolist(), n_results=N_RESULTS)
+    assert not set(removed) & {item_id for row in result["ids"] for item_id in row}
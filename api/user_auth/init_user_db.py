@@ -44,6 +44,7 @@ def init_db():
             user_id INTEGER PRIMARY KEY,
             riasec_code TEXT NOT NULL,
             ocean_scores TEXT NOT NULL, -- Stored as JSON string
+            profile_version INTEGER NOT NULL DEFAULT 0, -- Bumped on every assessment save
             FOREIGN KEY (user_id) REFERENCES users (id)
         )
     """)
@@ -1,15 +1,35 @@
 import sqlite3
 import json
+import urllib.request
+from contextlib import asynccontextmanager
 from typing import List, Optional, Dict
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import bcrypt
 
 import os
+import sys
+
+# Code shared with rec_service lives in api/common (copied to /common in the image)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+
+from yuno_common.profiling import ProfileStore, ProfilingMiddleware, create_profiles_router
 
 # --- Configuration ---
 DB_NAME = os.path.join(os.path.dirname(__file__), "users.db")
+# Recommendation service to notify when a profile changes (optional)
+REC_SERVICE_URL = os.getenv("REC_SERVICE_URL", "").rstrip("/")
+# Shared secret sent as X-Notify-Token; the recommendation service rejects notifications without it
+PROFILE_NOTIFY_TOKEN = os.getenv("PROFILE_NOTIFY_TOKEN") or None
+# Opt-in request profiling (admin flag): profiles requests sent with an X-Profile header
+# or a PROFILE_SAMPLE_RATE share of all requests; see /debug/profiles (requires PROFILE_TOKEN)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN") or None
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(__file__), "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
 
 # --- Models ---
 class UserLogin(BaseModel):
@@ -46,9 +66,15 @@ class UserResponse(BaseModel):
     education_level: str
     riasec_code: str
     ocean_scores: Dict[str, int] # Returning as a dictionary
+    profile_version: int = 0
 
 # --- Setup ---
-app = FastAPI(title="Student Recommendation Auth API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    migrate_db()
+    yield
+
+app = FastAPI(title="Student Recommendation Auth API", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -57,14 +83,62 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"], # Allow all methods
     allow_headers=["*"], # Allow all headers
+    expose_headers=["X-Profile-Id"],
 )
 
+# Profiling
+if PROFILING_ENABLED and not PROFILE_TOKEN:
+    # Profiles expose stack contents, so the X-Profile trigger and /debug/profiles are never left open
+    print("[WARNING] PROFILING_ENABLED is set without PROFILE_TOKEN; request profiling stays disabled.")
+elif PROFILING_ENABLED:
+    profile_store = ProfileStore(PROFILE_DIR, max_files=PROFILE_MAX_FILES)
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=profile_store,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        token=PROFILE_TOKEN,
+        interval_seconds=PROFILE_INTERVAL_MS / 1000
+    )
+    app.include_router(create_profiles_router(profile_store, token=PROFILE_TOKEN))
+    print(f"[STARTUP] Request profiling enabled (sample rate={PROFILE_SAMPLE_RATE}, dir={PROFILE_DIR}).")
+
+if REC_SERVICE_URL and PROFILE_NOTIFY_TOKEN is None:
+    print("[WARNING] PROFILE_NOTIFY_TOKEN is not set; the recommendation service will not be notified of profile changes.")
+
 # --- Database Helper ---
 def get_db_connection():
     conn = sqlite3.connect(DB_NAME)
     conn.row_factory = sqlite3.Row # Allow accessing columns by name
     return conn
 
+def migrate_db():
+    """Add columns introduced after a database was created (no-op on fresh databases)."""
+    if not os.path.exists(DB_NAME):
+        return
+    conn = get_db_connection()
+    try:
+        columns = [row["name"] for row in conn.execute("PRAGMA table_info(user_profiles)")]
+        if columns and "profile_version" not in columns:
+            conn.execute("ALTER TABLE user_profiles ADD COLUMN profile_version INTEGER NOT NULL DEFAULT 0")
+            conn.commit()
+            print("[STARTUP] Added profile_version column to user_profiles.")
+    finally:
+        conn.close()
+
+def notify_profile_changed(user_id: int):
+    """Tell the recommendation service to drop its cached profile vector (best effort)."""
+    if not REC_SERVICE_URL or not PROFILE_NOTIFY_TOKEN:
+        return
+    request = urllib.request.Request(
+        f"{REC_SERVICE_URL}/users/{user_id}/profile-changed",
+        method="POST",
+        headers={"X-Notify-Token": PROFILE_NOTIFY_TOKEN}
+    )
+    try:
+        urllib.request.urlopen(request, timeout=2).close()
+    except Exception as e:
+        print(f"[WARNING] Could not notify recommendation service for user {user_id}: {e}")
+
 # --- Endpoints ---
 
 @app.post("/register", response_model=UserResponse)
@@ -242,7 +316,7 @@ def get_user(user_id: int):
     # Fetch user and profile
     cursor.execute("""
         SELECT u.id, u.username, u.education_level,
-               p.riasec_code, p.ocean_scores
+               p.riasec_code, p.ocean_scores, p.profile_version
         FROM users u
         LEFT JOIN user_profiles p ON u.id = p.user_id
         WHERE u.id = ?
@@ -267,11 +341,12 @@ def get_user(user_id: int):
         username=row["username"],
         education_level=row["education_level"],
         riasec_code=row["riasec_code"] if row["riasec_code"] else "UNK",
-        ocean_scores=ocean_data
+        ocean_scores=ocean_data,
+        profile_version=row["profile_version"] or 0
     )
 
 @app.post("/user/{user_id}/assessment")
-def save_assessment(user_id: int, result: AssessmentResult):
+def save_assessment(user_id: int, result: AssessmentResult, background_tasks: BackgroundTasks):
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -282,7 +357,7 @@ def save_assessment(user_id: int, result: AssessmentResult):
         # Update user profile
         cursor.execute("""
             UPDATE user_profiles
-            SET riasec_code = ?, ocean_scores = ?
+            SET riasec_code = ?, ocean_scores = ?, profile_version = profile_version + 1
             WHERE user_id = ?
         """, (result.riasec_code, ocean_json, user_id))
         
@@ -291,6 +366,7 @@ def save_assessment(user_id: int, result: AssessmentResult):
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="User profile not found")
         
+        background_tasks.add_task(notify_profile_changed, user_id)
         return {"message": "Assessment saved successfully"}
     except Exception as e:
         conn.rollback()